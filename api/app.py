@@ -1,39 +1,123 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
+from werkzeug.test import EnvironBuilder
 from flask_cors import CORS
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError, BulkWriteError
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
 import os
 
+from serialization import make_json_provider, init_compression
+from idempotency import IdempotencyStore, after_commit, db_session
+from memberships import MEMBERS_PAGE_SIZE
+from storage import open_storage, maintenance_timeout, PROJECT_FIELDS, PROJECT_DETAIL_FIELDS, RESOURCE_FIELDS, RESOURCE_COUNTER_FIELDS
+from group_commit import GroupCommitter, APPLIED, INSUFFICIENT, NOT_FOUND
+from versioning import PreconditionFailed, expected_version, attempts, check_version, etag
+from profiling import RequestProfiler
+from request_log import RequestLogger, log
+from traffic_capture import TrafficCapture
+from waitlist import Waitlist
+from history import HistoryRecorder, RESOLUTIONS, parse_range
+from degraded import DegradedMode
+from catalog import HardwareCatalog
+from shared_cache import SharedCache
+from sync import horizon, make_cursor, parse_cursor, tombstone_horizon
+
 # Load environment variables from .env (in this folder or repo root)
 load_dotenv()
 
-MONGODB_URI = os.getenv("MONGODB_URI")
-if not MONGODB_URI:
-    raise RuntimeError("MONGODB_URI not set in environment or .env (see api/README.md)")
+# Largest accepted POST /api/projects/bulk
+BULK_MAX_PROJECTS = int(os.getenv("BULK_MAX_PROJECTS", "5000"))
+
+# Sub-operations accepted by one POST /api/batch
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "20"))
+
+# Stored responses for Idempotency-Key retries (expire via TTL index)
+idempotency = IdempotencyStore()
+
+# Optional merging of concurrent checkout/checkin writes (GROUP_COMMIT=on)
+group_commit = GroupCommitter()
+
+# FIFO long-poll queue for checkouts that ask to wait for units ("wait": seconds)
+waitlist = Waitlist()
+
+# Availability over time per hardware set (raw points + hourly rollups)
+resource_history = HistoryRecorder()
+
+# Names/notes of hardware sets, joined into resource responses in memory
+hardware_catalog = HardwareCatalog()
+
+# Access-check and resource-list entries in a hash table shared by all worker
+# processes, kept current by a change stream (SHARED_CACHE, needs a replica set)
+shared_cache = SharedCache()
+
+# Circuit breaker around the database; read endpoints fall back to their
+# last good response while it is open
+degraded = DegradedMode()
 
-# Connect to MongoDB Atlas
-client = MongoClient(MONGODB_URI)
-db = client["softwarelabdb"]
+# Opt-in cProfile + Mongo command timings per request (PROFILE_SAMPLE_RATE /
+# PROFILE_ADMIN_TOKEN); created before init_db() so it sees the client's commands
+profiler = RequestProfiler()
 
-# Collections (match original names so Load Project works)
-users_col = db.get_collection("Users")       # new for auth; will be created on first insert
-projects_col = db.get_collection("Projects")
-resources_col = db.get_collection("Resources")
+# JSON access/error log written by a background thread (ACCESS_LOG, LOG_LEVEL,
+# LOG_QUEUE_SIZE); also created before init_db() to count Mongo commands
+request_logger = RequestLogger()
+
+# Sanitized NDJSON request traces for replay_traffic.py (TRAFFIC_CAPTURE_FILE)
+traffic_capture = TrafficCapture()
+
+
+def init_db(backend=None):
+    """Open the storage backend (STORAGE_BACKEND, default mongo) and bind the repositories.
+
+    Runs at import and again in each gunicorn worker after fork, since a
+    MongoClient must not be shared across a fork (see gunicorn.conf.py).
+    """
+    global storage, users, projects, resources, memberships
+
+    storage = open_storage(backend)
+    users = storage.users
+    projects = storage.projects
+    resources = storage.resources
+    # One document per (projectId, userId); replaces the embedded members array
+    memberships = storage.memberships
+
+    idempotency.bind(storage.idempotency_records, storage.client)
+    group_commit.bind(resources)
+    hardware_catalog.bind(storage.hardware_catalog)
+    shared_cache.bind(storage)
+    resource_history.bind(storage.history)
+
+
+def ensure_indexes():
+    # Index builds on existing data can take longer than a request's budget
+    with maintenance_timeout():
+        storage.ensure_indexes()
+        try:
+            idempotency.ensure_indexes()
+        except Exception:
+            pass
+        try:
+            hardware_catalog.ensure_defaults()
+        except Exception:
+            pass
 
 
-# Ensure uniqueness
-users_col.create_index("userId", unique=True)
-projects_col.create_index("projectId", unique=True)
-# add compound unique index for resources to prevent duplicates (safe-guard)
-try:
-    resources_col.create_index([("projectId", 1), ("hwsetId", 1)], unique=True)
-except Exception:
-    # ignore index creation errors at startup
-    pass
+init_db()
+ensure_indexes()
 
 app = Flask(__name__)
 
+# Registered first so its after_request runs last and covers the whole response
+profiler.init_app(app)
+request_logger.init_app(app)
+traffic_capture.init_app(app)
+degraded.init_app(app)
+# Starts the updater on the first request; gunicorn workers start it in post_fork
+shared_cache.init_app(app)
+
+# orjson-backed JSON provider (stdlib fallback) and gzip/brotli for large responses
+app.json = make_json_provider(app)
+init_compression(app)
+
 # Allow frontend dev server
 CORS(
     app,
@@ -43,39 +127,138 @@ CORS(
 
 # ---------- HELPER FUNCTIONS ----------
 
+@app.errorhandler(PreconditionFailed)
+def precondition_failed(e):
+    """If-Match named a stale version"""
+    headers = {"ETag": etag(e.current_version)} if e.current_version is not None else {}
+    return jsonify({"error": "Version mismatch (If-Match)", "version": e.current_version}), 412, headers
+
+def version_conflict(expected):
+    """Response once every optimistic attempt lost to a concurrent writer"""
+    if expected is not None:
+        raise PreconditionFailed()
+    return jsonify({"error": "Concurrent update, please retry"}), 409
+
+def cached_lookup(key, load):
+    """Memoize a lookup for the rest of the request.
+
+    The cache lives on flask.g, so all sub-operations of one /api/batch call
+    share it; the batch runner clears it after every mutating sub-operation,
+    keeping only what that write passed to keep_lookup().
+    """
+    cache = g.get("lookup_cache")
+    if cache is None:
+        cache = g.lookup_cache = {}
+    if key not in cache:
+        cache[key] = load()
+    return cache[key]
+
+def keep_lookup(key, value):
+    """Carry a lookup the current write knows to be up to date past the batch's cache reset"""
+    g.setdefault("lookup_kept", {})[key] = value
+
+def use_shared_cache():
+    """The cross-worker cache answers reads outside transactions, while its updater runs"""
+    return db_session() is None and shared_cache.usable()
+
+def load_project_access(project_id):
+    load = lambda: projects.get(project_id, ("isPublic", "version"), session=db_session())
+    return shared_cache.project(project_id, load) if use_shared_cache() else load()
+
+def load_membership(project_id, user_id, project_version):
+    load = lambda: memberships.is_member(project_id, user_id, session=db_session())
+    if use_shared_cache():
+        return shared_cache.is_member(project_id, user_id, project_version, load)
+    return load()
+
 def check_project_access(project_id, user_id):
     """Check if user has access to the project"""
     if not user_id:
         return False
     
-    project = projects_col.find_one({"projectId": project_id})
+    project = cached_lookup(("project", project_id), lambda: load_project_access(project_id))
     if not project:
         return False
     
-    # Check if user is in members list or project is public
-    return (user_id in project.get("members", []) or 
-            project.get("isPublic", False))
+    # Public projects are open to everyone; otherwise check membership
+    if project.get("isPublic", False):
+        return True
+    return cached_lookup(("member", project_id, user_id),
+                         lambda: load_membership(project_id, user_id, project.get("version", 0)))
 
 def get_user_projects(user_id):
     """Get projects where user is a member (created or invited)"""
     if not user_id:
         return []
     
-    # Find only projects where user is a member
-    query = {"members": user_id}
+    # Find only projects where user is a member (cached per worker; membership
+    # changes in other workers change the user's shared-cache generation)
+    project_ids = memberships.project_ids_for_user(user_id, shared_cache.user_generation(user_id))
+    if not project_ids:
+        return []
     
-    return list(projects_col.find(query, {
-        "_id": 0, "projectId": 1, "name": 1, "description": 1, 
-        "createdAt": 1, "createdBy": 1, "isPublic": 1
-    }))
+    return projects.list_by_ids(project_ids, PROJECT_FIELDS)
+
+def group_commit_response(result, action, quantity, hwset_id):
+    """Response for a checkout/checkin that went through the group committer"""
+    if result.status == NOT_FOUND:
+        return jsonify({"error": "Hardware set not found"}), 404
+    if result.status == INSUFFICIENT:
+        if action == "checkout":
+            return jsonify({"error": f"Only {result.available} units available"}), 400
+        return jsonify({"error": f"Only {result.allocated} units are checked out"}), 400
+    if result.status != APPLIED:
+        return jsonify({"error": "Hardware set is busy, please retry"}), 409
+
+    verb = "Checked out" if action == "checkout" else "Checked in"
+    return jsonify({
+        "ok": True,
+        "message": f"{verb} {quantity} units of {hwset_id}",
+        "available": result.available,
+        "allocated": result.allocated
+    }), 200
+
+def new_project_doc(payload, member_count=0):
+    """Project document for a create request (fields already validated)"""
+    return {
+        "projectId": payload["projectId"],
+        "name": payload["name"],
+        "description": payload.get("description", ""),
+        "createdAt": payload.get("createdAt"),
+        "createdBy": payload["createdBy"],
+        "memberCount": member_count,
+        "isPublic": payload.get("isPublic", False),
+        "version": 1
+    }
+
+def default_resource_docs(project_id, payload):
+    """Default hardware sets for a new project; totals can be overridden in the payload.
+    Only the counters: names and notes come from the hardware catalog"""
+    default_hw1_total = int(payload.get("default_hwset1_total", 15))
+    default_hw2_total = int(payload.get("default_hwset2_total", 10))
+
+    return [
+        {
+            "projectId": project_id,
+            "hwsetId": "HWSet1",
+            "total": default_hw1_total,
+            "allocatedToProject": 0,
+            "available": default_hw1_total,
+            "version": 1
+        },
+        {
+            "projectId": project_id,
+            "hwsetId": "HWSet2",
+            "total": default_hw2_total,
+            "allocatedToProject": 0,
+            "available": default_hw2_total,
+            "version": 1
+        }
+    ]
 
 def get_public_projects():
     """Get all public projects that users can discover and join"""
-    return list(projects_col.find(
-        {"isPublic": True},
-        {"_id": 0, "projectId": 1, "name": 1, "description": 1, 
-         "createdAt": 1, "createdBy": 1, "isPublic": 1}
-    ))
+    return projects.list_public(PROJECT_FIELDS)
 
 # ---------- AUTH ENDPOINTS ----------
 
@@ -94,7 +277,7 @@ def signup():
     }
 
     try:
-        users_col.insert_one(doc)
+        users.insert(doc)
     except DuplicateKeyError:
         return jsonify({"error": "User already exists"}), 409
 
@@ -110,7 +293,7 @@ def login():
     if not user_id or not password:
         return jsonify({"error": "userId and password are required"}), 400
 
-    user = users_col.find_one({"userId": user_id})
+    user = users.get(user_id)
     if not user or user.get("password") != password:
         # Covers: wrong password OR non-existent user
         return jsonify({"error": "Invalid userId/password"}), 401
@@ -122,6 +305,7 @@ def login():
 # ---------- PROJECT ENDPOINTS (already in your README spec) ----------
 
 @app.route("/api/projects", methods=["GET"])
+@degraded.read_fallback
 def list_projects():
     # Get userId from query parameter for authorization
     user_id = request.args.get("userId")
@@ -131,15 +315,13 @@ def list_projects():
         docs = get_user_projects(user_id)
     else:
         # Return only public projects if no user specified
-        docs = list(projects_col.find(
-            {"isPublic": True},
-            {"_id": 0, "projectId": 1, "name": 1, "description": 1, "createdAt": 1, "isPublic": 1}
-        ))
+        docs = projects.list_public(("projectId", "name", "description", "createdAt", "isPublic"))
     
     return jsonify(docs), 200
 
 
 @app.route("/api/projects/public", methods=["GET"])
+@degraded.read_fallback
 def list_public_projects():
     """Get all public projects that users can discover and join"""
     docs = get_public_projects()
@@ -147,6 +329,7 @@ def list_public_projects():
 
 
 @app.route("/api/projects/<project_id>", methods=["GET"])
+@degraded.read_fallback
 def get_project(project_id):
     user_id = request.args.get("userId")
     
@@ -154,14 +337,12 @@ def get_project(project_id):
     if not check_project_access(project_id, user_id):
         return jsonify({"error": "Access denied"}), 403
     
-    doc = projects_col.find_one(
-        {"projectId": project_id},
-        {"_id": 0, "projectId": 1, "name": 1, "description": 1, "createdAt": 1, 
-         "createdBy": 1, "members": 1, "isPublic": 1},
-    )
+    doc = projects.get(project_id, PROJECT_DETAIL_FIELDS)
     if not doc:
         return jsonify({"error": "Project not found"}), 404
-    return jsonify(doc), 200
+    # First page of members only; use /members for the rest
+    doc["members"], _ = memberships.list_members(project_id, MEMBERS_PAGE_SIZE)
+    return jsonify(doc), 200, {"ETag": etag(doc.get("version", 0))}
 
 
 @app.route("/api/projects/<project_id>/visibility", methods=["PATCH"])
@@ -171,20 +352,29 @@ def set_project_visibility(project_id):
     if not user_id:
         return jsonify({"error": "userId is required"}), 400
 
-    project = projects_col.find_one({"projectId": project_id})
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
+    is_public = bool(payload.get("isPublic", False))
+    expected = expected_version()
 
-    # Only the creator may change visibility
-    if project.get("createdBy") != user_id:
-        return jsonify({"error": "Only the project owner may change visibility"}), 403
+    # Conditioned on the version the ownership check saw (see versioning.py)
+    for _ in attempts(expected):
+        project = projects.get(project_id, ("createdBy", "version"))
+        if not project:
+            return jsonify({"error": "Project not found"}), 404
 
-    is_public = bool(payload.get("isPublic", False))
-    projects_col.update_one({"projectId": project_id}, {"$set": {"isPublic": is_public}})
-    return jsonify({"ok": True, "isPublic": is_public}), 200
+        # Only the creator may change visibility
+        if project.get("createdBy") != user_id:
+            return jsonify({"error": "Only the project owner may change visibility"}), 403
+
+        version = check_version(project, expected)
+        if projects.update_versioned(project_id, version, {"isPublic": is_public}):
+            shared_cache.project_changed(project_id)
+            return jsonify({"ok": True, "isPublic": is_public, "version": version + 1}), 200, \
+                {"ETag": etag(version + 1)}
+    return version_conflict(expected)
 
 
 @app.route("/api/projects", methods=["POST"])
+@idempotency.idempotent
 def create_project():
     payload = request.get_json(force=True) or {}
     required = ("projectId", "name", "createdBy")
@@ -194,22 +384,17 @@ def create_project():
     created_by = payload["createdBy"]
     
     # Verify user exists
-    user = users_col.find_one({"userId": created_by})
+    user = users.get(created_by, ("userId",), session=db_session())
     if not user:
         return jsonify({"error": "Invalid user"}), 400
 
-    doc = {
-        "projectId": payload["projectId"],
-        "name": payload["name"],
-        "description": payload.get("description", ""),
-        "createdAt": payload.get("createdAt"),
-        "createdBy": created_by,
-        "members": [created_by],  # Creator is automatically a member
-        "isPublic": payload.get("isPublic", False)
-    }
+    doc = new_project_doc(payload)
 
     try:
-        projects_col.insert_one(doc)
+        projects.insert(doc, session=db_session())
+        # Creator is automatically a member
+        memberships.add(doc["projectId"], created_by, role="owner", session=db_session())
+        after_commit(shared_cache.users_changed, [created_by])
     except DuplicateKeyError:
         return jsonify({"error": "projectId already exists"}), 409
     except Exception as e:
@@ -217,59 +402,27 @@ def create_project():
         return jsonify({"error": f"Failed to create project: {str(e)}"}), 500
 
     # Create default hardware resources for the new project (create one-by-one to avoid BulkWrite crashes)
-    default_hw1_total = int(payload.get("default_hwset1_total", 15))
-    default_hw2_total = int(payload.get("default_hwset2_total", 10))
-
-    default_resources = [
-        {
-            "projectId": doc["projectId"],
-            "hwsetId": "HWSet1",
-            "name": "Arduino Uno Kit",
-            "total": default_hw1_total,
-            "allocatedToProject": 0,
-            "available": default_hw1_total,
-            "notes": f"Default Arduino kits for {doc['projectId']}"
-        },
-        {
-            "projectId": doc["projectId"],
-            "hwsetId": "HWSet2",
-            "name": "Raspberry Pi Kit",
-            "total": default_hw2_total,
-            "allocatedToProject": 0,
-            "available": default_hw2_total,
-            "notes": f"Default Raspberry Pi kits for {doc['projectId']}"
-        }
-    ]
+    default_resources = default_resource_docs(doc["projectId"], payload)
 
     created_or_existing_resources = []
     for res_doc in default_resources:
         try:
-            resources_col.insert_one(res_doc)
-            created_or_existing_resources.append({
-                "projectId": res_doc["projectId"],
-                "hwsetId": res_doc["hwsetId"],
-                "name": res_doc["name"],
-                "total": res_doc["total"],
-                "allocatedToProject": res_doc["allocatedToProject"],
-                "available": res_doc["available"],
-                "notes": res_doc.get("notes", "")
-            })
+            resources.insert(res_doc, session=db_session())
+            created_or_existing_resources.append(hardware_catalog.join(res_doc))
         except DuplicateKeyError:
             # resource already exists — fetch current state
-            existing = resources_col.find_one(
-                {"projectId": res_doc["projectId"], "hwsetId": res_doc["hwsetId"]},
-                {"_id": 0, "projectId": 1, "hwsetId": 1, "name": 1, "total": 1, "allocatedToProject": 1, "available": 1, "notes": 1}
+            existing = resources.get(
+                res_doc["projectId"], res_doc["hwsetId"], RESOURCE_FIELDS, session=db_session()
             )
             if existing:
-                created_or_existing_resources.append(existing)
+                created_or_existing_resources.append(hardware_catalog.join(existing))
         except Exception:
             # any other error — attempt to fetch existing and continue
-            existing = resources_col.find_one(
-                {"projectId": res_doc["projectId"], "hwsetId": res_doc["hwsetId"]},
-                {"_id": 0, "projectId": 1, "hwsetId": 1, "name": 1, "total": 1, "allocatedToProject": 1, "available": 1, "notes": 1}
+            existing = resources.get(
+                res_doc["projectId"], res_doc["hwsetId"], RESOURCE_FIELDS, session=db_session()
             )
             if existing:
-                created_or_existing_resources.append(existing)
+                created_or_existing_resources.append(hardware_catalog.join(existing))
 
     return jsonify({
         "ok": True,
@@ -278,6 +431,75 @@ def create_project():
     }), 201
 
 
+@app.route("/api/projects/bulk", methods=["POST"])
+def bulk_create_projects():
+    """Create many projects in a few round trips; reports an outcome per item"""
+    payload = request.get_json(force=True) or {}
+    items = payload.get("projects")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "projects must be a non-empty list"}), 400
+    if len(items) > BULK_MAX_PROJECTS:
+        return jsonify({"error": f"At most {BULK_MAX_PROJECTS} projects per request"}), 400
+
+    required = ("projectId", "name", "createdBy")
+    results = []
+    valid = {}  # projectId -> index into items
+    for i, item in enumerate(items):
+        project_id = item.get("projectId") if isinstance(item, dict) else None
+        results.append({"projectId": project_id})
+        if not isinstance(item, dict) or not all(item.get(k) for k in required):
+            results[i].update(status=400, error="projectId, name, and createdBy are required")
+        elif not all(isinstance(item[k], str) for k in required):
+            results[i].update(status=400, error="projectId, name, and createdBy must be strings")
+        elif project_id in valid:
+            results[i].update(status=409, error="projectId appears more than once in this request")
+        else:
+            valid[project_id] = i
+
+    # Verify every creator with one $in query
+    known_users = users.existing_ids({items[i]["createdBy"] for i in valid.values()})
+
+    project_docs, resource_docs = [], []
+    for project_id, i in valid.items():
+        if items[i]["createdBy"] not in known_users:
+            results[i].update(status=400, error="Invalid user")
+            continue
+        try:
+            resource_docs.extend(default_resource_docs(project_id, items[i]))
+        except (TypeError, ValueError):
+            results[i].update(status=400, error="default_hwset1_total/default_hwset2_total must be integers")
+            continue
+        # The creator's membership is written below, so memberCount starts at 1
+        project_docs.append(new_project_doc(items[i], member_count=1))
+
+    # Chunked unordered insert_many: projects first, then the owners and
+    # default resources of the projects that were actually created
+    failed = projects.insert_many(project_docs)
+    created = [doc for doc in project_docs if doc["projectId"] not in failed]
+    memberships.add_many([(doc["projectId"], doc["createdBy"], "owner") for doc in created])
+    shared_cache.users_changed({doc["createdBy"] for doc in created})
+    created_ids = {doc["projectId"] for doc in created}
+    resources.insert_many([doc for doc in resource_docs if doc["projectId"] in created_ids])
+
+    for doc in project_docs:
+        result = results[valid[doc["projectId"]]]
+        error = failed.get(doc["projectId"])
+        if error is None:
+            result["status"] = 201
+        elif error == "duplicate":
+            result.update(status=409, error="projectId already exists")
+        else:
+            result.update(status=500, error=f"Failed to create project: {error}")
+
+    created_count = len(created)
+    return jsonify({
+        "ok": created_count == len(items),
+        "created": created_count,
+        "failed": len(items) - created_count,
+        "results": results
+    }), 201 if created_count == len(items) else 207
+
+
 @app.route("/api/projects/<project_id>/join", methods=["POST"])
 def join_project(project_id):
     try:
@@ -291,32 +513,42 @@ def join_project(project_id):
 
     try:
         # Verify user exists
-        user = users_col.find_one({"userId": user_id})
+        user = users.get(user_id, ("userId",))
         if not user:
             return jsonify({"error": "Invalid user"}), 400
 
-        # Find project
-        project = projects_col.find_one({"projectId": project_id})
+        # Find project; the access lookups are the ones check_project_access
+        # makes, so a batched "join + load details" checks access once
+        project = cached_lookup(("project", project_id), lambda: load_project_access(project_id))
         if not project:
             return jsonify({"error": "Project not found"}), 404
 
-        # Check if project is public or user is already a member
-        if not project.get("isPublic", False) and user_id not in project.get("members", []):
-            return jsonify({"error": "Access denied - project is private"}), 403
+        # Private projects can only be "joined" by existing members
+        if not project.get("isPublic", False):
+            member = cached_lookup(("member", project_id, user_id),
+                                   lambda: load_membership(project_id, user_id, project.get("version", 0)))
+            if not member:
+                return jsonify({"error": "Access denied - project is private"}), 403
+            keep_lookup(("project", project_id), project)
+            keep_lookup(("member", project_id, user_id), True)
+            return jsonify({"ok": True, "message": "Already a member of this project"}), 200
 
         # Add user to members if not already there
-        if user_id not in project.get("members", []):
-            projects_col.update_one(
-                {"projectId": project_id},
-                {"$addToSet": {"members": user_id}}
-            )
-            return jsonify({"ok": True, "message": "Successfully joined project"}), 200
+        if memberships.add(project_id, user_id):
+            shared_cache.project_changed(project_id)
+            shared_cache.users_changed([user_id])
+            # add() bumped the project's version
+            project = dict(project, version=project.get("version", 0) + 1)
+            message = "Successfully joined project"
         else:
-            return jsonify({"ok": True, "message": "Already a member of this project"}), 200
+            message = "Already a member of this project"
+        keep_lookup(("project", project_id), project)
+        keep_lookup(("member", project_id, user_id), True)
+        return jsonify({"ok": True, "message": message}), 200
 
     except Exception as e:
         # Log and return a safe error for debugging in dev
-        print("Error in join_project:", e)
+        log.exception("join_project failed", extra={"projectId": project_id, "userId": user_id})
         return jsonify({"error": "Internal server error", "detail": str(e)}), 500
 
 
@@ -328,13 +560,20 @@ def get_project_members(project_id):
     if not check_project_access(project_id, user_id):
         return jsonify({"error": "Access denied"}), 403
     
-    project = projects_col.find_one({"projectId": project_id})
+    project = projects.get(project_id, ("createdBy", "isPublic", "memberCount"))
     if not project:
         return jsonify({"error": "Project not found"}), 404
     
-    members = project.get("members", [])
+    # Paginated: pass ?limit=N and ?after=<nextCursor> for the following page
+    try:
+        limit = int(request.args.get("limit", MEMBERS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    members, next_cursor = memberships.list_members(project_id, limit, request.args.get("after"))
     return jsonify({
         "members": members,
+        "memberCount": project.get("memberCount", len(members)),
+        "nextCursor": next_cursor,
         "createdBy": project.get("createdBy"),
         "isPublic": project.get("isPublic", False)
     }), 200
@@ -348,27 +587,34 @@ def remove_project_member(project_id, member_id):
     if not requesting_user:
         return jsonify({"error": "requestingUser is required"}), 400
 
-    project = projects_col.find_one({"projectId": project_id})
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
-
-    # Only the creator may remove members
-    if project.get("createdBy") != requesting_user:
-        return jsonify({"error": "Only the project owner may remove members"}), 403
-
-    # Prevent removing the project owner
-    if member_id == project.get("createdBy"):
-        return jsonify({"error": "Cannot remove the project owner"}), 400
+    expected = expected_version()
 
-    result = projects_col.update_one(
-        {"projectId": project_id},
-        {"$pull": {"members": member_id}}
-    )
+    for _ in attempts(expected):
+        project = projects.get(project_id, ("createdBy", "version"))
+        if not project:
+            return jsonify({"error": "Project not found"}), 404
 
-    if result.modified_count > 0:
-        return jsonify({"ok": True, "removed": member_id}), 200
-    else:
+        # Only the creator may remove members
+        if project.get("createdBy") != requesting_user:
+            return jsonify({"error": "Only the project owner may remove members"}), 403
+
+        # Prevent removing the project owner
+        if member_id == project.get("createdBy"):
+            return jsonify({"error": "Cannot remove the project owner"}), 400
+
+        version = check_version(project, expected)
+        if not memberships.is_member(project_id, member_id):
+            return jsonify({"ok": True, "message": "User was not a member"}), 200
+
+        # Claim the version the checks ran against, then remove
+        if not projects.update_versioned(project_id, version):
+            continue
+        if memberships.remove(project_id, member_id):
+            shared_cache.project_changed(project_id)
+            shared_cache.users_changed([member_id])
+            return jsonify({"ok": True, "removed": member_id}), 200
         return jsonify({"ok": True, "message": "User was not a member"}), 200
+    return version_conflict(expected)
 
 
 @app.route("/api/projects/<project_id>/invite", methods=["POST"])
@@ -385,17 +631,14 @@ def invite_to_project(project_id):
         return jsonify({"error": "Access denied"}), 403
     
     # Verify invited user exists
-    user = users_col.find_one({"userId": invite_user})
+    user = users.get(invite_user, ("userId",))
     if not user:
         return jsonify({"error": "Invited user does not exist"}), 404
     
     # Add user to project members
-    result = projects_col.update_one(
-        {"projectId": project_id},
-        {"$addToSet": {"members": invite_user}}
-    )
-    
-    if result.modified_count > 0:
+    if memberships.add(project_id, invite_user):
+        shared_cache.project_changed(project_id)
+        shared_cache.users_changed([invite_user])
         return jsonify({"ok": True, "message": f"Successfully invited {invite_user} to project"}), 200
     else:
         return jsonify({"ok": True, "message": f"{invite_user} is already a member"}), 200
@@ -404,6 +647,7 @@ def invite_to_project(project_id):
 # ---------- HARDWARE RESOURCE ENDPOINTS ----------
 
 @app.route("/api/projects/<project_id>/resources", methods=["GET"])
+@degraded.read_fallback
 def get_project_resources(project_id):
     user_id = request.args.get("userId")
     
@@ -411,21 +655,70 @@ def get_project_resources(project_id):
     if not check_project_access(project_id, user_id):
         return jsonify({"error": "Access denied"}), 403
     
-    docs = list(
-        resources_col.find(
-            {"projectId": project_id},
-            {"_id": 0, "projectId": 1, "hwsetId": 1, "name": 1, "total": 1,
-             "allocatedToProject": 1, "available": 1, "notes": 1},
-        )
-    )
-    return jsonify(docs), 200
+    load = lambda: resources.list_for_project(project_id, RESOURCE_FIELDS)
+    docs = shared_cache.project_resources(project_id, load) if use_shared_cache() else load()
+    return jsonify(hardware_catalog.join_all(docs)), 200
+
+
+def checkout_once(project_id, hwset_id, quantity, expected):
+    """One checkout attempt; returns (response, done), done=False when there weren't enough units"""
+    # Merge with concurrent checkouts of this hardware set (not inside a
+    # transaction, and not when pinned to a version with If-Match)
+    if group_commit.enabled and expected is None and db_session() is None:
+        result = group_commit.submit(project_id, hwset_id, -quantity)
+        if result.status == APPLIED:
+            resource_history.record(project_id, hwset_id, result.available, result.allocated)
+            shared_cache.resource_changed(project_id, hwset_id)
+        return group_commit_response(result, "checkout", quantity, hwset_id), result.status != INSUFFICIENT
+    
+    for _ in attempts(expected):
+        # Find the resource
+        resource = resources.get(project_id, hwset_id, RESOURCE_COUNTER_FIELDS, session=db_session())
+        if not resource:
+            return (jsonify({"error": "Hardware set not found"}), 404), True
+        version = check_version(resource, expected)
+        
+        # Check availability
+        current_available = resource.get("available", 0)
+        if quantity > current_available:
+            return (jsonify({"error": f"Only {current_available} units available"}), 400), False
+        
+        # Update quantities, if nobody else did since the read
+        new_available = current_available - quantity
+        new_allocated = resource.get("allocatedToProject", 0) + quantity
+        
+        if resources.set_counts(project_id, hwset_id, new_available, new_allocated, version, session=db_session()):
+            # Inside an idempotent transaction: once it commits
+            after_commit(resource_history.record, project_id, hwset_id, new_available, new_allocated)
+            after_commit(shared_cache.resource_changed, project_id, hwset_id, version + 1)
+            return (jsonify({
+                "ok": True, 
+                "message": f"Checked out {quantity} units of {hwset_id}",
+                "available": new_available,
+                "allocated": new_allocated,
+                "version": version + 1
+            }), 200, {"ETag": etag(version + 1)}), True
+    return version_conflict(expected), True
+
+
+def checkout_refused(project_id, hwset_id, quantity):
+    """Answer for a waiting checkout whose time ran out before its turn; takes nothing"""
+    resource = resources.get(project_id, hwset_id, RESOURCE_COUNTER_FIELDS)
+    if not resource:
+        return jsonify({"error": "Hardware set not found"}), 404
+    available = resource.get("available", 0)
+    if quantity > available:
+        return jsonify({"error": f"Only {available} units available"}), 400
+    return jsonify({"error": f"Only {available} units available, and earlier checkouts are waiting for them"}), 400
 
 
 @app.route("/api/projects/<project_id>/resources/<hwset_id>/checkout", methods=["POST"])
+@idempotency.idempotent
 def checkout_hardware(project_id, hwset_id):
     data = request.get_json(force=True) or {}
     quantity = data.get("quantity", 1)
     user_id = data.get("userId")  # Should be passed from frontend
+    wait = data.get("wait", 0)  # seconds to wait in line if units are short
     
     if not user_id:
         return jsonify({"error": "userId is required"}), 400
@@ -437,34 +730,25 @@ def checkout_hardware(project_id, hwset_id):
     if not isinstance(quantity, int) or quantity <= 0:
         return jsonify({"error": "quantity must be a positive integer"}), 400
     
-    # Find the resource
-    resource = resources_col.find_one({"projectId": project_id, "hwsetId": hwset_id})
-    if not resource:
-        return jsonify({"error": "Hardware set not found"}), 404
-    
-    # Check availability
-    current_available = resource.get("available", 0)
-    if quantity > current_available:
-        return jsonify({"error": f"Only {current_available} units available"}), 400
+    if isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0:
+        return jsonify({"error": "wait must be a non-negative number of seconds"}), 400
     
-    # Update quantities
-    new_available = current_available - quantity
-    new_allocated = resource.get("allocatedToProject", 0) + quantity
+    expected = expected_version()
     
-    resources_col.update_one(
-        {"projectId": project_id, "hwsetId": hwset_id},
-        {"$set": {"available": new_available, "allocatedToProject": new_allocated}}
-    )
+    # Long-poll on the waitlist. Not with If-Match (every checkin changes the
+    # version) or inside a transaction (its snapshot never sees new checkins).
+    if wait and waitlist.enabled and expected is None and db_session() is None:
+        return waitlist.wait_for(
+            (project_id, hwset_id), lambda: checkout_once(project_id, hwset_id, quantity, expected), wait,
+            lambda: checkout_refused(project_id, hwset_id, quantity),
+        )
     
-    return jsonify({
-        "ok": True, 
-        "message": f"Checked out {quantity} units of {hwset_id}",
-        "available": new_available,
-        "allocated": new_allocated
-    }), 200
+    response, _ = checkout_once(project_id, hwset_id, quantity, expected)
+    return response
 
 
 @app.route("/api/projects/<project_id>/resources/<hwset_id>/checkin", methods=["POST"])
+@idempotency.idempotent
 def checkin_hardware(project_id, hwset_id):
     data = request.get_json(force=True) or {}
     quantity = data.get("quantity", 1)
@@ -480,33 +764,187 @@ def checkin_hardware(project_id, hwset_id):
     if not isinstance(quantity, int) or quantity <= 0:
         return jsonify({"error": "quantity must be a positive integer"}), 400
     
-    # Find the resource
-    resource = resources_col.find_one({"projectId": project_id, "hwsetId": hwset_id})
-    if not resource:
-        return jsonify({"error": "Hardware set not found"}), 404
-    
-    # Check if we can check in this many
-    current_allocated = resource.get("allocatedToProject", 0)
-    if quantity > current_allocated:
-        return jsonify({"error": f"Only {current_allocated} units are checked out"}), 400
-    
-    # Update quantities
-    new_allocated = current_allocated - quantity
-    new_available = resource.get("available", 0) + quantity
+    expected = expected_version()
+    
+    # Merge with concurrent checkins of this hardware set (not inside a
+    # transaction, and not when pinned to a version with If-Match)
+    if group_commit.enabled and expected is None and db_session() is None:
+        result = group_commit.submit(project_id, hwset_id, quantity)
+        if result.status == APPLIED:
+            resource_history.record(project_id, hwset_id, result.available, result.allocated)
+            shared_cache.resource_changed(project_id, hwset_id)
+            waitlist.notify((project_id, hwset_id))
+        return group_commit_response(result, "checkin", quantity, hwset_id)
+    
+    for _ in attempts(expected):
+        # Find the resource
+        resource = resources.get(project_id, hwset_id, RESOURCE_COUNTER_FIELDS, session=db_session())
+        if not resource:
+            return jsonify({"error": "Hardware set not found"}), 404
+        version = check_version(resource, expected)
+        
+        # Check if we can check in this many
+        current_allocated = resource.get("allocatedToProject", 0)
+        if quantity > current_allocated:
+            return jsonify({"error": f"Only {current_allocated} units are checked out"}), 400
+        
+        # Update quantities, if nobody else did since the read
+        new_allocated = current_allocated - quantity
+        new_available = resource.get("available", 0) + quantity
+        
+        if resources.set_counts(project_id, hwset_id, new_available, new_allocated, version, session=db_session()):
+            # Inside an idempotent transaction: once it commits
+            after_commit(resource_history.record, project_id, hwset_id, new_available, new_allocated)
+            after_commit(shared_cache.resource_changed, project_id, hwset_id, version + 1)
+            # Freed units go to the oldest waiting checkout
+            after_commit(waitlist.notify, (project_id, hwset_id))
+            return jsonify({
+                "ok": True, 
+                "message": f"Checked in {quantity} units of {hwset_id}",
+                "available": new_available,
+                "allocated": new_allocated,
+                "version": version + 1
+            }), 200, {"ETag": etag(version + 1)}
+    return version_conflict(expected)
+
+
+@app.route("/api/projects/<project_id>/resources/<hwset_id>/history", methods=["GET"])
+def get_resource_history(project_id, hwset_id):
+    """Availability over a time range (?from=&to= ISO 8601, ?resolution=auto|raw|hour|day)"""
+    user_id = request.args.get("userId")
     
-    resources_col.update_one(
-        {"projectId": project_id, "hwsetId": hwset_id},
-        {"$set": {"available": new_available, "allocatedToProject": new_allocated}}
-    )
+    # Check authorization
+    if not check_project_access(project_id, user_id):
+        return jsonify({"error": "Access denied"}), 403
     
+    try:
+        start, end = parse_range(request.args.get("from"), request.args.get("to"))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time range: {e}"}), 400
+    resolution = request.args.get("resolution", "auto")
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    
+    points, resolution, truncated = resource_history.query(project_id, hwset_id, start, end, resolution)
+    for point in points:
+        point["ts"] = point["ts"].isoformat()
+    return jsonify({
+        "projectId": project_id,
+        "hwsetId": hwset_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "resolution": resolution,
+        "points": points,
+        "truncated": truncated
+    }), 200
+
+
+# ---------- SYNC ENDPOINT ----------
+
+def changed_docs(list_changed, project_ids, fields, since=None):
+    """Documents of these projects stamped after `since` (all of them without it)"""
+    return list_changed(project_ids, fields, since) if project_ids else []
+
+
+@app.route("/api/sync", methods=["GET"])
+def sync_changes():
+    """The user's projects and resources changed since ?cursor= (see sync.py).
+    Without a cursor, or with one too old to delta from, everything ("full": true)"""
+    user_id = request.args.get("userId")
+    if not user_id:
+        return jsonify({"error": "userId is required"}), 400
+    try:
+        since, catalog_version = parse_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify({"error": "Invalid sync cursor"}), 400
+
+    # Taken before the queries: every write stamped at or below it is visible to them
+    hardware_catalog.entries()
+    next_cursor = make_cursor(max(since, horizon()), hardware_catalog.version)
+    full = not since or since < tombstone_horizon() or catalog_version != hardware_catalog.version
+
+    member_seqs = memberships.project_seqs_for_user(user_id)
+    if full:
+        project_docs = changed_docs(projects.list_by_ids, list(member_seqs), PROJECT_FIELDS)
+        resource_docs = changed_docs(resources.list_for_projects, list(member_seqs), RESOURCE_FIELDS)
+        removed = []
+    else:
+        # Projects joined after the cursor are sent whole, the others only if they changed
+        joined = [p for p, seq in member_seqs.items() if seq > since]
+        known = [p for p, seq in member_seqs.items() if seq <= since]
+        project_docs = changed_docs(projects.list_by_ids, joined, PROJECT_FIELDS) + \
+            changed_docs(projects.list_by_ids, known, PROJECT_FIELDS, since)
+        resource_docs = changed_docs(resources.list_for_projects, joined, RESOURCE_FIELDS) + \
+            changed_docs(resources.list_for_projects, known, RESOURCE_FIELDS, since)
+        # Tombstones; a user removed and added again is a member now
+        removed = sorted(memberships.removed_since(user_id, since) - member_seqs.keys())
+
     return jsonify({
-        "ok": True, 
-        "message": f"Checked in {quantity} units of {hwset_id}",
-        "available": new_available,
-        "allocated": new_allocated
+        "cursor": next_cursor,
+        "full": full,
+        "projects": project_docs,
+        "resources": hardware_catalog.join_all(resource_docs),
+        "removedProjects": removed
     }), 200
 
 
+# ---------- BATCH ENDPOINT ----------
+
+def run_sub_operation(op):
+    """Dispatch one /api/batch sub-operation to its handler; returns (status, body)"""
+    if not isinstance(op, dict) or not isinstance(op.get("path"), str):
+        return 400, {"error": "each operation needs a path"}
+    method = str(op.get("method", "GET")).upper()
+    path = op["path"]
+    if not path.startswith("/api/") or path.split("?")[0].rstrip("/") == "/api/batch":
+        return 400, {"error": "path must be an /api/ endpoint other than /api/batch"}
+
+    headers = {k: v for k, v in (op.get("headers") or {}).items() if k in ("Idempotency-Key", "If-Match")}
+    builder = EnvironBuilder(path=path, method=method, json=op.get("body"), headers=headers)
+    # Runs inside the batch's app context, so flask.g (and the lookup cache)
+    # is shared; before/after_request hooks run once for the whole batch
+    with app.request_context(builder.get_environ()):
+        try:
+            rv = app.dispatch_request()
+        except Exception as e:
+            try:
+                rv = app.handle_user_exception(e)
+            except Exception as unhandled:
+                return 500, {"error": "Internal server error", "detail": str(unhandled)}
+        response = app.make_response(rv)
+    body = response.get_json(silent=True)
+    if body is None and response.status_code >= 400:
+        body = {"error": response.status}  # e.g. routing errors render as HTML
+    return response.status_code, body
+
+
+@app.route("/api/batch", methods=["POST"])
+def batch():
+    """Run an ordered list of API calls in one HTTP request"""
+    payload = request.get_json(force=True) or {}
+    operations = payload.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"At most {BATCH_MAX_OPERATIONS} operations per batch"}), 400
+    stop_on_error = bool(payload.get("stopOnError", False))
+
+    results = []
+    failed = False
+    for op in operations:
+        if failed and stop_on_error:
+            results.append({"status": 424, "body": {"error": "Skipped after an earlier operation failed"}})
+            continue
+        status, body = run_sub_operation(op)
+        results.append({"status": status, "body": body})
+        failed = failed or status >= 400
+        # Writes may change access and documents read by later operations
+        if isinstance(op, dict) and str(op.get("method", "GET")).upper() != "GET":
+            g.lookup_cache = g.pop("lookup_kept", {})
+
+    return jsonify({"ok": not failed, "results": results}), 200
+
+
 if __name__ == "__main__":
     # Runs on http://127.0.0.1:5000
     app.run(host="127.0.0.1", port=5000, debug=True)
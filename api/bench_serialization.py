@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Serialization / compression benchmark
+Measures bytes on the wire and CPU time per response for a large project
+list using the stdlib encoder vs orjson, with identity/gzip/brotli encoding.
+Does not need MongoDB.
+
+Usage:
+    python bench_serialization.py [--projects 2000] [--iterations 200]
+"""
+
+import argparse
+import time
+
+from flask import Flask, jsonify
+
+from serialization import (
+    available_encodings,
+    init_compression,
+    make_json_provider,
+    orjson_available,
+)
+
+
+def sample_projects(count):
+    """Project list shaped like GET /api/projects output."""
+    return [
+        {
+            "projectId": f"P-{i:06d}",
+            "name": f"ECE 461L Team {i} Hardware Project",
+            "description": "Sensor network prototype using Arduino and Raspberry Pi kits " * 2,
+            "createdAt": "2025-01-15T12:00:00Z",
+            "createdBy": f"student_{i % 500}",
+            "isPublic": i % 3 == 0,
+            "members": [f"student_{(i + k) % 500}" for k in range(i % 8 + 1)],
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(serializer, min_bytes):
+    app = Flask(__name__)
+    app.json = make_json_provider(app, serializer)
+    init_compression(app, min_bytes=min_bytes)
+    return app
+
+
+def run_case(serializer, encoding, docs, iterations):
+    app = build_app(serializer, min_bytes=-1 if encoding == "identity" else 1024)
+
+    @app.route("/projects")
+    def projects():
+        return jsonify(docs), 200
+
+    client = app.test_client()
+    headers = {"Accept-Encoding": encoding}
+
+    # warm up
+    client.get("/projects", headers=headers)
+
+    size = 0
+    start = time.process_time()
+    for _ in range(iterations):
+        resp = client.get("/projects", headers=headers)
+        size = len(resp.data)
+    cpu_ms = (time.process_time() - start) * 1000 / iterations
+    return size, cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = sample_projects(args.projects)
+    serializers = ["stdlib"] + (["orjson"] if orjson_available() else [])
+    encodings = ["identity"] + list(reversed(available_encodings()))
+
+    print(f"{args.projects} projects, {args.iterations} iterations per case")
+    if not orjson_available():
+        print("⚠️  orjson not installed - only the stdlib encoder is measured")
+    print(f"{'serializer':<10} {'encoding':<10} {'bytes':>10} {'cpu ms/resp':>12}")
+
+    baseline = None
+    for serializer in serializers:
+        for encoding in encodings:
+            size, cpu_ms = run_case(serializer, encoding, docs, args.iterations)
+            if baseline is None:
+                baseline = (size, cpu_ms)
+            print(
+                f"{serializer:<10} {encoding:<10} {size:>10} {cpu_ms:>12.3f}"
+                f"   ({size / baseline[0]:.2f}x bytes, {cpu_ms / baseline[1]:.2f}x cpu)"
+            )
+
+
+if __name__ == "__main__":
+    main()
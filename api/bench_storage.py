@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+App time vs DB time per route
+Runs the same request mix through the Flask test client (no HTTP server)
+on the in-memory storage backend and, when MONGODB_URI is set, on MongoDB.
+The memory run is the cost of the API logic itself (routing, validation,
+serialization); the difference to the Mongo run is time spent in the
+database round trips. Mongo runs create `bench_*` documents in the
+configured database.
+
+Usage:
+    python bench_storage.py [--iterations 2000] [--backends memory mongo]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+from dotenv import load_dotenv
+
+import app as app_module
+
+USER = "bench_user"
+PROJECT = "bench_storage_project"
+
+ROUTES = [
+    ("GET project", "get", f"/api/projects/{PROJECT}?userId={USER}", None),
+    ("GET resources", "get", f"/api/projects/{PROJECT}/resources?userId={USER}", None),
+    ("GET my projects", "get", f"/api/projects?userId={USER}", None),
+    ("POST checkout", "post", f"/api/projects/{PROJECT}/resources/HWSet1/checkout", {"userId": USER, "quantity": 1}),
+    ("POST checkin", "post", f"/api/projects/{PROJECT}/resources/HWSet1/checkin", {"userId": USER, "quantity": 1}),
+]
+
+
+def run_backend(backend, iterations):
+    app_module.init_db(backend)
+    app_module.ensure_indexes()
+    client = app_module.app.test_client()
+    client.post("/api/signup", json={"userId": USER, "password": "pw"})
+    client.post("/api/projects", json={
+        "projectId": PROJECT, "name": "Storage benchmark", "createdBy": USER,
+        "default_hwset1_total": 1000000, "default_hwset2_total": 1000000,
+    })
+
+    timings = {label: [] for label, *_ in ROUTES}
+    for i in range(iterations + 50):
+        for label, method, path, body in ROUTES:
+            start = time.perf_counter()
+            resp = getattr(client, method)(path, json=body)
+            elapsed = time.perf_counter() - start
+            if resp.status_code != 200:
+                raise RuntimeError(f"{backend}: {label} returned {resp.status_code}: {resp.get_data(as_text=True)}")
+            if i >= 50:  # first iterations warm up pools and caches
+                timings[label].append(elapsed)
+
+    app_module.storage.close()
+    return {label: statistics.median(values) * 1e6 for label, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--backends", nargs="+", default=["memory", "mongo"])
+    args = parser.parse_args()
+
+    load_dotenv()
+    backends = list(args.backends)
+    if "mongo" in backends and not os.getenv("MONGODB_URI"):
+        print("⚠️  MONGODB_URI not set - measuring the memory backend only")
+        backends.remove("mongo")
+
+    results = {backend: run_backend(backend, args.iterations) for backend in backends}
+
+    print(f"median µs per request, {args.iterations} iterations")
+    header = f"{'route':<18}" + "".join(f"{b:>10}" for b in backends)
+    if "memory" in results and "mongo" in results:
+        header += f"{'app':>10}{'db':>10}"
+    print(header)
+    for label, *_ in ROUTES:
+        line = f"{label:<18}" + "".join(f"{results[b][label]:>10.0f}" for b in backends)
+        if "memory" in results and "mongo" in results:
+            app_us = results["memory"][label]
+            line += f"{app_us:>10.0f}{results['mongo'][label] - app_us:>10.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
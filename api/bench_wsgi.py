@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+WSGI server configuration benchmark (checkout workload)
+Starts the API under each server configuration, drives concurrent
+checkout/checkin requests over keep-alive sessions and reports throughput
+and latency percentiles. Needs MONGODB_URI pointing at a dev database; it
+creates a `bench_*` user and project there.
+
+Configurations:
+    dev              python app.py (Flask dev server, for reference)
+    waitress:T       waitress with T threads
+    gunicorn:WxT     gunicorn with W gthread workers x T threads
+    <config>+gc      the same with GROUP_COMMIT=on (merged counter writes)
+
+Usage:
+    python bench_wsgi.py --configs dev waitress:16 gunicorn:2x8 gunicorn:4x8 --clients 32 --duration 15
+    python bench_wsgi.py --configs waitress:32 waitress:32+gc --clients 128
+"""
+
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+USER = "bench_user"
+PROJECT = "bench_checkout_project"
+
+
+def server_command(config, port):
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG="0")
+    config, _, flags = config.partition("+")
+    if flags == "gc":
+        env["GROUP_COMMIT"] = "on"
+    if config == "dev":
+        code = ("import app; app.app.run(host='127.0.0.1', port=%d, debug=False, threaded=True)" % port)
+        return [sys.executable, "-c", code], env
+    kind, _, size = config.partition(":")
+    if kind == "waitress":
+        env["WAITRESS_THREADS"] = size or "16"
+        env["HOST"] = "127.0.0.1"
+        return [sys.executable, "wsgi.py"], env
+    if kind == "gunicorn":
+        workers, _, threads = (size or "2x8").partition("x")
+        env["WEB_CONCURRENCY"] = workers
+        env["GUNICORN_THREADS"] = threads or "8"
+        env["GUNICORN_BIND"] = f"127.0.0.1:{port}"
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], env
+    raise ValueError(f"Unknown config: {config}")
+
+
+def wait_ready(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base + "/api/projects/public", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def setup_data(base):
+    s = requests.Session()
+    s.post(base + "/api/signup", json={"userId": USER, "password": "pw"})
+    s.post(base + "/api/projects", json={
+        "projectId": PROJECT, "name": "Checkout benchmark", "createdBy": USER,
+        "default_hwset1_total": 1000000, "default_hwset2_total": 1000000,
+    })
+
+
+def run_load(base, clients, duration):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def client_loop(n):
+        session = requests.Session()  # pooled keep-alive connection per client
+        hwset = "HWSet1" if n % 2 == 0 else "HWSet2"
+        local, failed, i = [], 0, 0
+        while time.monotonic() < stop:
+            action = "checkout" if i % 2 == 0 else "checkin"
+            i += 1
+            start = time.perf_counter()
+            try:
+                r = session.post(f"{base}/api/projects/{PROJECT}/resources/{hwset}/{action}",
+                                 json={"userId": USER, "quantity": 1}, timeout=10)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - start)
+            failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client_loop, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def bench(config, port, clients, duration):
+    cmd, env = server_command(config, port)
+    proc = subprocess.Popen(cmd, cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base)
+        setup_data(base)
+        run_load(base, clients, 2)  # warm up pools and caches
+        latencies, errors = run_load(base, clients, duration)
+    finally:
+        # SIGTERM exercises the graceful shutdown path
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=35)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    latencies.sort()
+    return {
+        "config": config,
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "mean": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=["dev", "waitress:16", "gunicorn:2x8", "gunicorn:4x8"])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent keep-alive clients")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of load per config")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    if not os.getenv("MONGODB_URI"):
+        from dotenv import load_dotenv
+        load_dotenv()
+        if not os.getenv("MONGODB_URI"):
+            print("❌ MONGODB_URI not set")
+            return 1
+
+    print(f"checkout/checkin, {args.clients} clients, {args.duration:.0f}s per config")
+    print(f"{'config':<16} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for config in args.configs:
+        r = bench(config, args.port, args.clients, args.duration)
+        print(f"{r['config']:<16} {r['rps']:>9.1f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} {r['errors']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
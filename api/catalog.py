@@ -0,0 +1,143 @@
+"""
+Hardware catalog: static metadata per hardware set, cached in-process.
+
+`Resources` documents hold only the counters of one project's hardware set
+({projectId, hwsetId, total, available, allocatedToProject, version}); the
+name and notes of each hwsetId live once in the `HardwareCatalog`
+collection. Responses are joined in memory, so resource reads and the
+checkout/checkin path move small documents only.
+
+Every catalog write bumps a version document. Each process keeps the whole
+catalog (a handful of entries) in memory and compares its version with the
+stored one at most every HARDWARE_CATALOG_CHECK_SECONDS (5); a change
+reloads it. A write from this process invalidates its copy immediately.
+
+A resource document may still carry its own `name`/`notes` (data not yet
+migrated, or a per-project note); those win over the catalog. Migration v7
+(migrate_database.py) moves existing data over.
+
+Usage:
+    python catalog.py list
+    python catalog.py set HWSet3 --name "ESP32 Dev Board" --notes "ESP32 boards"
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+HARDWARE_CATALOG_CHECK_SECONDS = float(os.getenv("HARDWARE_CATALOG_CHECK_SECONDS", "5"))
+
+# Entries for the hardware sets every new project gets
+DEFAULT_HARDWARE = (
+    {"hwsetId": "HWSet1", "name": "Arduino Uno Kit", "notes": "Arduino Uno starter kits"},
+    {"hwsetId": "HWSet2", "name": "Raspberry Pi Kit", "notes": "Raspberry Pi kits"},
+)
+
+log = logging.getLogger("softwarelab.catalog")
+
+
+class HardwareCatalog:
+    def __init__(self, repo=None, check_interval=HARDWARE_CATALOG_CHECK_SECONDS, clock=time.monotonic):
+        self.repo = repo
+        self.check_interval = check_interval
+        self.clock = clock
+        self._entries = {}
+        self._version = None
+        self._checked_at = None
+        self._refreshing = threading.Lock()
+        self.reloads = 0
+
+    def bind(self, repo):
+        self.repo = repo
+        self.invalidate()
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        self._checked_at = None
+
+    def ensure_defaults(self, entries=DEFAULT_HARDWARE):
+        """Create the default entries that don't exist yet (existing ones are kept)."""
+        if self.repo.insert_missing(entries):
+            self.invalidate()
+
+    def put(self, entry):
+        """Create or replace the metadata of one hwsetId."""
+        self.repo.upsert(entry)
+        self.invalidate()
+
+    def entries(self):
+        """{hwsetId: entry}; re-checks the stored version when the interval has passed."""
+        checked_at = self._checked_at
+        if checked_at is None or self.clock() - checked_at >= self.check_interval:
+            self._refresh()
+        return self._entries
+
+    def _refresh(self):
+        # One thread checks; the others keep using the current snapshot
+        # (on the very first load they wait for it)
+        if not self._refreshing.acquire(blocking=self._version is None):
+            return
+        try:
+            version = self.repo.version()
+            if version != self._version:
+                self._entries = {e["hwsetId"]: e for e in self.repo.load()}
+                self._version = version
+                self.reloads += 1
+            self._checked_at = self.clock()
+        except Exception:
+            # Keep serving the last loaded catalog; retry on the next call
+            log.warning("hardware catalog refresh failed", exc_info=True)
+        finally:
+            self._refreshing.release()
+
+    def join(self, resource):
+        """Resource counters plus the catalog fields of its hwsetId."""
+        if resource is None:
+            return None
+        entry = self.entries().get(resource.get("hwsetId"), {})
+        joined = dict(resource)
+        joined.setdefault("name", entry.get("name", resource.get("hwsetId")))
+        joined.setdefault("notes", entry.get("notes", ""))
+        return joined
+
+    def join_all(self, resources):
+        return [self.join(r) for r in resources]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("list", "set"))
+    parser.add_argument("hwset_id", nargs="?")
+    parser.add_argument("--name")
+    parser.add_argument("--notes", default="")
+    args = parser.parse_args(argv)
+    if args.command == "set" and not (args.hwset_id and args.name):
+        parser.error("set needs a hwsetId and --name")
+
+    from dotenv import load_dotenv
+
+    from storage import open_storage
+
+    load_dotenv()
+    storage = open_storage(timeout_ms=0)
+    try:
+        catalog = HardwareCatalog(storage.hardware_catalog)
+        if args.command == "set":
+            catalog.put({"hwsetId": args.hwset_id, "name": args.name, "notes": args.notes})
+            print(f"Saved {args.hwset_id}")
+        for hwset_id, entry in sorted(catalog.entries().items()):
+            print(f"{hwset_id:<12} {entry.get('name', '')}  {entry.get('notes', '')}")
+        print(f"Catalog version {catalog.version}")
+    finally:
+        storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,132 @@
+"""
+Read preference / read concern / write concern per endpoint class.
+
+Endpoint classes:
+- hot_reads:       listing and discovery (may be served by secondaries)
+- strong_reads:    reads that must see the latest writes (access checks, resources)
+- critical_writes: checkout/checkin, project and membership changes
+- bulk_writes:     bulk endpoints and batch jobs where throughput matters most
+
+Each class is configured from the environment, e.g.
+
+    HOT_READS_READ_PREFERENCE=secondaryPreferred
+    HOT_READS_READ_CONCERN=local
+    HOT_READS_MAX_STALENESS=90
+    CRITICAL_WRITES_WRITE_CONCERN=majority
+    CRITICAL_WRITES_JOURNAL=true
+    BULK_WRITES_WRITE_CONCERN=1
+
+and applied through Collection.with_options() handles, cached per
+(class, collection). Unset values fall back to the client's defaults.
+"""
+
+import os
+
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+from pymongo.write_concern import WriteConcern
+
+HOT_READS = "hot_reads"
+STRONG_READS = "strong_reads"
+CRITICAL_WRITES = "critical_writes"
+BULK_WRITES = "bulk_writes"
+
+ENDPOINT_CLASSES = (HOT_READS, STRONG_READS, CRITICAL_WRITES, BULK_WRITES)
+
+# Documents per insert_many round trip for bulk_writes
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# Defaults per class; env vars override individual settings
+DEFAULTS = {
+    HOT_READS: {"read_preference": "secondaryPreferred", "read_concern": "local"},
+    STRONG_READS: {"read_preference": "primary"},
+    CRITICAL_WRITES: {"read_preference": "primary", "write_concern": "majority", "journal": "true"},
+    BULK_WRITES: {"write_concern": "1"},
+}
+
+_READ_PREFERENCES = {
+    "primary": Primary,
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _parse_read_preference(name, max_staleness=None):
+    cls = _READ_PREFERENCES.get(name.lower())
+    if cls is None:
+        raise ValueError(f"Unknown read preference: {name}")
+    if cls is Primary:
+        return ReadPreference.PRIMARY
+    if max_staleness:
+        return cls(max_staleness=int(max_staleness))
+    return cls()
+
+
+def _parse_write_concern(w, journal=None, wtimeout=None):
+    kwargs = {}
+    if w:
+        kwargs["w"] = int(w) if w.isdigit() else w
+    if journal is not None:
+        kwargs["j"] = journal.lower() in ("1", "true", "yes")
+    if wtimeout:
+        kwargs["wtimeout"] = int(wtimeout)
+    return WriteConcern(**kwargs)
+
+
+class EndpointPolicy:
+    """Options for one endpoint class, as keyword arguments for with_options()."""
+
+    def __init__(self, name, read_preference=None, read_concern=None, write_concern=None,
+                 journal=None, wtimeout=None, max_staleness=None):
+        self.name = name
+        self.options = {}
+        if read_preference:
+            self.options["read_preference"] = _parse_read_preference(read_preference, max_staleness)
+        if read_concern:
+            self.options["read_concern"] = ReadConcern(read_concern)
+        if write_concern or journal is not None or wtimeout:
+            self.options["write_concern"] = _parse_write_concern(write_concern, journal, wtimeout)
+
+    @classmethod
+    def from_env(cls, name, environ=os.environ):
+        settings = dict(DEFAULTS.get(name, {}))
+        prefix = name.upper() + "_"
+        for key in ("read_preference", "read_concern", "write_concern", "journal", "wtimeout", "max_staleness"):
+            value = environ.get(prefix + key.upper())
+            if value is not None:
+                settings[key] = value or None
+        return cls(name, **settings)
+
+    def describe(self):
+        return {k: repr(v) for k, v in self.options.items()}
+
+
+class PolicyRegistry:
+    """Caches with_options() collection handles per (endpoint class, collection)."""
+
+    def __init__(self, db, policies=None):
+        self.db = db
+        self.policies = policies or {name: EndpointPolicy.from_env(name) for name in ENDPOINT_CLASSES}
+        self._handles = {}
+
+    def collection(self, endpoint_class, name):
+        key = (endpoint_class, name)
+        handle = self._handles.get(key)
+        if handle is None:
+            base = self.db.get_collection(name)
+            options = self.policies[endpoint_class].options
+            handle = base.with_options(**options) if options else base
+            self._handles[key] = handle
+        return handle
+
+    def describe(self):
+        return {name: policy.describe() for name, policy in self.policies.items()}
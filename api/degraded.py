@@ -0,0 +1,208 @@
+"""
+Degraded mode: bounded waits on MongoDB, a circuit breaker, and stale reads.
+
+Three layers keep request latency bounded while the database is slow or
+unreachable:
+
+1. Timeouts. The MongoClient gets a per-operation budget (timeoutMS, see
+   storage.py), so no call waits the driver's default 30 s for server
+   selection. Read endpoints that can fall back (below) run their whole
+   view under a tighter DEGRADED_READ_BUDGET_MS.
+2. Circuit breaker. After BREAKER_FAILURES consecutive database timeouts or
+   connection errors the breaker opens for BREAKER_COOLDOWN_SECONDS:
+   requests don't touch the database at all. Then one request is let
+   through as a probe; success closes the breaker, failure re-opens it.
+3. Stale fallback. Project lists, project details and resource lists
+   (views wrapped with `read_fallback`) remember their last successful
+   200 response per URL (bounded LRU, DEGRADED_CACHE_SIZE entries, at most
+   DEGRADED_MAX_STALE_SECONDS old). While the breaker is open, or when the
+   read fails, that response is served with `X-Stale: true`, `Age` and
+   `Warning: 110` headers instead of an error.
+
+Everything else fails fast with 503 and `Retry-After` while the breaker is
+open. Errors other than timeouts/connection failures (e.g. duplicate keys)
+don't count against the breaker.
+"""
+
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+import pymongo
+from flask import Response, current_app, g, jsonify, make_response, request
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, WTimeoutError
+
+from cache import LRUCache
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "10"))
+DEGRADED_READ_BUDGET_MS = int(os.getenv("DEGRADED_READ_BUDGET_MS", "1000"))
+DEGRADED_CACHE_SIZE = int(os.getenv("DEGRADED_CACHE_SIZE", "10000"))
+DEGRADED_MAX_STALE_SECONDS = int(os.getenv("DEGRADED_MAX_STALE_SECONDS", "3600"))
+
+# Errors that mean "the database is slow or unreachable"
+DB_OUTAGE_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+log = logging.getLogger("softwarelab.degraded")
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_SECONDS, clock=time.monotonic):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """CLOSED or HALF_OPEN (this request is the probe) if a request may use
+        the database now, None if it must not."""
+        with self._lock:
+            if self.state == CLOSED:
+                return CLOSED
+            if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True  # exactly one probe at a time
+                return HALF_OPEN
+            return None
+
+    def retry_after(self):
+        with self._lock:
+            return max(1, int(self.cooldown - (self.clock() - self.opened_at) + 0.999))
+
+    def record_success(self):
+        if self.state == CLOSED and not self.failures:
+            return  # the common case, without the lock
+        with self._lock:
+            if self.state != CLOSED:
+                log.warning("database circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                if self.state == CLOSED:
+                    log.warning("database circuit opened after %d failures", self.failures)
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+    def release_probe(self):
+        """The probe ended without showing whether the database is back; let another request try."""
+        with self._lock:
+            self._probing = False
+
+
+class DegradedMode:
+    def __init__(self, breaker=None, read_budget_ms=DEGRADED_READ_BUDGET_MS,
+                 cache_size=DEGRADED_CACHE_SIZE, max_stale=DEGRADED_MAX_STALE_SECONDS):
+        self.breaker = breaker or CircuitBreaker()
+        self.read_budget = read_budget_ms / 1000.0
+        self.max_stale = max_stale
+        # url -> (body, content type, ETag, stored at)
+        self.last_good = LRUCache(cache_size, ttl=max_stale or None)
+        self.stale_served = 0
+
+    def init_app(self, app):
+        app.before_request(self._fail_fast)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        for error in DB_OUTAGE_ERRORS:
+            app.register_error_handler(error, self._unavailable)
+
+    def _fail_fast(self):
+        if request.method == "OPTIONS":
+            return None
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        if getattr(view, "serves_stale", False):
+            return None  # read_fallback decides
+        granted = self.breaker.allow()
+        if granted is None:
+            return self._error_response()
+        g.db_probe = granted == HALF_OPEN
+        return None
+
+    def _after(self, response):
+        # The half-open probe finished without a database error
+        if g.pop("db_probe", False) and not g.get("db_failed"):
+            self.breaker.record_success()
+        return response
+
+    def _teardown(self, exc):
+        # _after never ran (an exception propagated): don't leave the probe taken
+        if g.pop("db_probe", False):
+            self.breaker.release_probe()
+
+    def _unavailable(self, e):
+        """A database timeout/connection error escaped a handler."""
+        g.db_failed = True
+        self.breaker.record_failure()
+        log.warning("database unavailable: %s", e)
+        return self._error_response()
+
+    def _error_response(self):
+        return jsonify({"error": "Database temporarily unavailable, please retry"}), 503, {
+            "Retry-After": str(self.breaker.retry_after()),
+        }
+
+    # ---------- stale fallback for reads ----------
+
+    def read_fallback(self, view):
+        """Serve the last good response for the URL when the database can't answer."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.full_path
+            granted = self.breaker.allow()
+            if granted is None:
+                return self._stale(key)
+            try:
+                with pymongo.timeout(self.read_budget):
+                    response = make_response(view(*args, **kwargs))
+            except DB_OUTAGE_ERRORS as e:
+                g.db_failed = True
+                self.breaker.record_failure()
+                log.warning("read failed, serving stale %s: %s", key, e)
+                return self._stale(key)
+            except BaseException:
+                # Not a database outage, but the probe must not stay taken
+                if granted == HALF_OPEN:
+                    self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            if response.status_code == 200:
+                self.last_good.set(key, (
+                    response.get_data(), response.mimetype, response.headers.get("ETag"), time.time(),
+                ))
+            return response
+
+        wrapper.serves_stale = True
+        return wrapper
+
+    def _stale(self, key):
+        entry = self.last_good.get(key)
+        if entry is None:
+            return self._error_response()
+        body, mimetype, tag, stored_at = entry
+        self.stale_served += 1
+        response = Response(body, 200, mimetype=mimetype)
+        response.headers["X-Stale"] = "true"
+        response.headers["Age"] = str(int(time.time() - stored_at))
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        if tag:
+            response.headers["ETag"] = tag
+        return response
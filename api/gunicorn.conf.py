@@ -0,0 +1,66 @@
+"""
+gunicorn settings for the API:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every value can be overridden from the environment (names below). Workers
+default to one per CPU (plus one); each worker runs a gthread pool because
+request handling is dominated by MongoDB round trips, not Python CPU.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Import the app once in the master so workers share its memory pages; each
+# worker then opens its own MongoClient in post_fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Keep-alive: longer than the load balancer's idle timeout avoids races
+# where the proxy reuses a connection the worker just closed.
+keepalive = int(os.getenv("KEEPALIVE_TIMEOUT", "75"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Recycle workers periodically to bound memory growth; jitter avoids all
+# workers restarting at once.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Each thread holds at most one Mongo connection at a time
+os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(threads + 4))
+
+
+def post_fork(server, worker):
+    # MongoClient is not fork-safe: drop the master's client and reconnect.
+    # (With STORAGE_BACKEND=memory every worker gets its own empty store.)
+    import app as app_module
+
+    if preload_app:
+        app_module.init_db()
+        # The master's log/capture writer threads didn't survive the fork
+        app_module.request_logger.start()
+        app_module.traffic_capture.start()
+        # Joins the shared cache updater election (the table itself is inherited;
+        # the master never starts the updater, see shared_cache.py)
+        app_module.shared_cache.start()
+    server.log.info("worker %s opened %s storage", worker.pid, app_module.storage.name)
+
+
+def worker_exit(server, worker):
+    # Close pooled connections cleanly on graceful shutdown / recycling
+    try:
+        import app as app_module
+
+        app_module.storage.close()
+    except Exception:
+        pass
@@ -0,0 +1,199 @@
+"""
+Availability history per hardware set, for charts.
+
+Every checkout/checkin records the counters it left behind as a point
+{ts, available, allocated} with (projectId, hwsetId) metadata. Storage is
+tiered so its size doesn't grow with traffic:
+
+- raw points        MongoDB time-series collection `ResourceHistory`,
+                    expired after HISTORY_RAW_RETENTION_DAYS (30)
+- hourly rollups    `ResourceHistoryHourly`, one document per hardware set
+                    and hour (last/min/max available, last allocated,
+                    sample count), expired after HISTORY_HOURLY_RETENTION_DAYS
+                    (1095; 0 keeps them forever) - at most 8,760 per set a year
+- daily points      computed from the hourly rollups at query time
+
+Rollups are built by `downsample()`, an idempotent aggregation ($merge)
+over the completed hours since the last run. Each worker process starts it
+in the background at most every HISTORY_DOWNSAMPLE_INTERVAL_SECONDS (300)
+after a recording; `python history.py downsample` runs it from cron.
+
+An hour is rolled up once it ended HISTORY_LATE_SECONDS (120) ago, and
+never again. Raw points are written without waiting for an acknowledgement,
+so the lag lets those still in flight land first; a point arriving later
+than that stays in the raw tier but is missing from its hour's rollup.
+
+A range query picks the finest tier that keeps the answer within
+HISTORY_MAX_POINTS, unless a resolution is requested. Rollups only cover
+completed hours that have been downsampled.
+
+History writes are fire-and-forget (w=0) and never fail the request that
+changed the counters. Inside an idempotent request's transaction a point is
+recorded once the transaction commits (idempotency.after_commit). HISTORY=off stops recording.
+"""
+
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+HISTORY = os.getenv("HISTORY", "on").lower() in ("1", "on", "true", "yes")
+HISTORY_RAW_RETENTION_DAYS = int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "30"))
+HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv("HISTORY_HOURLY_RETENTION_DAYS", "1095"))
+HISTORY_DOWNSAMPLE_INTERVAL_SECONDS = int(os.getenv("HISTORY_DOWNSAMPLE_INTERVAL_SECONDS", "300"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "2000"))
+HISTORY_LATE_SECONDS = int(os.getenv("HISTORY_LATE_SECONDS", "120"))
+HISTORY_DEFAULT_RANGE = timedelta(days=1)
+
+RAW = "raw"
+HOUR = "hour"
+DAY = "day"
+RESOLUTIONS = ("auto", RAW, HOUR, DAY)
+
+log = logging.getLogger("softwarelab.history")
+
+
+def utc(ts):
+    """Timezone-aware UTC datetime (PyMongo hands back naive UTC)."""
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def truncate(ts, unit):
+    ts = utc(ts).replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if unit == DAY else ts
+
+
+def rollup_end(now, late=HISTORY_LATE_SECONDS):
+    """End of the hours a downsample run at `now` may roll up (exclusive)."""
+    return truncate(utc(now) - timedelta(seconds=late), HOUR)
+
+
+def parse_range(start, end, now=None):
+    """(from, to) datetimes from ISO 8601 query arguments; the default is the last day.
+
+    Raises ValueError for unparseable or empty ranges.
+    """
+    now = now or datetime.now(timezone.utc)
+    end = utc(datetime.fromisoformat(end)) if end else now
+    start = utc(datetime.fromisoformat(start)) if start else end - HISTORY_DEFAULT_RANGE
+    if start >= end:
+        raise ValueError("from must be before to")
+    return start, end
+
+
+def choose_resolution(start, end, max_points=HISTORY_MAX_POINTS, now=None):
+    """Finest tier whose bucket count for the range fits in max_points."""
+    now = now or datetime.now(timezone.utc)
+    span = end - start
+    if start >= now - timedelta(days=HISTORY_RAW_RETENTION_DAYS) and span <= timedelta(hours=max_points // 60):
+        # Raw points are per state change; assume up to one a minute on average
+        return RAW
+    if span <= timedelta(hours=max_points):
+        return HOUR
+    return DAY
+
+
+def rollup(points, unit):
+    """Group time-ordered points (raw or buckets) into `unit` buckets."""
+    buckets = []
+    for p in points:
+        ts = truncate(p["ts"], unit)
+        low = p.get("availableMin", p["available"])
+        high = p.get("availableMax", p["available"])
+        if buckets and buckets[-1]["ts"] == ts:
+            b = buckets[-1]
+            b["available"] = p["available"]
+            b["allocated"] = p["allocated"]
+            b["availableMin"] = min(b["availableMin"], low)
+            b["availableMax"] = max(b["availableMax"], high)
+            b["samples"] += p.get("samples", 1)
+        else:
+            buckets.append({
+                "ts": ts,
+                "available": p["available"],
+                "allocated": p["allocated"],
+                "availableMin": low,
+                "availableMax": high,
+                "samples": p.get("samples", 1),
+            })
+    return buckets
+
+
+class HistoryRecorder:
+    def __init__(self, repo=None, enabled=HISTORY, downsample_interval=HISTORY_DOWNSAMPLE_INTERVAL_SECONDS,
+                 max_points=HISTORY_MAX_POINTS):
+        self.repo = repo
+        self.enabled = enabled
+        self.downsample_interval = timedelta(seconds=downsample_interval)
+        self.max_points = max_points
+        self._downsampling = threading.Lock()
+        self._last_downsample = None
+
+    def bind(self, repo):
+        self.repo = repo
+
+    def record(self, project_id, hwset_id, available, allocated):
+        """Record the counters after a change; errors are logged, not raised."""
+        if not self.enabled:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            self.repo.record(project_id, hwset_id, available, allocated, now)
+        except Exception:
+            log.warning("history write failed", exc_info=True)
+        if self._last_downsample is None or now - self._last_downsample >= self.downsample_interval:
+            self._start_downsample(now)
+
+    def _start_downsample(self, now):
+        if not self._downsampling.acquire(blocking=False):
+            return
+        self._last_downsample = now
+        threading.Thread(target=self._downsample, args=(now,), name="history-downsample", daemon=True).start()
+
+    def _downsample(self, now):
+        # The first run covers the whole raw retention: not under the request budget
+        from storage import maintenance_timeout
+
+        try:
+            with maintenance_timeout():
+                self.repo.downsample(now)
+        except Exception:
+            log.exception("history downsample failed")
+        finally:
+            self._downsampling.release()
+
+    def query(self, project_id, hwset_id, start, end, resolution="auto"):
+        """(points, resolution, truncated) for a range, oldest first."""
+        if resolution == "auto":
+            resolution = choose_resolution(start, end, self.max_points)
+        fetch = {
+            RAW: self.repo.raw_points,
+            HOUR: self.repo.hourly_points,
+            DAY: self.repo.daily_points,
+        }[resolution]
+        points = fetch(project_id, hwset_id, start, end, self.max_points + 1)
+        truncated = len(points) > self.max_points
+        return points[:self.max_points], resolution, truncated
+
+
+def main(argv):
+    if argv != ["downsample"]:
+        print("usage: python history.py downsample")
+        return 2
+    from dotenv import load_dotenv
+
+    from storage import open_storage
+
+    load_dotenv()
+    storage = open_storage(timeout_ms=0)
+    try:
+        written = storage.history.downsample(datetime.now(timezone.utc))
+        print(f"Downsampled {written} hours")
+    finally:
+        storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,266 @@
+"""
+Idempotency-Key support for mutating endpoints.
+
+A client sends an `Idempotency-Key` header with a POST. The first request
+runs normally and its response is stored in the IdempotencyKeys collection
+(TTL-indexed on createdAt). Retries with the same key replay the stored
+response without running the handler again, so a retried checkout never
+allocates twice.
+
+On a replica set (Atlas) the stored response is written in the same
+transaction as the mutation; the handler's DB calls pick up the session via
+db_session(). On a standalone server, or the in-memory storage backend, the
+key is claimed before the handler runs and filled in afterwards. A claim
+still pending after IDEMPOTENCY_CLAIM_LEASE_SECONDS (35) belongs to a
+request that died (worker killed, lost connection); a retry with the same
+body takes it over instead of getting 409 until the key expires. The lease
+must outlast the slowest request: a waitlisted checkout can take 25 s and
+gunicorn kills a worker stuck for GUNICORN_TIMEOUT (30).
+
+Side effects outside the database (history points, cache invalidation,
+waking waiters) go through after_commit(): inside a transaction they run
+once it has committed, never for an attempt that aborted or was retried.
+
+Records live in the storage backend's `idempotency_records` repository
+(see storage.py).
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import g, jsonify, make_response, request
+from pymongo.errors import DuplicateKeyError
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_CLAIM_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_CLAIM_LEASE_SECONDS", "35"))
+# "auto" uses transactions when connected to a replica set or sharded cluster
+IDEMPOTENCY_TRANSACTIONS = os.getenv("IDEMPOTENCY_TRANSACTIONS", "auto").lower()
+
+MAX_KEY_LENGTH = 255
+
+log = logging.getLogger("softwarelab.idempotency")
+
+
+def db_session():
+    """Session of the idempotent request in progress, or None."""
+    return g.get("db_session")
+
+
+def after_commit(fn, *args):
+    """Run fn(*args) once this request's writes are committed: now outside a
+    transaction, after the commit inside one (dropped if it aborts)."""
+    pending = g.get("after_commit")
+    if db_session() is None or pending is None:
+        fn(*args)
+    else:
+        pending.append((fn, args))
+
+
+def _run_after_commit(pending):
+    for fn, args in pending:
+        try:
+            fn(*args)
+        except Exception:
+            log.exception("after-commit action failed")
+
+
+def supports_transactions(client):
+    """True if the client is connected to a deployment that supports transactions."""
+    try:
+        topology = client.topology_description.topology_type_name
+    except Exception:
+        return False
+    return topology in ("ReplicaSetWithPrimary", "Sharded", "LoadBalanced")
+
+
+class _AbortTransaction(Exception):
+    """Raised inside a transaction to roll back an error response."""
+
+    def __init__(self, response):
+        super().__init__("response not stored")
+        self.response = response
+
+
+class IdempotencyStore:
+    def __init__(self, records=None, client=None, ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+                 transactions=IDEMPOTENCY_TRANSACTIONS, claim_lease_seconds=IDEMPOTENCY_CLAIM_LEASE_SECONDS):
+        self.records = records
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.transactions = transactions
+        self.claim_lease_seconds = claim_lease_seconds
+
+    def bind(self, records, client):
+        """Point the store at a new backend (e.g. after a reconnect)."""
+        self.records = records
+        self.client = client
+
+    def ensure_indexes(self):
+        self.records.ensure_indexes(self.ttl_seconds)
+
+    def use_transactions(self):
+        if self.client is None:
+            return False
+        if self.transactions == "on":
+            return True
+        if self.transactions == "off":
+            return False
+        return supports_transactions(self.client)
+
+    # ---------- request helpers ----------
+
+    @staticmethod
+    def _record_id(key):
+        # Scope keys to the route so one key can't replay another endpoint's result
+        return f"{request.method} {request.path} {key}"
+
+    @staticmethod
+    def _fingerprint():
+        return hashlib.sha256(request.get_data()).hexdigest()
+
+    @staticmethod
+    def _storable(response):
+        # 5xx means the outcome is unknown; let the client retry for real
+        return response.status_code < 500 and response.is_json
+
+    def _new_record(self, key, fingerprint, response=None):
+        # Millisecond precision, as stored by MongoDB: claimedAt is compared on fill
+        now = datetime.now(timezone.utc)
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        record = {
+            "_id": self._record_id(key),
+            "key": key,
+            "route": request.url_rule.rule if request.url_rule else request.path,
+            "fingerprint": fingerprint,
+            "createdAt": now,
+            "status": "pending",
+        }
+        if response is not None:
+            record.update(self._response_fields(response))
+        else:
+            record["claimedAt"] = now
+        return record
+
+    def _abandoned(self, record, fingerprint):
+        """True for a pending claim whose lease ran out; a retry may take it over."""
+        if record.get("status") != "pending" or record.get("fingerprint") != fingerprint:
+            return False
+        claimed_at = record.get("claimedAt") or record["createdAt"]
+        if claimed_at.tzinfo is None:
+            claimed_at = claimed_at.replace(tzinfo=timezone.utc)
+        return claimed_at < datetime.now(timezone.utc) - timedelta(seconds=self.claim_lease_seconds)
+
+    @staticmethod
+    def _response_fields(response):
+        return {
+            "status": "done",
+            "responseStatus": response.status_code,
+            "responseBody": response.get_json(),
+        }
+
+    def _replay(self, record, fingerprint):
+        if record.get("fingerprint") != fingerprint:
+            return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+        if record.get("status") != "done":
+            return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+        response = make_response(jsonify(record.get("responseBody")), record.get("responseStatus", 200))
+        response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+    # ---------- execution strategies ----------
+
+    def _run_in_transaction(self, view, key, fingerprint, args, kwargs):
+        with self.client.start_session() as session:
+            g.db_session = session
+
+            def callback(s):
+                # with_transaction may run this again; only the last attempt's actions count
+                g.after_commit = []
+                response = make_response(view(*args, **kwargs))
+                # Error responses roll back: the server may already have
+                # aborted the transaction (e.g. on a duplicate key)
+                if response.status_code >= 400:
+                    raise _AbortTransaction(response)
+                self.records.insert(self._new_record(key, fingerprint, response), session=s)
+                return response
+
+            try:
+                response = session.with_transaction(callback)
+                g.db_session = None
+                _run_after_commit(g.pop("after_commit", []))
+                return response
+            except _AbortTransaction as e:
+                # Nothing was written, so 4xx results are stored on their own
+                if self._storable(e.response):
+                    try:
+                        self.records.insert(self._new_record(key, fingerprint, e.response))
+                    except DuplicateKeyError:
+                        pass
+                return e.response
+            except DuplicateKeyError:
+                # A concurrent request with the same key committed first
+                existing = self.records.get(self._record_id(key))
+                if existing:
+                    return self._replay(existing, fingerprint)
+                raise
+            finally:
+                g.db_session = None
+                g.pop("after_commit", None)
+
+    def _run_with_claim(self, view, key, fingerprint, args, kwargs):
+        record_id = self._record_id(key)
+        claim = self._new_record(key, fingerprint)
+        try:
+            self.records.insert(claim)
+        except DuplicateKeyError:
+            existing = self.records.get(record_id)
+            if not existing:
+                raise
+            # Only one retry wins the takeover; the others see a fresh claim
+            if not (self._abandoned(existing, fingerprint)
+                    and self.records.reclaim(record_id, existing.get("claimedAt"), claim["claimedAt"])):
+                return self._replay(existing, fingerprint)
+
+        # If the lease ran out and a retry took over, the retry's outcome is the one stored
+        claimed_at = claim["claimedAt"]
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            self.records.delete(record_id, claimed_at=claimed_at)
+            raise
+
+        if self._storable(response):
+            self.records.set_fields(record_id, self._response_fields(response), claimed_at=claimed_at)
+        else:
+            self.records.delete(record_id, claimed_at=claimed_at)
+        return response
+
+    # ---------- decorator ----------
+
+    def idempotent(self, view):
+        """Make a Flask view honour the Idempotency-Key header."""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+            fingerprint = self._fingerprint()
+            existing = self.records.get(self._record_id(key))
+            if existing and not self._abandoned(existing, fingerprint):
+                return self._replay(existing, fingerprint)
+
+            if self.use_transactions():
+                return self._run_in_transaction(view, key, fingerprint, args, kwargs)
+            return self._run_with_claim(view, key, fingerprint, args, kwargs)
+
+        return wrapper
@@ -0,0 +1,185 @@
+"""
+Project membership stored one document per (projectId, userId) in the
+Memberships collection instead of an embedded `members` array.
+
+- Unique index (projectId, userId): membership checks are a single index
+  lookup regardless of project size, and member listing is paginated by
+  userId (keyset pagination, no skip).
+- Index (userId, projectId): lists a user's projects without touching Projects.
+
+Projects keep a `memberCount` counter maintained alongside the memberships
+(each change also bumps the project's `version`, see versioning.py).
+Existing data is moved over by migration v4 in migrate_database.py.
+
+Each user's project ids are also cached in a bounded in-process LRU that
+add()/remove() keep current, so the dashboard listing is a cache hit plus a
+single `$in` on projectId. Other workers on the host invalidate it through
+the shared cache: callers pass the user's generation from
+shared_cache.user_generation(), and an entry read under another one is
+re-read. USER_PROJECTS_CACHE_TTL (5 s) bounds staleness from other hosts,
+or when the shared cache is off.
+
+For delta sync (sync.py) memberships carry `updatedSeq`, and remove()
+leaves a tombstone {userId, projectId, updatedSeq, removedAt} in
+SyncTombstones, which a TTL index expires after SYNC_TOMBSTONE_DAYS.
+"""
+
+import os
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from cache import LRUCache
+from db_policy import BULK_CHUNK_SIZE
+from idempotency import after_commit
+from sync import SYNC_TOMBSTONE_DAYS, next_seq
+
+MEMBERS_PAGE_SIZE = int(os.getenv("MEMBERS_PAGE_SIZE", "100"))
+MEMBERS_MAX_PAGE_SIZE = int(os.getenv("MEMBERS_MAX_PAGE_SIZE", "1000"))
+USER_PROJECTS_CACHE_SIZE = int(os.getenv("USER_PROJECTS_CACHE_SIZE", "10000"))
+USER_PROJECTS_CACHE_TTL = float(os.getenv("USER_PROJECTS_CACHE_TTL", "5"))
+
+
+class MembershipStore:
+    def __init__(self, collection=None, projects_col=None, bulk_collection=None, tombstones=None,
+                 cache_size=USER_PROJECTS_CACHE_SIZE, cache_ttl=USER_PROJECTS_CACHE_TTL):
+        self.collection = collection
+        self.projects_col = projects_col
+        self.bulk_collection = bulk_collection if bulk_collection is not None else collection
+        self.tombstones = tombstones
+        # userId -> (generation, frozenset of projectIds)
+        self.user_projects = LRUCache(maxsize=cache_size, ttl=cache_ttl or None)
+
+    def bind(self, collection, projects_col, bulk_collection=None, tombstones=None):
+        """Point the store at new collection handles (e.g. after a reconnect)."""
+        self.collection = collection
+        self.projects_col = projects_col
+        self.bulk_collection = bulk_collection if bulk_collection is not None else collection
+        self.tombstones = tombstones
+        self.user_projects.clear()
+
+    def ensure_indexes(self):
+        self.collection.create_index([("projectId", ASCENDING), ("userId", ASCENDING)], unique=True)
+        self.collection.create_index([("userId", ASCENDING), ("projectId", ASCENDING)])
+        if self.tombstones is not None:
+            self.tombstones.create_index([("userId", ASCENDING), ("updatedSeq", ASCENDING)])
+            self.tombstones.create_index("removedAt", expireAfterSeconds=SYNC_TOMBSTONE_DAYS * 86400)
+
+    def is_member(self, project_id, user_id, session=None):
+        # Covered by the (projectId, userId) index
+        doc = self.collection.find_one(
+            {"projectId": project_id, "userId": user_id},
+            {"_id": 0, "userId": 1},
+            session=session,
+        )
+        return doc is not None
+
+    def add(self, project_id, user_id, role="member", session=None):
+        """Add a member. Returns False if the user was already a member."""
+        seq = next_seq()
+        try:
+            self.collection.insert_one({
+                "projectId": project_id,
+                "userId": user_id,
+                "role": role,
+                "joinedAt": datetime.now(timezone.utc),
+                "updatedSeq": seq,
+            }, session=session)
+        except DuplicateKeyError:
+            return False
+        self.projects_col.update_one(
+            {"projectId": project_id},
+            {"$inc": {"memberCount": 1, "version": 1}, "$set": {"updatedSeq": seq}},
+            session=session,
+        )
+        self._update_cached(user_id, session, lambda entry: (entry[0], entry[1] | {project_id}))
+        return True
+
+    def _update_cached(self, user_id, session, change):
+        # Inside a transaction the change only exists once it commits
+        if session is None:
+            self.user_projects.update(user_id, change)
+        else:
+            after_commit(self.user_projects.update, user_id, change)
+
+    def add_many(self, entries):
+        """Insert (project_id, user_id, role) memberships with unordered insert_many.
+
+        memberCount is not touched: used when creating projects, which set it
+        in the project document. Existing memberships are skipped.
+        """
+        now = datetime.now(timezone.utc)
+        docs = [{"projectId": p, "userId": u, "role": role, "joinedAt": now, "updatedSeq": next_seq()}
+                for p, u, role in entries]
+        failed = set()
+        for start in range(0, len(docs), BULK_CHUNK_SIZE):
+            chunk = docs[start:start + BULK_CHUNK_SIZE]
+            try:
+                self.bulk_collection.insert_many(chunk, ordered=False)
+            except BulkWriteError as e:
+                failed.update(start + error["index"] for error in e.details.get("writeErrors", []))
+        for i, (project_id, user_id, _) in enumerate(entries):
+            if i not in failed:
+                self.user_projects.update(user_id, lambda entry, p=project_id: (entry[0], entry[1] | {p}))
+
+    def remove(self, project_id, user_id, session=None):
+        """Remove a member. Returns False if the user was not a member."""
+        result = self.collection.delete_one({"projectId": project_id, "userId": user_id}, session=session)
+        if result.deleted_count == 0:
+            return False
+        seq = next_seq()
+        self.projects_col.update_one(
+            {"projectId": project_id},
+            {"$inc": {"memberCount": -1, "version": 1}, "$set": {"updatedSeq": seq}},
+            session=session,
+        )
+        if self.tombstones is not None:
+            self.tombstones.insert_one({
+                "userId": user_id,
+                "projectId": project_id,
+                "updatedSeq": seq,
+                "removedAt": datetime.now(timezone.utc),
+            }, session=session)
+        self._update_cached(user_id, session, lambda entry: (entry[0], entry[1] - {project_id}))
+        return True
+
+    def list_members(self, project_id, limit=MEMBERS_PAGE_SIZE, after=None, session=None):
+        """One page of member userIds in userId order, plus the cursor for the next page."""
+        limit = max(1, min(int(limit), MEMBERS_MAX_PAGE_SIZE))
+        query = {"projectId": project_id}
+        if after:
+            query["userId"] = {"$gt": after}
+        cursor = self.collection.find(query, {"_id": 0, "userId": 1}, session=session) \
+            .sort("userId", ASCENDING).limit(limit + 1)
+        members = [doc["userId"] for doc in cursor]
+        next_cursor = None
+        if len(members) > limit:
+            members = members[:limit]
+            next_cursor = members[-1]
+        return members, next_cursor
+
+    def project_seqs_for_user(self, user_id):
+        """{projectId: updatedSeq of the membership}, read from the collection: sync
+        can't use the cached ids, a membership it misses would never be sent."""
+        cursor = self.collection.find({"userId": user_id}, {"_id": 0, "projectId": 1, "updatedSeq": 1})
+        return {doc["projectId"]: doc.get("updatedSeq", 0) for doc in cursor}
+
+    def removed_since(self, user_id, since):
+        """projectIds the user was removed from after `since` (tombstones)."""
+        if self.tombstones is None:
+            return set()
+        cursor = self.tombstones.find(
+            {"userId": user_id, "updatedSeq": {"$gt": since}}, {"_id": 0, "projectId": 1}
+        )
+        return {doc["projectId"] for doc in cursor}
+
+    def project_ids_for_user(self, user_id, generation=None):
+        """The user's projectIds; cached, unless cached under another `generation`."""
+        entry = self.user_projects.get(user_id)
+        if entry is None or entry[0] != generation:
+            # Covered by the (userId, projectId) index
+            cursor = self.collection.find({"userId": user_id}, {"_id": 0, "projectId": 1})
+            entry = (generation, frozenset(doc["projectId"] for doc in cursor))
+            self.user_projects.set(user_id, entry)
+        return entry[1]
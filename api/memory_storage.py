@@ -0,0 +1,455 @@
+"""
+In-memory storage backend (STORAGE_BACKEND=memory).
+
+Same repository interface as the MongoDB backend in storage.py, kept in
+plain dicts keyed the way the Mongo unique indexes are:
+
+- Users       userId
+- Projects    projectId, plus a set of public projectIds
+- Resources   (projectId, hwsetId), plus projectId -> hwsetIds
+- Catalog     hwsetId, plus a version counter
+- Memberships (projectId, userId), plus a sorted userId list per project,
+              userId -> projectIds and userId -> tombstones
+- History     (projectId, hwsetId) -> time-ordered points and hourly buckets
+
+Writes to one key are serialised by a striped lock (KeyedLocks), so writers
+to different projects/resources don't contend; the secondary indexes share
+a short index lock. Documents are copied in and out so callers can't mutate
+stored state. Sessions are accepted and ignored: there are no transactions,
+so idempotent requests use the claim-then-fill path.
+"""
+
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+from history import DAY, HISTORY_RAW_RETENTION_DAYS, HOUR, rollup, rollup_end, truncate
+from memberships import MEMBERS_MAX_PAGE_SIZE, MEMBERS_PAGE_SIZE
+from sync import SYNC_TOMBSTONE_DAYS, next_seq
+
+LOCK_STRIPES = 64
+
+
+class KeyedLocks:
+    """A fixed pool of locks; each key always maps to the same one."""
+
+    def __init__(self, stripes=LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+
+def _changed(doc, since):
+    return doc is not None and (not since or doc.get("updatedSeq", 0) > since)
+
+
+def _pick(doc, fields):
+    if doc is None:
+        return None
+    if not fields:
+        return dict(doc)
+    # Stored field order, like a Mongo projection
+    return {k: v for k, v in doc.items() if k in fields}
+
+
+class _Table:
+    """Documents by primary key with per-key write locks."""
+
+    def __init__(self, key_name):
+        self.key_name = key_name
+        self.docs = {}
+        self.locks = KeyedLocks()
+
+    def insert(self, key, doc):
+        with self.locks(key):
+            if key in self.docs:
+                raise DuplicateKeyError(f"E11000 duplicate key error: {self.key_name}: {key!r}")
+            self.docs[key] = dict(doc)
+
+    def get(self, key, fields=None):
+        return _pick(self.docs.get(key), fields)
+
+    def update(self, key, fn):
+        """Apply fn(doc) to a stored document under its key lock; False if missing."""
+        with self.locks(key):
+            doc = self.docs.get(key)
+            if doc is None:
+                return False
+            fn(doc)
+            return True
+
+    def update_versioned(self, key, version, fields):
+        """Set fields and bump the version if the document is at `version`."""
+        with self.locks(key):
+            doc = self.docs.get(key)
+            if doc is None or doc.get("version", 0) != version:
+                return False
+            doc.update(fields)
+            doc["version"] = version + 1
+            doc["updatedSeq"] = next_seq()
+            return True
+
+
+def _insert_each(insert, docs, key):
+    """insert_many() for the memory backend: {key: error} for the failures."""
+    failed = {}
+    for doc in docs:
+        try:
+            insert(doc)
+        except DuplicateKeyError:
+            failed[key(doc)] = "duplicate"
+    return failed
+
+
+class InMemoryUsers:
+    def __init__(self):
+        self.table = _Table("userId")
+
+    def insert(self, doc, session=None):
+        self.table.insert(doc["userId"], doc)
+
+    def get(self, user_id, fields=None, session=None):
+        return self.table.get(user_id, fields)
+
+    def existing_ids(self, user_ids):
+        return {u for u in user_ids if u in self.table.docs}
+
+
+class InMemoryProjects:
+    def __init__(self):
+        self.table = _Table("projectId")
+        self._public = set()
+        self._index_lock = threading.Lock()
+
+    def insert(self, doc, session=None):
+        self.table.insert(doc["projectId"], dict(doc, updatedSeq=next_seq()))
+        if doc.get("isPublic"):
+            with self._index_lock:
+                self._public.add(doc["projectId"])
+
+    def insert_many(self, docs):
+        return _insert_each(self.insert, docs, lambda doc: doc["projectId"])
+
+    def get(self, project_id, fields=None, session=None):
+        return self.table.get(project_id, fields)
+
+    def list_public(self, fields=None):
+        with self._index_lock:
+            project_ids = sorted(self._public)
+        return [doc for doc in (self.table.get(p, fields) for p in project_ids) if doc is not None]
+
+    def list_by_ids(self, project_ids, fields=None, since=None):
+        docs = (self.table.get(p) for p in project_ids)
+        return [_pick(doc, fields) for doc in docs if _changed(doc, since)]
+
+    def update_versioned(self, project_id, version, fields=None, session=None):
+        if not self.table.update_versioned(project_id, version, fields or {}):
+            return False
+        if fields and "isPublic" in fields:
+            with self._index_lock:
+                if fields["isPublic"]:
+                    self._public.add(project_id)
+                else:
+                    self._public.discard(project_id)
+        return True
+
+    def inc_member_count(self, project_id, delta, seq):
+        def inc(doc):
+            doc["memberCount"] = doc.get("memberCount", 0) + delta
+            doc["version"] = doc.get("version", 0) + 1
+            doc["updatedSeq"] = seq
+
+        self.table.update(project_id, inc)
+
+
+class InMemoryResources:
+    def __init__(self):
+        self.table = _Table("(projectId, hwsetId)")
+        self._by_project = {}
+        self._index_lock = threading.Lock()
+
+    def insert(self, doc, session=None):
+        self.table.insert((doc["projectId"], doc["hwsetId"]), dict(doc, updatedSeq=next_seq()))
+        with self._index_lock:
+            self._by_project.setdefault(doc["projectId"], []).append(doc["hwsetId"])
+
+    def insert_many(self, docs):
+        return _insert_each(self.insert, docs, lambda doc: (doc["projectId"], doc["hwsetId"]))
+
+    def get(self, project_id, hwset_id, fields=None, session=None):
+        return self.table.get((project_id, hwset_id), fields)
+
+    def list_for_project(self, project_id, fields=None):
+        with self._index_lock:
+            hwset_ids = list(self._by_project.get(project_id, ()))
+        return [self.table.get((project_id, h), fields) for h in hwset_ids]
+
+    def list_for_projects(self, project_ids, fields=None, since=None):
+        with self._index_lock:
+            keys = [(p, h) for p in project_ids for h in self._by_project.get(p, ())]
+        docs = (self.table.get(key) for key in keys)
+        return [_pick(doc, fields) for doc in docs if _changed(doc, since)]
+
+    def set_counts(self, project_id, hwset_id, available, allocated, version, session=None):
+        return self.table.update_versioned(
+            (project_id, hwset_id), version, {"available": available, "allocatedToProject": allocated}
+        )
+
+    def increment(self, project_id, hwset_id, delta, min_available=0, min_allocated=0, session=None):
+        key = (project_id, hwset_id)
+        with self.table.locks(key):
+            doc = self.table.docs.get(key)
+            if doc is None or doc.get("available", 0) < min_available \
+                    or doc.get("allocatedToProject", 0) < min_allocated:
+                return None
+            doc["available"] = doc.get("available", 0) + delta
+            doc["allocatedToProject"] = doc.get("allocatedToProject", 0) - delta
+            doc["version"] = doc.get("version", 0) + 1
+            doc["updatedSeq"] = next_seq()
+            return {"available": doc["available"], "allocatedToProject": doc["allocatedToProject"]}
+
+
+class InMemoryHardwareCatalog:
+    def __init__(self):
+        self.entries = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self._version
+
+    def load(self):
+        with self._lock:
+            return [dict(e) for e in self.entries.values()]
+
+    def upsert(self, entry):
+        with self._lock:
+            self.entries.setdefault(entry["hwsetId"], {}).update(entry)
+            self._version += 1
+
+    def insert_missing(self, entries):
+        with self._lock:
+            missing = [dict(e) for e in entries if e["hwsetId"] not in self.entries]
+            for entry in missing:
+                self.entries[entry["hwsetId"]] = entry
+            if missing:
+                self._version += 1
+        return len(missing)
+
+
+class InMemoryMemberships:
+    """Same interface as memberships.MembershipStore."""
+
+    def __init__(self, projects):
+        self.projects = projects
+        self.roles = {}          # (projectId, userId) -> membership doc
+        self.by_project = {}     # projectId -> sorted [userId]
+        self.by_user = {}        # userId -> set(projectId)
+        self.tombstones = {}     # userId -> {projectId: (updatedSeq, removedAt)}
+        self.locks = KeyedLocks()
+        self._index_lock = threading.Lock()
+
+    def ensure_indexes(self):
+        pass
+
+    def is_member(self, project_id, user_id, session=None):
+        return (project_id, user_id) in self.roles
+
+    def _insert(self, project_id, user_id, role, seq):
+        with self.locks(project_id):
+            if (project_id, user_id) in self.roles:
+                return False
+            self.roles[(project_id, user_id)] = {
+                "projectId": project_id,
+                "userId": user_id,
+                "role": role,
+                "joinedAt": datetime.now(timezone.utc),
+                "updatedSeq": seq,
+            }
+            bisect.insort(self.by_project.setdefault(project_id, []), user_id)
+        with self._index_lock:
+            self.by_user.setdefault(user_id, set()).add(project_id)
+        return True
+
+    def add(self, project_id, user_id, role="member", session=None):
+        """Add a member. Returns False if the user was already a member."""
+        seq = next_seq()
+        if not self._insert(project_id, user_id, role, seq):
+            return False
+        self.projects.inc_member_count(project_id, 1, seq)
+        return True
+
+    def add_many(self, entries):
+        """Insert (project_id, user_id, role) memberships without touching memberCount."""
+        for project_id, user_id, role in entries:
+            self._insert(project_id, user_id, role, next_seq())
+
+    def remove(self, project_id, user_id, session=None):
+        """Remove a member. Returns False if the user was not a member."""
+        with self.locks(project_id):
+            if self.roles.pop((project_id, user_id), None) is None:
+                return False
+            members = self.by_project[project_id]
+            del members[bisect.bisect_left(members, user_id)]
+        seq = next_seq()
+        with self._index_lock:
+            self.by_user[user_id].discard(project_id)
+            self.tombstones.setdefault(user_id, {})[project_id] = (seq, datetime.now(timezone.utc))
+        self.projects.inc_member_count(project_id, -1, seq)
+        return True
+
+    def list_members(self, project_id, limit=MEMBERS_PAGE_SIZE, after=None, session=None):
+        """One page of member userIds in userId order, plus the cursor for the next page."""
+        limit = max(1, min(int(limit), MEMBERS_MAX_PAGE_SIZE))
+        with self.locks(project_id):
+            members = self.by_project.get(project_id, [])
+            start = bisect.bisect_right(members, after) if after else 0
+            page = members[start:start + limit + 1]
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1]
+        return page, next_cursor
+
+    def project_ids_for_user(self, user_id, generation=None):
+        with self._index_lock:
+            return frozenset(self.by_user.get(user_id, ()))
+
+    def project_seqs_for_user(self, user_id):
+        project_ids = self.project_ids_for_user(user_id)
+        memberships = (self.roles.get((p, user_id)) for p in project_ids)
+        return {m["projectId"]: m["updatedSeq"] for m in memberships if m is not None}
+
+    def removed_since(self, user_id, since):
+        expired = datetime.now(timezone.utc) - timedelta(days=SYNC_TOMBSTONE_DAYS)
+        with self._index_lock:
+            stones = self.tombstones.get(user_id, {})
+            # TTL, as the Mongo index does
+            for project_id in [p for p, (_, at) in stones.items() if at < expired]:
+                del stones[project_id]
+            return {p for p, (seq, _) in stones.items() if seq > since}
+
+
+class InMemoryIdempotencyRecords:
+    def __init__(self):
+        self.records = {}
+        self.ttl_seconds = None
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+
+    def _expired(self, record):
+        if not self.ttl_seconds:
+            return False
+        return record["createdAt"].timestamp() < time.time() - self.ttl_seconds
+
+    def get(self, record_id):
+        record = self.records.get(record_id)
+        if record is None or self._expired(record):
+            return None
+        return dict(record)
+
+    def insert(self, record, session=None):
+        with self._lock:
+            existing = self.records.get(record["_id"])
+            if existing is not None and not self._expired(existing):
+                raise DuplicateKeyError(f"E11000 duplicate key error: _id: {record['_id']!r}")
+            self.records[record["_id"]] = dict(record)
+
+    def _held(self, record_id, claimed_at):
+        record = self.records.get(record_id)
+        return record is not None and (claimed_at is None or record.get("claimedAt") == claimed_at)
+
+    def reclaim(self, record_id, old_claimed_at, claimed_at):
+        with self._lock:
+            record = self.records.get(record_id)
+            if record is None or record["status"] != "pending" or record.get("claimedAt") != old_claimed_at:
+                return False
+            record["claimedAt"] = claimed_at
+            return True
+
+    def set_fields(self, record_id, fields, claimed_at=None):
+        with self._lock:
+            if self._held(record_id, claimed_at):
+                self.records[record_id].update(fields)
+
+    def delete(self, record_id, claimed_at=None):
+        with self._lock:
+            if self._held(record_id, claimed_at):
+                del self.records[record_id]
+
+
+class InMemoryResourceHistory:
+    def __init__(self):
+        self.raw = {}     # (projectId, hwsetId) -> [(ts, seq, point)] in time order
+        self.hourly = {}  # (projectId, hwsetId) -> {hour: bucket}
+        self.through = None
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def record(self, project_id, hwset_id, available, allocated, ts):
+        point = {"ts": ts, "available": available, "allocated": allocated}
+        with self._lock:
+            self._seq += 1
+            bisect.insort(self.raw.setdefault((project_id, hwset_id), []), (ts, self._seq, point))
+
+    def _raw_range(self, key, start, end):
+        with self._lock:
+            points = self.raw.get(key, [])
+            lo = bisect.bisect_left(points, (start,))
+            hi = bisect.bisect_left(points, (end,))
+            return [dict(p) for _, _, p in points[lo:hi]]
+
+    def raw_points(self, project_id, hwset_id, start, end, limit):
+        return self._raw_range((project_id, hwset_id), start, end)[:limit]
+
+    def hourly_points(self, project_id, hwset_id, start, end, limit):
+        start = truncate(start, HOUR)
+        with self._lock:
+            buckets = self.hourly.get((project_id, hwset_id), {})
+            return [dict(buckets[h]) for h in sorted(buckets) if start <= h < end][:limit]
+
+    def daily_points(self, project_id, hwset_id, start, end, limit):
+        hours = self.hourly_points(project_id, hwset_id, truncate(start, DAY), end, None)
+        return rollup(hours, DAY)[:limit]
+
+    def downsample(self, now):
+        end = rollup_end(now)
+        start = self.through or end - timedelta(days=HISTORY_RAW_RETENTION_DAYS)
+        if start >= end:
+            return 0
+        for key in list(self.raw):
+            buckets = rollup(self._raw_range(key, start, end), HOUR)
+            with self._lock:
+                self.hourly.setdefault(key, {}).update((b["ts"], b) for b in buckets)
+                # Raw retention
+                points = self.raw[key]
+                del points[:bisect.bisect_left(points, (now - timedelta(days=HISTORY_RAW_RETENTION_DAYS),))]
+        self.through = max(self.through or end, end)
+        return int((end - start) / timedelta(hours=1))
+
+
+class InMemoryStorage:
+    name = "memory"
+    client = None
+    db = None
+
+    def __init__(self):
+        self.users = InMemoryUsers()
+        self.projects = InMemoryProjects()
+        self.resources = InMemoryResources()
+        self.hardware_catalog = InMemoryHardwareCatalog()
+        self.memberships = InMemoryMemberships(self.projects)
+        self.idempotency_records = InMemoryIdempotencyRecords()
+        self.history = InMemoryResourceHistory()
+
+    def ensure_indexes(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,225 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when
+- it carries `X-Profile: <PROFILE_ADMIN_TOKEN>` (only if a token is set), or
+- it is picked by PROFILE_SAMPLE_RATE (0.0-1.0, default 0 = never).
+
+The request runs under cProfile and every MongoDB command it issues is
+timed through a pymongo CommandListener. Each profile is written to
+PROFILE_DIR as a pstats file (`.prof`, readable by pstats, snakeviz,
+flameprof, gprof2dot) plus a `.json` sidecar with the route, status, wall
+time and Mongo command timings. Only the newest PROFILE_MAX_FILES profiles
+are kept. Profiled responses carry `X-Profile-Id`.
+
+With both settings off no hooks or listeners are installed. Only one
+request is profiled at a time per process; others that are picked while a
+profile is running are skipped.
+
+    python profiling.py            # list recent profiles
+    python profiling.py <id>       # print the top functions of one profile
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, request
+from pymongo import monitoring
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_TOP_FUNCTIONS = 25
+
+log = logging.getLogger("softwarelab.profiling")
+
+
+class _CommandTimer(monitoring.CommandListener):
+    """Records MongoDB commands issued by the thread being profiled, ignores the rest."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def start(self):
+        self._local.commands = []
+        self._local.pending = {}
+
+    def stop(self):
+        commands = getattr(self._local, "commands", None) or []
+        self._local.commands = None
+        return commands
+
+    def started(self, event):
+        if getattr(self._local, "commands", None) is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._local.pending[event.request_id] = (
+            event.command_name, collection if isinstance(collection, str) else None
+        )
+
+    def _finished(self, event, ok):
+        if getattr(self._local, "commands", None) is None:
+            return
+        name, collection = self._local.pending.pop(event.request_id, (event.command_name, None))
+        self._local.commands.append({
+            "command": name,
+            "collection": collection,
+            "ms": round(event.duration_micros / 1000, 3),
+            "ok": ok,
+        })
+
+    def succeeded(self, event):
+        self._finished(event, True)
+
+    def failed(self, event):
+        self._finished(event, False)
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, admin_token=PROFILE_ADMIN_TOKEN,
+                 directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.directory = directory
+        self.max_files = max_files
+        self.enabled = sample_rate > 0 or bool(admin_token)
+        self._busy = threading.Lock()
+        self._seq = 0
+        self.commands = _CommandTimer()
+        if self.enabled:
+            # Applies to MongoClients created after this point, so the
+            # profiler must exist before the storage backend is opened
+            monitoring.register(self.commands)
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    # ---------- request hooks ----------
+
+    def _trigger(self):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and self.admin_token and hmac.compare_digest(token, self.admin_token):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def _before(self):
+        trigger = self._trigger()
+        if trigger is None or not self._busy.acquire(blocking=False):
+            return
+        g.profile_trigger = trigger
+        g.profile_started = time.perf_counter()
+        self.commands.start()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _after(self, response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        wall_ms = (time.perf_counter() - g.profile_started) * 1000
+        commands = self.commands.stop()
+        try:
+            response.headers[PROFILE_ID_HEADER] = self._write(profiler, response, wall_ms, commands)
+        except OSError:
+            log.exception("failed to write profile")
+        finally:
+            self._busy.release()
+        return response
+
+    def _teardown(self, exc):
+        # The response never made it through after_request (e.g. a crash in another hook)
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            self.commands.stop()
+            self._busy.release()
+
+    # ---------- on-disk ring ----------
+
+    def _write(self, profiler, response, wall_ms, commands):
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq += 1
+        now = datetime.now(timezone.utc)
+        profile_id = f"{now:%Y%m%dT%H%M%S%f}-{os.getpid()}-{self._seq}"
+        base = os.path.join(self.directory, profile_id)
+
+        profiler.dump_stats(base + ".prof")
+        top = io.StringIO()
+        pstats.Stats(profiler, stream=top).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        meta = {
+            "id": profile_id,
+            "at": now.isoformat(),
+            "trigger": g.profile_trigger,
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "status": response.status_code,
+            "wallMs": round(wall_ms, 3),
+            "mongo": {
+                "count": len(commands),
+                "totalMs": round(sum(c["ms"] for c in commands), 3),
+                "commands": commands,
+            },
+            "top": top.getvalue(),
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        entries = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in entries[:max(0, len(entries) - self.max_files)]:
+            for ext in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass  # another worker pruned it first
+
+
+def main(argv):
+    if not os.path.isdir(PROFILE_DIR):
+        print(f"No profiles in {PROFILE_DIR}")
+        return 0
+    if argv:
+        with open(os.path.join(PROFILE_DIR, argv[0] + ".json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        print(f"{meta['method']} {meta['path']} -> {meta['status']}  {meta['wallMs']} ms, "
+              f"{meta['mongo']['count']} Mongo commands ({meta['mongo']['totalMs']} ms)")
+        for c in meta["mongo"]["commands"]:
+            print(f"  {c['command']:<16} {c['collection'] or '':<20} {c['ms']:>9.3f} ms")
+        print(meta["top"])
+        return 0
+    for name in sorted(os.listdir(PROFILE_DIR)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+            meta = json.load(f)
+        print(f"{meta['id']}  {meta['wallMs']:>9.1f} ms  mongo {meta['mongo']['count']:>3} "
+              f"({meta['mongo']['totalMs']:.1f} ms)  {meta['status']} {meta['method']} {meta['route']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Replay captured API traffic against a running instance (performance regression test)
+
+Reads NDJSON traces written with TRAFFIC_CAPTURE_FILE (see traffic_capture.py)
+and sends the same requests in the same order on the recorded schedule,
+sped up by --speed (0 = back to back), from a pool of worker threads that
+each keep one keep-alive session; a user's requests always go through the
+same worker, so they stay in order. Reports per route the recorded
+latency next to the replayed one (server-side, from the Server-Timing
+header, when the target sends it), plus status codes that differ from the
+recording.
+
+--save writes the per-route results to JSON; --baseline compares this run
+with a saved one, which is the regression check: same trace, same data,
+two builds.
+
+Redacted values (passwords) are sent as --password. The target needs the
+users and projects the trace refers to; --seed signs up every user and
+creates/joins every project the trace uses but doesn't create itself.
+
+Usage:
+    python replay_traffic.py traffic.ndjson --base http://127.0.0.1:5000 --seed --save before.json
+    python replay_traffic.py traffic.ndjson --speed 4 --baseline before.json
+"""
+
+import argparse
+import json
+import queue
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from bench_wsgi import percentile
+from traffic_capture import REDACTED
+
+
+def load_traces(paths, limit=None):
+    """Replayable traces in arrival order, and how many were skipped for having no body."""
+    traces, skipped = [], 0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                trace = json.loads(line)
+                if "method" not in trace:
+                    continue  # {"droppedTraces": n}
+                if "bodyShape" in trace:
+                    skipped += 1  # body too large to capture
+                    continue
+                traces.append(trace)
+    traces.sort(key=lambda t: t["t"])
+    return (traces[:limit] if limit else traces), skipped
+
+
+def fill_redacted(value, password):
+    if value == REDACTED:
+        return password
+    if isinstance(value, dict):
+        return {k: fill_redacted(v, password) for k, v in value.items()}
+    if isinstance(value, list):
+        return [fill_redacted(v, password) for v in value]
+    return value
+
+
+def path_params(trace):
+    """{name: value} for the <placeholders> of the trace's route."""
+    route = trace.get("route") or ""
+    params = {}
+    for pattern, actual in zip(route.split("/"), trace["path"].split("/")):
+        if pattern.startswith("<") and pattern.endswith(">"):
+            params[pattern[1:-1].split(":")[-1]] = actual
+    return params
+
+
+# ---------- seeding ----------
+
+def seed(base, traces, password):
+    """Create the users and projects the trace uses but doesn't create itself."""
+    users, created_users = [], set()
+    project_owner, created_projects, pairs = {}, set(), set()
+    for t in traces:
+        body = t.get("body") if isinstance(t.get("body"), dict) else {}
+        if t["route"] == "/api/signup":
+            created_users.add(body.get("userId"))
+        if t["route"] == "/api/projects" and t["method"] == "POST":
+            created_projects.add(body.get("projectId"))
+        user = t["query"].get("userId") or body.get("userId") or body.get("createdBy")
+        if user and user not in users:
+            users.append(user)
+        project = path_params(t).get("project_id")
+        if project and user:
+            project_owner.setdefault(project, user)
+            pairs.add((project, user))
+
+    s = requests.Session()
+    for user in users:
+        if user not in created_users:
+            s.post(f"{base}/api/signup", json={"userId": user, "password": password})
+    for project, owner in project_owner.items():
+        if project not in created_projects:
+            s.post(f"{base}/api/projects", json={
+                "projectId": project, "name": project, "createdBy": owner, "isPublic": True,
+            })
+    for project, user in sorted(pairs):
+        if project not in created_projects:
+            s.post(f"{base}/api/projects/{project}/join", json={"userId": user})
+    print(f"Seeded {len(users)} users, {len(project_owner)} projects")
+
+
+# ---------- replay ----------
+
+def server_ms(response):
+    """Server-side latency from the `Server-Timing: app;dur=<ms>` header, if present."""
+    for metric in response.headers.get("Server-Timing", "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "app" and params.startswith("dur="):
+            return float(params[4:])
+    return None
+
+
+def shard_key(trace):
+    """Requests of one user (else one project) go to the same worker, in order."""
+    body = trace.get("body") if isinstance(trace.get("body"), dict) else {}
+    return (trace["query"].get("userId") or body.get("userId") or body.get("createdBy")
+            or path_params(trace).get("project_id") or trace["path"])
+
+
+def replay(base, traces, speed, workers, password):
+    """Send every trace on schedule; returns ([(status, client ms, server ms)], elapsed, max lag).
+
+    Each worker owns one keep-alive session and a queue; a user's requests
+    always land on the same worker so they run in recorded order even at
+    full speed, which keeps runs reproducible.
+    """
+    results = [None] * len(traces)
+    queues = [queue.Queue() for _ in range(workers)]
+    lags = [0.0] * workers
+
+    def worker(n):
+        session = requests.Session()
+        while True:
+            item = queues[n].get()
+            if item is None:
+                return
+            i, trace, due = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            lags[n] = max(lags[n], -delay)
+            start = time.perf_counter()
+            try:
+                r = session.request(
+                    trace["method"], base + trace["path"], params=trace["query"] or None,
+                    json=fill_redacted(trace["body"], password) if "body" in trace else None, timeout=30,
+                )
+                status, server = r.status_code, server_ms(r)
+            except requests.RequestException:
+                status, server = None, None
+            results[i] = (status, (time.perf_counter() - start) * 1000, server)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(workers)]
+    for t in threads:
+        t.start()
+    t0 = traces[0]["t"]
+    started = time.monotonic()
+    shards = {}
+    for i, trace in enumerate(traces):
+        due = started + ((trace["t"] - t0) / speed if speed > 0 else 0)
+        n = shards.setdefault(shard_key(trace), len(shards) % workers)
+        queues[n].put((i, trace, due))
+    for q in queues:
+        q.put(None)
+    for t in threads:
+        t.join()
+    return results, time.monotonic() - started, max(lags)
+
+
+def summarize(traces, results):
+    by_route = defaultdict(lambda: {"recorded": [], "replayed": [], "client": [], "mismatches": 0, "errors": 0})
+    for trace, (status, client, server) in zip(traces, results):
+        r = by_route[f"{trace['method']} {trace['route'] or trace['path']}"]
+        r["recorded"].append(trace["ms"])
+        # Compare like with like: the recording has server-side times
+        r["replayed"].append(server if server is not None else client)
+        r["client"].append(client)
+        if status is None:
+            r["errors"] += 1
+        elif status != trace["status"]:
+            r["mismatches"] += 1
+
+    summary = {}
+    for route, r in sorted(by_route.items()):
+        recorded, replayed = sorted(r["recorded"]), sorted(r["replayed"])
+        summary[route] = {
+            "count": len(replayed),
+            "recordedP50": percentile(recorded, 50),
+            "recordedP95": percentile(recorded, 95),
+            "p50": percentile(replayed, 50),
+            "p95": percentile(replayed, 95),
+            "mean": statistics.fmean(replayed),
+            "clientP50": percentile(sorted(r["client"]), 50),
+            "statusMismatches": r["mismatches"],
+            "errors": r["errors"],
+        }
+    return summary
+
+
+def delta(new, old):
+    if not old:
+        return "     n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traces", nargs="+", help="NDJSON capture file(s)")
+    parser.add_argument("--base", default="http://127.0.0.1:5000")
+    parser.add_argument("--speed", type=float, default=1.0, help="schedule speed-up (1 = as recorded, 0 = no pauses)")
+    parser.add_argument("--workers", type=int, default=32, help="threads, each with one keep-alive session")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--password", default="replay-password", help="sent in place of redacted values")
+    parser.add_argument("--seed", action="store_true", help="create the users/projects the trace needs first")
+    parser.add_argument("--save", help="write per-route results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier --save")
+    args = parser.parse_args()
+
+    traces, skipped = load_traces(args.traces, args.limit)
+    if not traces:
+        print("❌ No requests in the trace")
+        return 1
+    if skipped:
+        print(f"Skipping {skipped} requests whose bodies were too large to capture")
+    if args.seed:
+        seed(args.base, traces, args.password)
+
+    span = traces[-1]["t"] - traces[0]["t"]
+    print(f"Replaying {len(traces)} requests ({span:.1f}s recorded) at "
+          f"{'full speed' if args.speed <= 0 else f'{args.speed:g}x'} with {args.workers} workers")
+    results, elapsed, lag = replay(args.base, traces, args.speed, args.workers, args.password)
+    summary = summarize(traces, results)
+    print(f"Done in {elapsed:.1f}s ({len(traces) / elapsed:.1f} req/s), max schedule lag {lag * 1000:.0f} ms")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["routes"]
+        print(f"Deltas against {args.baseline}")
+    else:
+        print("Deltas against the recorded server-side latency")
+
+    width = max(len(route) for route in summary)
+    print(f"{'route':<{width}} {'n':>6} {'p50 ms':>8} {'Δp50':>8} {'p95 ms':>8} {'Δp95':>8} {'status≠':>7}")
+    for route, r in summary.items():
+        old = baseline.get(route)
+        old_p50 = old["p50"] if old else (None if baseline else r["recordedP50"])
+        old_p95 = old["p95"] if old else (None if baseline else r["recordedP95"])
+        print(f"{route:<{width}} {r['count']:>6} {r['p50']:>8.2f} {delta(r['p50'], old_p50)} "
+              f"{r['p95']:>8.2f} {delta(r['p95'], old_p95)} {r['statusMismatches'] + r['errors']:>7}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"traces": args.traces, "speed": args.speed, "requests": len(traces),
+                       "elapsed": elapsed, "routes": summary}, f, indent=2)
+        print(f"Saved {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
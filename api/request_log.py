@@ -0,0 +1,236 @@
+"""
+Structured JSON access and error logging that never blocks a request.
+
+Request threads only put LogRecords on a bounded queue (LOG_QUEUE_SIZE,
+default 10000) through a QueueHandler; a QueueListener thread formats them
+as one JSON object per line and writes them to stdout. When the queue is
+full the record is dropped and counted instead of waiting; the listener
+reports the running total as a `log_records_dropped` line once the queue
+drains.
+
+Every request produces one `access` line:
+
+    {"ts": ..., "level": "INFO", "logger": "softwarelab.access", "msg": "access",
+     "method": "POST", "route": "/api/projects/<project_id>/join",
+     "path": "/api/projects/p1/join", "status": 200, "ms": 3.12,
+     "userId": "u1", "mongoCommands": 4}
+
+`userId` comes from the query string or the JSON body. The same latency
+goes back to the client as `Server-Timing: app;dur=<ms>`. Errors logged with
+`log.exception(...)` (and Flask's own unhandled-exception log) go through
+the same queue with the traceback in `exc`.
+
+ACCESS_LOG=off turns the access lines off; LOG_LEVEL filters the rest.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+from pymongo import monitoring
+
+ACCESS_LOG = os.getenv("ACCESS_LOG", "on").lower() in ("1", "on", "true", "yes")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Application logger; modules log through children of it
+log = logging.getLogger("softwarelab")
+access_log = logging.getLogger("softwarelab.access")
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking on a full queue."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: args may change after the
+        # request returns. Formatting to JSON is left to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_dropped:
+                self.dropped += 1
+
+
+class _DropReporter(logging.Handler):
+    """Listener-side handler that writes a line whenever the drop total grew."""
+
+    def __init__(self, source, target):
+        super().__init__()
+        self.source = source
+        self.target = target
+        self.reported = 0
+
+    def emit(self, record):
+        dropped = self.source.dropped
+        if dropped != self.reported and self.source.queue.empty():
+            self.reported = dropped
+            notice = logging.LogRecord(log.name, logging.WARNING, __file__, 0, "log_records_dropped", None, None)
+            notice.dropped = dropped
+            self.target.handle(notice)
+
+
+class BackgroundWriter:
+    """A DroppingQueueHandler drained into `output` by a QueueListener thread."""
+
+    def __init__(self, output, queue_size=LOG_QUEUE_SIZE):
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        self.output = output
+        self._listener = None
+        atexit.register(self.stop)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def start(self):
+        """Start the writer thread; call again in a forked worker (threads don't survive fork)."""
+        if self._listener is not None and self._listener._thread is not None and self._listener._thread.is_alive():
+            return
+        self._listener = QueueListener(
+            self.handler.queue, self.output, _DropReporter(self.handler, self.output), respect_handler_level=True
+        )
+        self._listener.start()
+
+    def stop(self):
+        """Flush what is queued and stop the writer thread."""
+        if self._listener is not None and self._listener._thread is not None and self._listener._thread.is_alive():
+            self._listener.stop()
+        self._listener = None
+
+
+class _CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands started by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+    def started(self, event):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _user_id():
+    user_id = request.args.get("userId")
+    if user_id is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            user_id = body.get("userId")
+    return user_id if isinstance(user_id, str) else None
+
+
+class RequestLogger:
+    def __init__(self, access=ACCESS_LOG, level=LOG_LEVEL, queue_size=LOG_QUEUE_SIZE, stream=None):
+        self.access = access
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+        self.writer = BackgroundWriter(output, queue_size)
+        self.handler = self.writer.handler
+        self.commands = _CommandCounter()
+
+        log.setLevel(level)
+        log.addHandler(self.handler)
+        log.propagate = False
+        access_log.setLevel(logging.INFO)
+        if access:
+            # Like the profiler's timer: only MongoClients created after this see it
+            monitoring.register(self.commands)
+
+    @property
+    def dropped(self):
+        return self.writer.dropped
+
+    def init_app(self, app):
+        # Flask's own errors (unhandled exceptions) go through the queue too
+        from flask.logging import default_handler
+
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.handler)
+        app.logger.propagate = False
+        if self.access:
+            app.before_request(self._before)
+            app.after_request(self._after)
+        self.start()
+
+    def start(self):
+        """Start the writer thread; call again in a forked worker."""
+        self.writer.start()
+
+    def stop(self):
+        self.writer.stop()
+
+    # ---------- request hooks ----------
+
+    def _before(self):
+        g.log_started = time.perf_counter()
+        self.commands.reset()
+
+    def _after(self, response):
+        started = g.pop("log_started", None)
+        if started is None:
+            return response
+        ms = round((time.perf_counter() - started) * 1000, 3)
+        # Lets clients (replay_traffic.py, browser devtools) see server time
+        response.headers["Server-Timing"] = f"app;dur={ms}"
+        access_log.info("access", extra={
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "status": response.status_code,
+            "ms": ms,
+            "userId": _user_id(),
+            "mongoCommands": self.commands.count(),
+        })
+        return response
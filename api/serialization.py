@@ -0,0 +1,170 @@
+"""
+JSON serialization fast path and response compression for the Flask API.
+
+- FastJSONProvider uses orjson when it is installed and falls back to the
+  stdlib encoder (Flask's DefaultJSONProvider) otherwise.
+- init_compression() gzip/brotli-encodes responses above a size threshold
+  when the client advertises support in Accept-Encoding.
+
+Both are configured from the environment (see api/README.md).
+"""
+
+import gzip
+import os
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson").lower()
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+# Only text-like payloads are worth compressing
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html"}
+
+
+def orjson_available():
+    return orjson is not None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the stdlib as fallback.
+
+    Keys are not sorted (orjson keeps insertion order) and datetimes are
+    still passed to Flask's default handler so their format is unchanged.
+    """
+
+    sort_keys = False
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+
+    def _orjson_options(self, kwargs):
+        """Translate json.dumps kwargs into orjson options, or None if unsupported."""
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        for key, value in kwargs.items():
+            if key == "indent":
+                if value:
+                    option |= orjson.OPT_INDENT_2
+            elif key == "sort_keys":
+                if value:
+                    option |= orjson.OPT_SORT_KEYS
+            elif key in ("default", "ensure_ascii", "separators"):
+                # default is handled separately, orjson output is always
+                # compact UTF-8 which is valid for both of the others
+                continue
+            else:
+                return None
+        return option
+
+    def dumps_bytes(self, obj, **kwargs):
+        """Serialize to UTF-8 bytes without the str round trip where possible."""
+        if self.use_orjson:
+            option = self._orjson_options(kwargs)
+            if option is not None:
+                return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option)
+        return DefaultJSONProvider.dumps(self, obj, **kwargs).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson:
+            return self.dumps_bytes(obj, **kwargs).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args["indent"] = 2
+        else:
+            dump_args["separators"] = (",", ":")
+
+        return self._app.response_class(
+            self.dumps_bytes(obj, **dump_args) + b"\n", mimetype=self.mimetype
+        )
+
+
+def make_json_provider(app, serializer=None):
+    """Return the JSON provider selected by JSON_SERIALIZER ("orjson" or "stdlib")."""
+    serializer = (serializer or JSON_SERIALIZER).lower()
+    if serializer == "stdlib":
+        return DefaultJSONProvider(app)
+    return FastJSONProvider(app, use_orjson=(serializer == "orjson"))
+
+
+# ---------- COMPRESSION ----------
+
+def available_encodings():
+    """Content codings this process can produce, in order of preference."""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def compress_body(data, encoding, gzip_level=None, brotli_quality=None):
+    if encoding == "br":
+        quality = COMPRESS_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+        return brotli.compress(data, quality=quality)
+    level = COMPRESS_GZIP_LEVEL if gzip_level is None else gzip_level
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def negotiate_encoding(accept_encodings, encodings=None):
+    """Pick the best coding the client accepts, or None for identity."""
+    return accept_encodings.best_match(encodings or available_encodings())
+
+
+def init_compression(app, min_bytes=None):
+    """Register an after_request hook that compresses large responses.
+
+    Set COMPRESS_MIN_BYTES=0 to compress everything or a negative value to
+    disable compression entirely.
+    """
+    threshold = COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+    if threshold < 0:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        data = response.get_data()
+        if len(data) < threshold:
+            return response
+
+        encoding = negotiate_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        compressed = compress_body(data, encoding)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
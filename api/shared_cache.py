@@ -0,0 +1,524 @@
+"""
+Cross-worker shared-memory cache for access checks and resource reads.
+
+Every gunicorn worker maps the same file (SHARED_CACHE_PATH, by default
+under /dev/shm when it exists, named after a hash of the MongoDB URI and
+database so APIs on different databases never share a table) holding a
+fixed-size hash table, so there is one copy of the cached data per host
+instead of one per worker, and all workers see the same updates. What is
+cached:
+
+    p <projectId>            {isPublic}, versioned by the project's `version`
+    m <projectId> <userId>   {member, pv}: valid while the project is at version pv
+                             (membership changes bump the project's version)
+    r <projectId> <hwsetId>  the resource's RESOURCE_FIELDS, versioned
+    rl <projectId>           the project's hwsetIds, in list_for_project order
+    u <userId>               a generation that changes with the user's memberships
+                             (validates each worker's cached project ids, see memberships.py)
+
+Table layout: a header, then SHARED_CACHE_SLOTS slots of SHARED_CACHE_SLOT_BYTES
+(key + JSON value; larger entries are not cached). A key lives in one of
+PROBES consecutive slots; when all are taken one of them is overwritten, so
+the size is bounded and nothing ever grows.
+
+Readers take no locks. Each slot carries a sequence number that a writer
+makes odd while it writes and even again afterwards; a reader copies the
+slot and retries (then gives up and misses) if the number was odd or
+changed underneath it.
+
+Writers serialise on a lock file (flock + a thread lock). One process at a
+time is the updater: it holds `<path>.updater`, follows a MongoDB change
+stream on Projects and Resources, and writes every change it sees
+(versions only move forward). Other processes take over within
+SHARED_CACHE_ELECTION_SECONDS when the updater exits. Workers fill misses
+themselves, but a fill is dropped when the table's epoch moved since the
+worker started its database read (the updater bumps it for inserts,
+deletes and takeovers) or when the entry already has a newer version.
+
+Readers only trust the table while the updater's heartbeat is at most
+SHARED_CACHE_MAX_LAG_SECONDS old, so without a change stream (standalone
+mongod, the memory backend, Windows without fcntl) it is simply unused.
+Changes made by this API are also invalidated directly, so a client reads
+its own writes without waiting for the change stream.
+
+The updater thread starts in the process that serves requests (gunicorn's
+post_fork, or the first request), never in a preloading master: a master
+holding the updater lock would keep it for its whole life and fork workers
+while the thread runs.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from storage import RESOURCE_FIELDS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so no shared cache
+    fcntl = None
+
+SHARED_CACHE = os.getenv("SHARED_CACHE", "on").lower() in ("1", "on", "true", "yes")
+# Unset: SHARED_CACHE_DIR/softwarelab-cache-<hash of URI and database>
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or None
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+SHARED_CACHE_SLOTS = int(os.getenv("SHARED_CACHE_SLOTS", "65536"))
+SHARED_CACHE_SLOT_BYTES = int(os.getenv("SHARED_CACHE_SLOT_BYTES", "256"))
+SHARED_CACHE_MAX_LAG_SECONDS = float(os.getenv("SHARED_CACHE_MAX_LAG_SECONDS", "5"))
+SHARED_CACHE_ELECTION_SECONDS = float(os.getenv("SHARED_CACHE_ELECTION_SECONDS", "5"))
+
+MAGIC = b"SLCACHE1"
+# magic, slots, slot bytes, epoch, heartbeat (epoch seconds)
+HEADER = struct.Struct("<8sQQQd")
+HEADER_BYTES = 64
+EPOCH_OFFSET = 24
+HEARTBEAT_OFFSET = 32
+# seq, key hash, version, flags, key length, value length
+SLOT = struct.Struct("<QQqHHI")
+SEQ = struct.Struct("<Q")
+EPOCH = struct.Struct("<Q")
+HEARTBEAT = struct.Struct("<d")
+
+EMPTY = 0
+TOMBSTONE = 1
+STUB = 1  # flag: a version marker only ("at least this version"), not a value
+UNVERSIONED = -1
+PROBES = 8
+READ_RETRIES = 4
+
+# Change stream documents carry only what the cache stores
+WATCHED = ("Projects", "Resources")
+CHANGE_PIPELINE = [
+    {"$match": {"ns.coll": {"$in": list(WATCHED)}}},
+    {"$project": {
+        "operationType": 1, "ns": 1, "documentKey": 1,
+        **{f"fullDocument.{f}": 1 for f in set(RESOURCE_FIELDS) | {"isPublic"}},
+    }},
+]
+# "$changeStream is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+log = logging.getLogger("softwarelab.shared_cache")
+
+
+def key_hash(key):
+    h = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return h if h > TOMBSTONE else h + 2
+
+
+def default_path(storage):
+    """Table file for the database a storage backend points at."""
+    identity = f"{storage.uri}\0{storage.db.name}".encode()
+    return os.path.join(SHARED_CACHE_DIR, f"softwarelab-cache-{hashlib.blake2b(identity, digest_size=6).hexdigest()}")
+
+
+def encode(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class SharedTable:
+    """Fixed-size open-addressing hash table in a shared file mapping.
+
+    get() is safe to call from any process at any time; every other method
+    must be called with the writer lock held.
+    """
+
+    def __init__(self, path, slots=SHARED_CACHE_SLOTS, slot_bytes=SHARED_CACHE_SLOT_BYTES):
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.size = HEADER_BYTES + slots * slot_bytes
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size != self.size or os.pread(fd, HEADER.size, 0)[:8] != MAGIC \
+                        or HEADER.unpack(os.pread(fd, HEADER.size, 0))[1:3] != (slots, slot_bytes):
+                    # New file, or one left by a different configuration
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, slots, slot_bytes, 0, 0.0), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self.mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    # ---------- header ----------
+
+    def epoch(self):
+        return EPOCH.unpack_from(self.mm, EPOCH_OFFSET)[0]
+
+    def bump_epoch(self):
+        EPOCH.pack_into(self.mm, EPOCH_OFFSET, self.epoch() + 1)
+
+    def heartbeat(self):
+        return HEARTBEAT.unpack_from(self.mm, HEARTBEAT_OFFSET)[0]
+
+    def beat(self, now=None):
+        HEARTBEAT.pack_into(self.mm, HEARTBEAT_OFFSET, now or time.time())
+
+    # ---------- reads (lock-free) ----------
+
+    def _offset(self, index):
+        return HEADER_BYTES + (index % self.slots) * self.slot_bytes
+
+    def get(self, key):
+        """(value bytes, version, flags) for `key`, or None."""
+        kb = key.encode()
+        h = key_hash(kb)
+        mm = self.mm
+        for probe in range(PROBES):
+            off = self._offset(h + probe)
+            for _ in range(READ_RETRIES):
+                seq, slot_hash, version, flags, klen, vlen = SLOT.unpack_from(mm, off)
+                if seq & 1:
+                    continue  # being written
+                if slot_hash == EMPTY:
+                    return None
+                if slot_hash != h:
+                    break
+                end = off + SLOT.size + klen + vlen
+                if end > off + self.slot_bytes:
+                    continue  # torn header
+                data = mm[off + SLOT.size:end]
+                if SEQ.unpack_from(mm, off)[0] != seq:
+                    continue  # changed while copying
+                if data[:klen] != kb:
+                    break  # hash collision
+                return data[klen:], version, flags
+            else:
+                return None  # too busy; treat as a miss
+        return None
+
+    # ---------- writes (writer lock held) ----------
+
+    def _write(self, off, slot_hash, kb=b"", value=b"", version=UNVERSIONED, flags=0):
+        seq = SEQ.unpack_from(self.mm, off)[0]
+        SEQ.pack_into(self.mm, off, seq | 1)
+        end = off + SLOT.size + len(kb) + len(value)
+        self.mm[off + SLOT.size:end] = kb + value
+        SLOT.pack_into(self.mm, off, seq | 1, slot_hash, version, flags, len(kb), len(value))
+        SEQ.pack_into(self.mm, off, (seq | 1) + 1)
+
+    def _find(self, kb, h):
+        """(offset of `kb`'s slot or None, offset to write a new entry at)."""
+        free = None
+        for probe in range(PROBES):
+            off = self._offset(h + probe)
+            _, slot_hash, _, _, klen, _ = SLOT.unpack_from(self.mm, off)
+            if slot_hash == h and self.mm[off + SLOT.size:off + SLOT.size + klen] == kb:
+                return off, off
+            if slot_hash in (EMPTY, TOMBSTONE):
+                free = free if free is not None else off
+                if slot_hash == EMPTY:
+                    break
+        if free is None:
+            # Window full: evict a slot picked by the high bits of the hash
+            free = self._offset(h + (h >> 32) % PROBES)
+        return None, free
+
+    def put(self, key, value, version=UNVERSIONED, flags=0):
+        """Store or replace an entry; False if it doesn't fit in a slot."""
+        kb = key.encode()
+        if SLOT.size + len(kb) + len(value) > self.slot_bytes:
+            return False
+        h = key_hash(kb)
+        _, off = self._find(kb, h)
+        self._write(off, h, kb, value, version, flags)
+        return True
+
+    def delete(self, key):
+        kb = key.encode()
+        off, _ = self._find(kb, key_hash(kb))
+        if off is not None:
+            self._write(off, TOMBSTONE)
+
+    def clear(self):
+        for index in range(self.slots):
+            off = self._offset(index)
+            if SLOT.unpack_from(self.mm, off)[1] != EMPTY:
+                self._write(off, EMPTY)
+
+
+class SharedCache:
+    def __init__(self, enabled=SHARED_CACHE, path=SHARED_CACHE_PATH, slots=SHARED_CACHE_SLOTS,
+                 slot_bytes=SHARED_CACHE_SLOT_BYTES, max_lag=SHARED_CACHE_MAX_LAG_SECONDS,
+                 election_interval=SHARED_CACHE_ELECTION_SECONDS):
+        self.wanted = enabled and fcntl is not None
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.max_lag = max_lag
+        self.election_interval = election_interval
+        self.table = None
+        self.storage = None
+        self.hits = 0
+        self.misses = 0
+        self._thread_lock = threading.Lock()
+        self._lock_fd = None
+        self._updater_fd = None
+        self._pid = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._resume_token = None
+
+    @property
+    def enabled(self):
+        return self.table is not None
+
+    def bind(self, storage):
+        """Use the storage's database for the change stream; only the mongo backend is cached."""
+        self.storage = storage
+        if not self.wanted or storage.name != "mongo" or self.table is not None:
+            return
+        if self.path is None:
+            self.path = default_path(storage)
+        try:
+            self.table = SharedTable(self.path, self.slots, self.slot_bytes)
+        except OSError:
+            log.warning("shared cache disabled: can't map %s", self.path, exc_info=True)
+
+    def init_app(self, app):
+        # Not started here: the importing process may be a preloading master
+        app.before_request(self.start)
+
+    def start(self):
+        """Start the updater election thread, once per process (cheap to call again)."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        # Descriptors and locks inherited from a parent share its lock state;
+        # its thread lock may even have been held at the fork
+        for fd in (self._lock_fd, self._updater_fd):
+            if fd is not None:
+                os.close(fd)
+        self._lock_fd = self._updater_fd = None
+        self._thread_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="shared-cache-updater", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def usable(self):
+        """True while an updater is following the change stream."""
+        return self.table is not None and time.time() - self.table.heartbeat() <= self.max_lag
+
+    # ---------- writer lock ----------
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield self.table
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ---------- reads with fill ----------
+
+    def _lookup(self, key):
+        entry = self.table.get(key)
+        if entry is None or entry[2] & STUB:
+            return None
+        try:
+            return json.loads(entry[0]), entry[1]
+        except ValueError:
+            return None
+
+    def _fill(self, key, value, version, epoch):
+        data = encode(value)
+        with self._locked() as table:
+            if table.epoch() != epoch or not self.usable():
+                return  # something changed (or nobody watches) since the read started
+            current = table.get(key)
+            if current is not None and version != UNVERSIONED and \
+                    (current[1] > version or (current[1] == version and not current[2] & STUB)):
+                return  # the updater already wrote this or a newer version
+            table.put(key, data, version)
+
+    def project(self, project_id, load):
+        """{"isPublic", "version"} of a project (load() on a miss), or None if it doesn't exist."""
+        key = f"p\0{project_id}"
+        hit = self._lookup(key)
+        if hit is not None:
+            self.hits += 1
+            return {"isPublic": hit[0]["isPublic"], "version": hit[1]}
+        self.misses += 1
+        epoch = self.table.epoch()
+        doc = load()
+        if doc is not None:
+            self._fill(key, {"isPublic": doc.get("isPublic", False)}, doc.get("version", 0), epoch)
+        return doc
+
+    def is_member(self, project_id, user_id, project_version, load):
+        """Membership as of the project's version; load() on a miss."""
+        key = f"m\0{project_id}\0{user_id}"
+        hit = self._lookup(key)
+        if hit is not None and hit[0]["pv"] == project_version:
+            self.hits += 1
+            return hit[0]["member"]
+        self.misses += 1
+        epoch = self.table.epoch()
+        member = load()
+        self._fill(key, {"member": member, "pv": project_version}, UNVERSIONED, epoch)
+        return member
+
+    def project_resources(self, project_id, load):
+        """A project's resources (RESOURCE_FIELDS), from the table when every one is cached."""
+        ids = self._lookup(f"rl\0{project_id}")
+        if ids is not None:
+            docs = []
+            for hwset_id in ids[0]:
+                hit = self._lookup(f"r\0{project_id}\0{hwset_id}")
+                if hit is None:
+                    break
+                docs.append(hit[0])
+            else:
+                self.hits += 1
+                return docs
+        self.misses += 1
+        epoch = self.table.epoch()
+        docs = load()
+        for doc in docs:
+            self._fill(f"r\0{project_id}\0{doc['hwsetId']}", doc, doc.get("version", 0), epoch)
+        self._fill(f"rl\0{project_id}", [doc["hwsetId"] for doc in docs], UNVERSIONED, epoch)
+        return docs
+
+    # ---------- invalidation by this process ----------
+
+    def resource_changed(self, project_id, hwset_id, version=None):
+        """Forget a resource this process just wrote; with its new version, older fills are refused."""
+        if not self.enabled:
+            return
+        key = f"r\0{project_id}\0{hwset_id}"
+        with self._locked() as table:
+            current = table.get(key)
+            if version is None:
+                table.delete(key)
+            elif current is None or current[1] < version:
+                table.put(key, b"", version, STUB)
+
+    def user_generation(self, user_id):
+        """Changes whenever users_changed() runs for the user in any process on the host.
+        None if unknown; doesn't need the updater, only this API writes it."""
+        if not self.enabled:
+            return None
+        hit = self._lookup(f"u\0{user_id}")
+        return hit[0] if hit is not None else None
+
+    def users_changed(self, user_ids):
+        """New generations for users whose memberships this process just changed."""
+        if not self.enabled or not user_ids:
+            return
+        with self._locked() as table:
+            for user_id in user_ids:
+                table.put(f"u\0{user_id}", encode(time.time_ns()))
+
+    def project_changed(self, project_id):
+        """Forget a project whose visibility or members this process just changed."""
+        if not self.enabled:
+            return
+        with self._locked() as table:
+            table.delete(f"p\0{project_id}")
+            # Refuse fills that read the old project or membership state
+            table.bump_epoch()
+
+    # ---------- change stream updater ----------
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._elected():
+                try:
+                    self._follow()
+                except OperationFailure as e:
+                    if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                        log.info("shared cache unused: change streams need a replica set")
+                        fcntl.flock(self._updater_fd, fcntl.LOCK_UN)
+                        return
+                    log.warning("shared cache change stream failed: %s", e)
+                    self._resume_token = None  # e.g. history lost: start over
+                except PyMongoError as e:
+                    log.warning("shared cache change stream interrupted: %s", e)
+                except Exception:
+                    log.exception("shared cache updater failed")
+                    self._resume_token = None
+            self._stopping.wait(self.election_interval)
+
+    def _elected(self):
+        if self._updater_fd is None:
+            self._updater_fd = os.open(self.path + ".updater", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._updater_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _follow(self):
+        with self.storage.db.watch(
+            CHANGE_PIPELINE, full_document="updateLookup", max_await_time_ms=500,
+            resume_after=self._resume_token,
+        ) as stream:
+            if self._resume_token is None:
+                # Events before the stream opened were missed: start empty
+                with self._locked() as table:
+                    table.clear()
+                    table.bump_epoch()
+                log.info("shared cache updater started in process %s", os.getpid())
+            pending_clear = False
+            while not self._stopping.is_set():
+                change = stream.try_next()
+                if change is None:
+                    if pending_clear:
+                        with self._locked() as table:
+                            table.clear()
+                            table.bump_epoch()
+                        pending_clear = False
+                    self.table.beat()
+                    continue
+                pending_clear |= self.apply(change)
+                self._resume_token = stream.resume_token
+                self.table.beat()
+
+    def apply(self, change):
+        """Write one change event; True if the table must be cleared (deletes, drops)."""
+        op = change["operationType"]
+        if op not in ("insert", "update", "replace"):
+            # delete/drop/rename/invalidate: the event has no projectId to find the entry by
+            return True
+        doc = change.get("fullDocument")
+        if doc is None or "projectId" not in doc:
+            return False  # deleted since (its delete event follows), or not an API document
+        coll = change["ns"]["coll"]
+        version = doc.get("version", 0)
+        with self._locked() as table:
+            if coll == "Projects":
+                key, value = f"p\0{doc['projectId']}", {"isPublic": doc.get("isPublic", False)}
+            elif "hwsetId" in doc:
+                key = f"r\0{doc['projectId']}\0{doc['hwsetId']}"
+                value = {f: doc[f] for f in RESOURCE_FIELDS if f in doc}
+                if op == "insert":
+                    # The project's hwsetId list changed; refuse fills of the old one
+                    table.delete(f"rl\0{doc['projectId']}")
+                    table.bump_epoch()
+            else:
+                return False
+            current = table.get(key)
+            if current is None or current[1] < version or (current[2] & STUB and current[1] <= version):
+                table.put(key, encode(value), version)
+        return False
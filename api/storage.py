@@ -0,0 +1,479 @@
+"""
+Storage backends for the API.
+
+Handlers in app.py never touch PyMongo collections directly; they go through
+repositories on a storage object:
+
+    storage.users        insert(doc), get(user_id), existing_ids(user_ids)
+    storage.projects     insert(doc), insert_many(docs), get(project_id, fields),
+                         list_public(fields), list_by_ids(ids, fields, since),
+                         update_versioned(project_id, version, fields)
+    storage.resources    insert(doc), insert_many(docs), get(project_id, hwset_id, fields),
+                         list_for_project(project_id, fields),
+                         list_for_projects(project_ids, fields, since),
+                         set_counts(project_id, hwset_id, available, allocated, version),
+                         increment(project_id, hwset_id, delta, min_available, min_allocated)
+    storage.memberships  see memberships.py
+    storage.hardware_catalog
+                         version(), load(), upsert(entry), insert_missing(entries)
+                         (see catalog.py)
+    storage.idempotency_records
+                         get(id), insert(record), set_fields(id, fields), delete(id)
+    storage.history      record(project_id, hwset_id, available, allocated, ts),
+                         raw_points / hourly_points / daily_points(project_id, hwset_id, start, end, limit),
+                         downsample(now)   (see history.py)
+
+Inserts raise pymongo's DuplicateKeyError on a duplicate id in every backend;
+insert_many() instead returns {key: error} for the documents it could not
+insert ("duplicate" for an existing id) and writes the rest.
+Every write to a project or resource bumps its `version`; the *_versioned
+writes only apply if the document is still at the version the caller read
+(see versioning.py). Every write also stamps `updatedSeq`, and the list
+methods' `since` keeps only documents stamped after it (see sync.py).
+Mutating methods take an optional `session` (the idempotent request's
+transaction); backends without transactions ignore it.
+
+Backends, selected with STORAGE_BACKEND:
+- mongo   (default) MongoDB via MONGODB_URI, see db_policy.py for the
+          per-endpoint-class read/write options
+- memory  thread-safe in-process dicts (memory_storage.py); no database
+          needed, nothing persists. For tests and for benchmarking the API
+          logic on its own.
+"""
+
+import os
+from datetime import timedelta
+
+import pymongo
+from pymongo import ASCENDING, MongoClient, ReturnDocument, WriteConcern
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from db_policy import BULK_CHUNK_SIZE, BULK_WRITES, CRITICAL_WRITES, HOT_READS, STRONG_READS, PolicyRegistry
+from history import HISTORY_HOURLY_RETENTION_DAYS, HISTORY_RAW_RETENTION_DAYS, rollup_end, truncate, utc
+from memberships import MembershipStore
+from sync import next_seq
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo").lower()
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+# Per-operation budget (client-side timeout; also sent as maxTimeMS) and the
+# server selection / connect limits, instead of the driver's 30 s defaults.
+# 0 disables MONGO_TIMEOUT_MS. See degraded.py.
+# MONGO_TIMEOUT_MS is meant for request handling: CLI tools open storage with
+# timeout_ms=0, and background jobs in the API (history rollups, index builds)
+# run under maintenance_timeout() instead.
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "3000"))
+MONGO_MAINTENANCE_TIMEOUT_MS = int(os.getenv("MONGO_MAINTENANCE_TIMEOUT_MS", "600000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "2000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "2000"))
+DATABASE_NAME = "softwarelabdb"
+
+# Field sets returned to clients
+PROJECT_FIELDS = ("projectId", "name", "description", "createdAt", "createdBy", "isPublic")
+PROJECT_DETAIL_FIELDS = PROJECT_FIELDS + ("memberCount", "version")
+# name/notes come from the hardware catalog (catalog.py); a resource only has
+# them before migration v7 or as a per-project override
+RESOURCE_FIELDS = ("projectId", "hwsetId", "name", "total", "allocatedToProject", "available", "notes", "version")
+# What checkout/checkin read
+RESOURCE_COUNTER_FIELDS = ("available", "allocatedToProject", "version")
+
+
+def maintenance_timeout():
+    """Budget for background work on a client created with MONGO_TIMEOUT_MS; a
+    pymongo.timeout() block replaces the client's timeoutMS inside it."""
+    return pymongo.timeout(MONGO_MAINTENANCE_TIMEOUT_MS / 1000.0)
+
+
+def projection(fields):
+    """PyMongo projection for a tuple of field names (None = whole document)."""
+    proj = {"_id": 0}
+    if fields:
+        proj.update({f: 1 for f in fields})
+    return proj
+
+
+def insert_chunks(collection, docs, key, chunk_size=BULK_CHUNK_SIZE):
+    """Unordered insert_many in chunks; returns {key(doc): error} for the failures."""
+    failed = {}
+    for start in range(0, len(docs), chunk_size):
+        # Copies: insert_many adds an ObjectId _id to each document
+        chunk = [dict(doc) for doc in docs[start:start + chunk_size]]
+        try:
+            collection.insert_many(chunk, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                duplicate = error.get("code") == 11000
+                failed[key(chunk[error["index"]])] = "duplicate" if duplicate else error.get("errmsg", "write failed")
+    return failed
+
+
+def stamped(doc):
+    """Copy of a document about to be inserted, with its updatedSeq."""
+    return dict(doc, updatedSeq=next_seq())
+
+
+def since_filter(query, since):
+    if since:
+        query["updatedSeq"] = {"$gt": since}
+    return query
+
+
+def version_filter(version):
+    # Documents from before versioning have no field; {"version": None} matches them
+    return version or None
+
+
+# ---------- MongoDB repositories ----------
+
+class MongoUsers:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        self.collection.create_index("userId", unique=True)
+
+    def insert(self, doc, session=None):
+        self.collection.insert_one(dict(doc), session=session)
+
+    def get(self, user_id, fields=None, session=None):
+        return self.collection.find_one({"userId": user_id}, projection(fields), session=session)
+
+    def existing_ids(self, user_ids):
+        """The subset of user_ids that exist, in one $in query."""
+        cursor = self.collection.find({"userId": {"$in": list(user_ids)}}, {"_id": 0, "userId": 1})
+        return {doc["userId"] for doc in cursor}
+
+
+class MongoProjects:
+    def __init__(self, collection, read, hot, bulk=None):
+        self.collection = collection  # critical writes
+        self.read = read              # strong reads
+        self.hot = hot                # listing/discovery reads
+        self.bulk = bulk if bulk is not None else collection
+
+    def ensure_indexes(self):
+        self.collection.create_index("projectId", unique=True)
+        # list_public
+        self.collection.create_index("isPublic")
+        # Largest projects first (verify_mongodb.py)
+        self.collection.create_index("memberCount")
+
+    def insert(self, doc, session=None):
+        self.collection.insert_one(stamped(doc), session=session)
+
+    def insert_many(self, docs):
+        return insert_chunks(self.bulk, [stamped(doc) for doc in docs], lambda doc: doc["projectId"])
+
+    def get(self, project_id, fields=None, session=None):
+        return self.read.find_one({"projectId": project_id}, projection(fields), session=session)
+
+    def list_public(self, fields=None):
+        return list(self.hot.find({"isPublic": True}, projection(fields)))
+
+    def list_by_ids(self, project_ids, fields=None, since=None):
+        query = since_filter({"projectId": {"$in": list(project_ids)}}, since)
+        return list(self.read.find(query, projection(fields)))
+
+    def update_versioned(self, project_id, version, fields=None, session=None):
+        """$set `fields` and bump the version if the project is still at `version`.
+        False if it changed (or is gone) since it was read."""
+        update = {"$inc": {"version": 1}, "$set": dict(fields or {}, updatedSeq=next_seq())}
+        result = self.collection.update_one(
+            {"projectId": project_id, "version": version_filter(version)}, update, session=session
+        )
+        return result.matched_count == 1
+
+
+class MongoResources:
+    def __init__(self, collection, read, bulk=None):
+        self.collection = collection
+        self.read = read
+        self.bulk = bulk if bulk is not None else collection
+
+    def ensure_indexes(self):
+        self.collection.create_index([("projectId", ASCENDING), ("hwsetId", ASCENDING)], unique=True)
+        # Delta sync: per-project range scans on updatedSeq
+        self.collection.create_index([("projectId", ASCENDING), ("updatedSeq", ASCENDING)])
+
+    def insert(self, doc, session=None):
+        self.collection.insert_one(stamped(doc), session=session)
+
+    def insert_many(self, docs):
+        return insert_chunks(self.bulk, [stamped(doc) for doc in docs], lambda doc: (doc["projectId"], doc["hwsetId"]))
+
+    def get(self, project_id, hwset_id, fields=None, session=None):
+        return self.collection.find_one(
+            {"projectId": project_id, "hwsetId": hwset_id}, projection(fields), session=session
+        )
+
+    def list_for_project(self, project_id, fields=None):
+        return list(self.read.find({"projectId": project_id}, projection(fields)))
+
+    def list_for_projects(self, project_ids, fields=None, since=None):
+        query = since_filter({"projectId": {"$in": list(project_ids)}}, since)
+        return list(self.read.find(query, projection(fields)))
+
+    def set_counts(self, project_id, hwset_id, available, allocated, version, session=None):
+        """Write both counters if the resource is still at `version`; False if it changed."""
+        result = self.collection.update_one(
+            {"projectId": project_id, "hwsetId": hwset_id, "version": version_filter(version)},
+            {"$set": {"available": available, "allocatedToProject": allocated, "updatedSeq": next_seq()},
+             "$inc": {"version": 1}},
+            session=session,
+        )
+        return result.matched_count == 1
+
+    def increment(self, project_id, hwset_id, delta, min_available=0, min_allocated=0, session=None):
+        """Move `delta` units into `available` (negative = out to the project) in one
+        conditional $inc. Returns the new counters, or None if the resource is missing
+        or below the minimums."""
+        return self.collection.find_one_and_update(
+            {
+                "projectId": project_id,
+                "hwsetId": hwset_id,
+                "available": {"$gte": min_available},
+                "allocatedToProject": {"$gte": min_allocated},
+            },
+            {"$inc": {"available": delta, "allocatedToProject": -delta, "version": 1},
+             "$set": {"updatedSeq": next_seq()}},
+            projection={"_id": 0, "available": 1, "allocatedToProject": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session,
+        )
+
+
+class MongoHardwareCatalog:
+    """One document per hwsetId plus {_id: "version"}, bumped by every write."""
+
+    VERSION_ID = "version"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self):
+        # sparse: the version document has no hwsetId
+        self.collection.create_index("hwsetId", unique=True, sparse=True)
+
+    def version(self):
+        doc = self.collection.find_one({"_id": self.VERSION_ID}, {"version": 1})
+        return doc["version"] if doc else 0
+
+    def load(self):
+        return list(self.collection.find({"hwsetId": {"$exists": True}}, {"_id": 0}))
+
+    def _bump(self):
+        self.collection.update_one({"_id": self.VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+    def upsert(self, entry):
+        fields = {k: v for k, v in entry.items() if k != "hwsetId"}
+        self.collection.update_one({"hwsetId": entry["hwsetId"]}, {"$set": fields}, upsert=True)
+        self._bump()
+
+    def insert_missing(self, entries):
+        """Insert the entries whose hwsetId doesn't exist yet; returns how many."""
+        inserted = 0
+        for entry in entries:
+            result = self.collection.update_one(
+                {"hwsetId": entry["hwsetId"]}, {"$setOnInsert": dict(entry)}, upsert=True
+            )
+            inserted += result.upserted_id is not None
+        if inserted:
+            self._bump()
+        return inserted
+
+
+class MongoIdempotencyRecords:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ensure_indexes(self, ttl_seconds):
+        self.collection.create_index("createdAt", expireAfterSeconds=ttl_seconds)
+
+    def get(self, record_id):
+        return self.collection.find_one({"_id": record_id})
+
+    def insert(self, record, session=None):
+        self.collection.insert_one(dict(record), session=session)
+
+    @staticmethod
+    def _match(record_id, claimed_at):
+        query = {"_id": record_id}
+        if claimed_at is not None:
+            query["claimedAt"] = claimed_at
+        return query
+
+    def reclaim(self, record_id, old_claimed_at, claimed_at):
+        """Take over a pending claim still holding old_claimed_at; False if it changed."""
+        result = self.collection.update_one(
+            {"_id": record_id, "status": "pending", "claimedAt": old_claimed_at},
+            {"$set": {"claimedAt": claimed_at}},
+        )
+        return result.modified_count == 1
+
+    def set_fields(self, record_id, fields, claimed_at=None):
+        self.collection.update_one(self._match(record_id, claimed_at), {"$set": fields})
+
+    def delete(self, record_id, claimed_at=None):
+        self.collection.delete_one(self._match(record_id, claimed_at))
+
+
+class MongoResourceHistory:
+    """Raw points in a time-series collection, hourly rollups in a regular one."""
+
+    RAW = "ResourceHistory"
+    HOURLY = "ResourceHistoryHourly"
+    STATE = "HistoryState"
+
+    def __init__(self, db):
+        self.db = db
+        # Chart data: don't make the checkout wait for the acknowledgement
+        self.raw = db[self.RAW].with_options(write_concern=WriteConcern(w=0))
+        self.hourly = db[self.HOURLY]
+        self.state = db[self.STATE]
+
+    def ensure_indexes(self):
+        try:
+            self.db.create_collection(
+                self.RAW,
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "seconds"},
+                expireAfterSeconds=HISTORY_RAW_RETENTION_DAYS * 86400,
+            )
+        except CollectionInvalid:
+            pass  # already exists
+        self.hourly.create_index([("projectId", ASCENDING), ("hwsetId", ASCENDING), ("ts", ASCENDING)])
+        if HISTORY_HOURLY_RETENTION_DAYS:
+            self.hourly.create_index("ts", expireAfterSeconds=HISTORY_HOURLY_RETENTION_DAYS * 86400)
+
+    def record(self, project_id, hwset_id, available, allocated, ts):
+        self.raw.insert_one({
+            "ts": ts,
+            "meta": {"projectId": project_id, "hwsetId": hwset_id},
+            "available": available,
+            "allocated": allocated,
+        })
+
+    def raw_points(self, project_id, hwset_id, start, end, limit):
+        cursor = self.raw.find(
+            {"meta.projectId": project_id, "meta.hwsetId": hwset_id, "ts": {"$gte": start, "$lt": end}},
+            {"_id": 0, "ts": 1, "available": 1, "allocated": 1},
+        ).sort("ts", ASCENDING).limit(limit)
+        return [dict(doc, ts=utc(doc["ts"])) for doc in cursor]
+
+    def hourly_points(self, project_id, hwset_id, start, end, limit):
+        cursor = self.hourly.find(
+            {"projectId": project_id, "hwsetId": hwset_id, "ts": {"$gte": truncate(start, "hour"), "$lt": end}},
+            {"_id": 0, "projectId": 0, "hwsetId": 0},
+        ).sort("ts", ASCENDING).limit(limit)
+        return [dict(doc, ts=utc(doc["ts"])) for doc in cursor]
+
+    def daily_points(self, project_id, hwset_id, start, end, limit):
+        cursor = self.hourly.aggregate([
+            {"$match": {"projectId": project_id, "hwsetId": hwset_id,
+                        "ts": {"$gte": truncate(start, "day"), "$lt": end}}},
+            {"$sort": {"ts": 1}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$ts", "unit": "day"}},
+                "available": {"$last": "$available"},
+                "allocated": {"$last": "$allocated"},
+                "availableMin": {"$min": "$availableMin"},
+                "availableMax": {"$max": "$availableMax"},
+                "samples": {"$sum": "$samples"},
+            }},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit},
+        ])
+        return [dict(doc, ts=utc(doc.pop("_id"))) for doc in cursor]
+
+    def downsample(self, now):
+        """Roll raw points of the completed hours since the last run into hourly
+        documents. Safe to run concurrently: buckets are replaced, not added to.
+        Returns the number of hours covered."""
+        state = self.state.find_one({"_id": "hourly"})
+        # Raw points are written w=0: leave the last minutes to the next run
+        end = rollup_end(now)
+        start = utc(state["through"]) if state else end - timedelta(days=HISTORY_RAW_RETENTION_DAYS)
+        if start >= end:
+            return 0
+        self.db[self.RAW].aggregate([
+            {"$match": {"ts": {"$gte": start, "$lt": end}}},
+            {"$sort": {"meta": 1, "ts": 1}},
+            {"$group": {
+                "_id": {
+                    "projectId": "$meta.projectId",
+                    "hwsetId": "$meta.hwsetId",
+                    "ts": {"$dateTrunc": {"date": "$ts", "unit": "hour"}},
+                },
+                "available": {"$last": "$available"},
+                "allocated": {"$last": "$allocated"},
+                "availableMin": {"$min": "$available"},
+                "availableMax": {"$max": "$available"},
+                "samples": {"$sum": 1},
+            }},
+            {"$set": {"projectId": "$_id.projectId", "hwsetId": "$_id.hwsetId", "ts": "$_id.ts"}},
+            {"$merge": {"into": self.HOURLY, "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ], allowDiskUse=True)
+        self.state.update_one({"_id": "hourly"}, {"$max": {"through": end}}, upsert=True)
+        return int((end - start) / timedelta(hours=1))
+
+
+class MongoStorage:
+    name = "mongo"
+
+    def __init__(self, uri, max_pool_size=MONGO_MAX_POOL_SIZE, database=DATABASE_NAME, timeout_ms=MONGO_TIMEOUT_MS):
+        timeouts = {
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        }
+        if timeout_ms:
+            timeouts["timeoutMS"] = timeout_ms
+        self.uri = uri
+        self.client = MongoClient(uri, maxPoolSize=max_pool_size, **timeouts)
+        self.db = self.client[database]
+
+        # Collection handles per endpoint class; read preference and concerns
+        # come from the environment (see db_policy.py)
+        self.policies = PolicyRegistry(self.db)
+        critical = lambda name: self.policies.collection(CRITICAL_WRITES, name)
+        strong = lambda name: self.policies.collection(STRONG_READS, name)
+        bulk = lambda name: self.policies.collection(BULK_WRITES, name)
+
+        self.users = MongoUsers(critical("Users"))
+        self.projects = MongoProjects(
+            critical("Projects"), strong("Projects"), self.policies.collection(HOT_READS, "Projects"),
+            bulk("Projects"),
+        )
+        self.resources = MongoResources(critical("Resources"), strong("Resources"), bulk("Resources"))
+        self.hardware_catalog = MongoHardwareCatalog(critical("HardwareCatalog"))
+        self.memberships = MembershipStore(
+            critical("Memberships"), critical("Projects"), bulk("Memberships"), critical("SyncTombstones")
+        )
+        self.idempotency_records = MongoIdempotencyRecords(critical("IdempotencyKeys"))
+        self.history = MongoResourceHistory(self.db)
+
+    def ensure_indexes(self):
+        self.users.ensure_indexes()
+        self.projects.ensure_indexes()
+        # ignore index creation errors at startup (e.g. existing duplicates)
+        for repo in (self.resources, self.hardware_catalog, self.memberships, self.history):
+            try:
+                repo.ensure_indexes()
+            except Exception:
+                pass
+
+    def close(self):
+        self.client.close()
+
+
+def open_storage(backend=None, timeout_ms=MONGO_TIMEOUT_MS):
+    """Create the storage backend named by `backend` or STORAGE_BACKEND.
+    timeout_ms=0: no per-operation budget (CLI tools and batch jobs)."""
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == "memory":
+        from memory_storage import InMemoryStorage
+
+        return InMemoryStorage()
+    if backend == "mongo":
+        uri = os.getenv("MONGODB_URI")
+        if not uri:
+            raise RuntimeError("MONGODB_URI not set in environment or .env (see api/README.md)")
+        return MongoStorage(uri, timeout_ms=timeout_ms)
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend} (expected mongo or memory)")
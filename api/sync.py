@@ -0,0 +1,89 @@
+"""
+Delta sync: change cursors over an `updatedSeq` stamped on every write.
+
+Every write to a project, resource or membership document sets its
+`updatedSeq` (see storage.py, memberships.py and memory_storage.py).
+GET /api/sync returns the caller's projects and resources changed since
+the cursor it passes, the projects it no longer belongs to (tombstones),
+and a new cursor. (Not called a token: traffic capture redacts anything
+named like one, see traffic_capture.py.)
+
+`updatedSeq` is a hybrid clock: microseconds since the epoch, strictly
+increasing within a process (next_seq() never returns the same value
+twice). A counter document would give one global order, but also one more
+round trip and a single hot document on every checkout. Across processes
+the clocks only need to agree to within a second or so.
+
+A value is handed out before its write commits, so the cursor can't simply
+be the newest updatedSeq seen: a write stamped earlier could still become
+visible later. The cursor is therefore held back to "now minus
+SYNC_SETTLE_SECONDS" (10). Writes stamped before that have either
+committed or failed, so nothing at or below the cursor can still appear. The
+setting must exceed the slowest write: MONGO_TIMEOUT_MS and an idempotent
+request's transaction. The price is that the changes of the last few
+seconds are sent again on the next sync; clients apply them by key.
+
+Tombstones (SyncTombstones, one per removed membership) expire after
+SYNC_TOMBSTONE_DAYS (30). An older cursor gets a full sync, so does one
+issued before the hardware catalog last changed (names/notes are joined in,
+see catalog.py).
+"""
+
+import os
+import threading
+import time
+
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "10"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+MICROSECONDS = 1_000_000
+
+
+class SeqClock:
+    """Strictly increasing microsecond timestamps."""
+
+    def __init__(self, clock=time.time_ns):
+        self.clock = clock
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            self._last = max(self._last + 1, self.clock() // 1000)
+            return self._last
+
+    def now(self):
+        return self.clock() // 1000
+
+
+seq_clock = SeqClock()
+
+
+def next_seq():
+    """updatedSeq for the write about to be made."""
+    return seq_clock.next()
+
+
+def horizon(settle=SYNC_SETTLE_SECONDS):
+    """The newest updatedSeq no write in flight can still be stamped below."""
+    return seq_clock.now() - int(settle * MICROSECONDS)
+
+
+def tombstone_horizon(days=SYNC_TOMBSTONE_DAYS):
+    """Cursors below this may have missed expired tombstones."""
+    return seq_clock.now() - days * 86400 * MICROSECONDS
+
+
+def make_cursor(seq, catalog_version):
+    return f"{seq}.{catalog_version or 0}"
+
+
+def parse_cursor(cursor):
+    """(seq, catalog_version) from a cursor; (0, None) for none. ValueError if malformed."""
+    if not cursor:
+        return 0, None
+    seq, _, catalog_version = cursor.partition(".")
+    seq, catalog_version = int(seq), int(catalog_version)
+    if seq < 0:
+        raise ValueError("negative seq")
+    return seq, catalog_version
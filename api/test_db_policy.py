@@ -0,0 +1,114 @@
+"""
+Read preference / read concern / write concern per endpoint class (db_policy.py).
+
+The option tests build collection handles on an unconnected client, so
+`python -m pytest test_db_policy.py` needs no database. The end-to-end test
+runs against a local single-node replica set when TEST_REPLICA_SET_URI is
+set (it uses a scratch database, not softwarelabdb):
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+    TEST_REPLICA_SET_URI="mongodb://localhost:27017/?replicaSet=rs0" python -m pytest test_db_policy.py
+"""
+
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.read_preferences import ReadPreference
+
+from db_policy import (
+    BULK_WRITES,
+    CRITICAL_WRITES,
+    ENDPOINT_CLASSES,
+    HOT_READS,
+    STRONG_READS,
+    EndpointPolicy,
+    PolicyRegistry,
+)
+from idempotency import supports_transactions
+
+SCRATCH_DB = "softwarelabdb_policy_check"
+REPLICA_SET_URI = os.getenv("TEST_REPLICA_SET_URI")
+
+
+@pytest.fixture
+def registry():
+    client = MongoClient("mongodb://localhost:27017", connect=False)
+    policies = {name: EndpointPolicy.from_env(name, {}) for name in ENDPOINT_CLASSES}
+    yield PolicyRegistry(client[SCRATCH_DB], policies)
+    client.close()
+
+
+def test_default_read_preferences(registry):
+    hot = registry.collection(HOT_READS, "Projects")
+    assert hot.read_preference.mongos_mode == "secondaryPreferred"
+    assert hot.read_concern.level == "local"
+    assert registry.collection(STRONG_READS, "Projects").read_preference == ReadPreference.PRIMARY
+    assert registry.collection(CRITICAL_WRITES, "Resources").read_preference == ReadPreference.PRIMARY
+
+
+def test_default_write_concerns(registry):
+    critical = registry.collection(CRITICAL_WRITES, "Resources")
+    assert critical.write_concern.document == {"w": "majority", "j": True}
+    assert registry.collection(BULK_WRITES, "Projects").write_concern.document == {"w": 1}
+    # Reads keep the client's default write concern
+    assert registry.collection(HOT_READS, "Projects").write_concern.document == {}
+
+
+def test_handles_are_cached_per_class_and_collection(registry):
+    for name in ENDPOINT_CLASSES:
+        assert registry.collection(name, "Projects") is registry.collection(name, "Projects")
+    assert registry.collection(HOT_READS, "Projects") is not registry.collection(STRONG_READS, "Projects")
+
+
+def test_env_overrides():
+    env = {
+        "HOT_READS_READ_PREFERENCE": "nearest",
+        "HOT_READS_MAX_STALENESS": "120",
+        "BULK_WRITES_WRITE_CONCERN": "0",
+        "CRITICAL_WRITES_WTIMEOUT": "2500",
+        "STRONG_READS_READ_PREFERENCE": "",
+    }
+    hot = EndpointPolicy.from_env(HOT_READS, env)
+    assert hot.options["read_preference"].mongos_mode == "nearest"
+    assert hot.options["read_preference"].max_staleness == 120
+    assert EndpointPolicy.from_env(BULK_WRITES, env).options["write_concern"].document == {"w": 0}
+    critical = EndpointPolicy.from_env(CRITICAL_WRITES, env)
+    assert critical.options["write_concern"].document == {"w": "majority", "j": True, "wtimeout": 2500}
+    # An empty value falls back to the client default
+    assert "read_preference" not in EndpointPolicy.from_env(STRONG_READS, env).options
+
+
+def test_unknown_read_preference():
+    with pytest.raises(ValueError):
+        EndpointPolicy.from_env(HOT_READS, {"HOT_READS_READ_PREFERENCE": "fastest"})
+
+
+@pytest.mark.skipif(not REPLICA_SET_URI, reason="TEST_REPLICA_SET_URI not set")
+def test_policies_on_a_replica_set():
+    client = MongoClient(REPLICA_SET_URI, serverSelectionTimeoutMS=5000)
+    try:
+        assert supports_transactions(client)
+        registry = PolicyRegistry(client[SCRATCH_DB])
+        client[SCRATCH_DB].drop_collection("PolicyCheck")
+
+        critical = registry.collection(CRITICAL_WRITES, "PolicyCheck")
+        assert critical.insert_one({"k": "critical"}).acknowledged
+
+        bulk = registry.collection(BULK_WRITES, "PolicyCheck")
+        result = bulk.insert_many([{"k": "bulk", "n": i} for i in range(100)], ordered=False)
+        assert len(result.inserted_ids) == 100
+
+        strong = registry.collection(STRONG_READS, "PolicyCheck")
+        assert strong.find_one({"k": "critical"}) is not None
+        # secondaryPreferred falls back to the primary on a single node
+        assert registry.collection(HOT_READS, "PolicyCheck").count_documents({"k": "bulk"}) == 100
+
+        # Critical writes inside a transaction (idempotency path)
+        with client.start_session() as session:
+            session.with_transaction(lambda s: critical.insert_one({"k": "txn"}, session=s))
+        assert strong.find_one({"k": "txn"}) is not None
+    finally:
+        client.drop_database(SCRATCH_DB)
+        client.close()
@@ -0,0 +1,105 @@
+"""
+Circuit breaker probes that end in an error other than a database outage.
+
+Run with pytest from api/ (no database needed).
+"""
+
+import pytest
+from flask import Flask
+from pymongo.errors import ServerSelectionTimeoutError
+
+from degraded import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DegradedMode
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def degraded(clock):
+    return DegradedMode(breaker=CircuitBreaker(failures=1, cooldown=10, clock=clock))
+
+
+def make_app(degraded, propagate):
+    app = Flask(__name__)
+    app.config["PROPAGATE_EXCEPTIONS"] = propagate
+    degraded.init_app(app)
+    calls = {"n": 0}
+
+    def flaky():
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise ValueError("bug in the view")
+        return {"ok": True}
+
+    app.add_url_rule("/stale", "stale", degraded.read_fallback(flaky))
+    app.add_url_rule("/plain", "plain", lambda: flaky())
+    return app, calls
+
+
+def open_then_cool_down(degraded, clock):
+    degraded.breaker.record_failure()
+    assert degraded.breaker.state == OPEN
+    clock.now += 11
+
+
+def test_allow_hands_out_one_probe_at_a_time(degraded, clock):
+    open_then_cool_down(degraded, clock)
+    assert degraded.breaker.allow() == HALF_OPEN
+    assert degraded.breaker.allow() is None
+    degraded.breaker.release_probe()
+    assert degraded.breaker.allow() == HALF_OPEN
+
+
+@pytest.mark.parametrize("propagate", [False, True])
+def test_read_fallback_probe_raising_value_error_is_released(degraded, clock, propagate):
+    app, calls = make_app(degraded, propagate)
+    open_then_cool_down(degraded, clock)
+    client = app.test_client()
+
+    if propagate:
+        with pytest.raises(ValueError):
+            client.get("/stale")
+    else:
+        assert client.get("/stale").status_code == 500
+    assert degraded.breaker.state == HALF_OPEN
+
+    response = client.get("/stale")
+    assert response.status_code == 200
+    assert calls["n"] == 2
+    assert degraded.breaker.state == CLOSED
+
+
+def test_plain_view_probe_raising_value_error_is_released(degraded, clock):
+    app, calls = make_app(degraded, propagate=True)
+    open_then_cool_down(degraded, clock)
+    client = app.test_client()
+
+    with pytest.raises(ValueError):
+        client.get("/plain")
+
+    assert client.get("/plain").status_code == 200
+    assert degraded.breaker.state == CLOSED
+
+
+def test_read_fallback_outage_reopens_the_breaker(degraded, clock):
+    app = Flask(__name__)
+    degraded.init_app(app)
+
+    def down():
+        raise ServerSelectionTimeoutError("no primary")
+
+    app.add_url_rule("/down", "down", degraded.read_fallback(down))
+    open_then_cool_down(degraded, clock)
+
+    assert app.test_client().get("/down").status_code == 503
+    assert degraded.breaker.state == OPEN
@@ -0,0 +1,48 @@
+"""
+Hourly rollups and raw points that arrive late.
+
+Run with pytest from api/ (no database needed).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from history import HISTORY_LATE_SECONDS, rollup_end
+from memory_storage import InMemoryResourceHistory
+
+HOUR_12 = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+HOUR_13 = HOUR_12 + timedelta(hours=1)
+
+
+def bucket_12(history):
+    points = history.hourly_points("P", "HWSet1", HOUR_12, HOUR_13, 10)
+    return points[0] if points else None
+
+
+def test_rollup_end_lags_the_hour_boundary():
+    assert rollup_end(HOUR_13 + timedelta(seconds=HISTORY_LATE_SECONDS - 1)) == HOUR_12
+    assert rollup_end(HOUR_13 + timedelta(seconds=HISTORY_LATE_SECONDS)) == HOUR_13
+
+
+def test_point_landing_within_the_lag_is_rolled_up():
+    history = InMemoryResourceHistory()
+    history.record("P", "HWSet1", 10, 5, HOUR_12 + timedelta(minutes=30))
+    history.downsample(HOUR_13 + timedelta(seconds=1))
+    assert bucket_12(history) is None
+
+    # Stamped before the hour ended, written just after it
+    history.record("P", "HWSet1", 8, 7, HOUR_13 - timedelta(milliseconds=5))
+    history.downsample(HOUR_13 + timedelta(seconds=HISTORY_LATE_SECONDS))
+    bucket = bucket_12(history)
+    assert (bucket["available"], bucket["availableMin"], bucket["samples"]) == (8, 8, 2)
+
+
+def test_point_landing_after_the_rollup_stays_raw_only():
+    history = InMemoryResourceHistory()
+    history.record("P", "HWSet1", 10, 5, HOUR_12 + timedelta(minutes=30))
+    history.downsample(HOUR_13 + timedelta(seconds=HISTORY_LATE_SECONDS))
+
+    history.record("P", "HWSet1", 8, 7, HOUR_13 - timedelta(milliseconds=5))
+    history.downsample(HOUR_13 + timedelta(minutes=10))
+
+    assert bucket_12(history)["samples"] == 1
+    assert len(history.raw_points("P", "HWSet1", HOUR_12, HOUR_13, 10)) == 2
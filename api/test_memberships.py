@@ -0,0 +1,66 @@
+"""
+The per-user project cache only changes once a membership write commits.
+
+Run with pytest from api/ (no database needed).
+"""
+
+from flask import Flask, g
+
+import idempotency
+from memberships import MembershipStore
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def insert_one(self, doc, session=None):
+        self.docs.append(dict(doc))
+
+    def update_one(self, query, update, session=None):
+        pass
+
+
+app = Flask(__name__)
+
+
+def make_store():
+    store = MembershipStore(FakeCollection(), FakeCollection())
+    store.user_projects.set("u1", (None, frozenset({"P0"})))
+    return store
+
+
+def cached(store):
+    return store.user_projects.get("u1")[1]
+
+
+def test_add_outside_a_transaction_updates_the_cache_now():
+    store = make_store()
+    with app.test_request_context():
+        store.add("P1", "u1")
+    assert cached(store) == {"P0", "P1"}
+
+
+def test_add_inside_a_transaction_waits_for_the_commit():
+    store = make_store()
+    with app.test_request_context():
+        g.db_session = session = object()
+        g.after_commit = []
+        store.add("P1", "u1", session=session)
+        assert cached(store) == {"P0"}
+
+        pending = g.after_commit
+        g.db_session = None
+        idempotency._run_after_commit(pending)
+    assert cached(store) == {"P0", "P1"}
+
+
+def test_aborted_transaction_leaves_the_cache_alone():
+    store = make_store()
+    with app.test_request_context():
+        g.db_session = session = object()
+        g.after_commit = []
+        store.add("P1", "u1", session=session)
+        # with_transaction retries start over with a fresh list
+        g.after_commit = []
+    assert cached(store) == {"P0"}
@@ -0,0 +1,50 @@
+"""
+Delta sync round trips on the in-memory backend, and the sync cursor
+surviving traffic capture.
+
+Run with pytest from api/ (no database needed).
+"""
+
+import os
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("ACCESS_LOG", "off")
+
+import pytest
+
+import app as appmod
+import sync
+from traffic_capture import REDACTED, sanitize
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No settle window: every committed write is below the next cursor
+    monkeypatch.setattr(appmod, "horizon", lambda: sync.seq_clock.now())
+    client = appmod.app.test_client()
+    client.post("/api/signup", json={"userId": "sync_owner", "password": "pw"})
+    client.post("/api/projects", json={"projectId": "SYNC1", "name": "one", "createdBy": "sync_owner"})
+    return client
+
+
+def test_full_then_delta_by_cursor(client):
+    first = client.get("/api/sync?userId=sync_owner").get_json()
+    assert first["full"]
+    assert [p["projectId"] for p in first["projects"]] == ["SYNC1"]
+
+    client.post("/api/projects/SYNC1/resources/HWSet1/checkout", json={"quantity": 2, "userId": "sync_owner"})
+    delta = client.get("/api/sync", query_string={"userId": "sync_owner", "cursor": first["cursor"]}).get_json()
+    assert not delta["full"]
+    assert [(r["projectId"], r["hwsetId"]) for r in delta["resources"]] == [("SYNC1", "HWSet1")]
+    assert delta["cursor"] != first["cursor"]
+
+
+def test_malformed_cursor(client):
+    response = client.get("/api/sync?userId=sync_owner&cursor=nonsense")
+    assert response.status_code == 400
+
+
+def test_capture_keeps_the_cursor():
+    cursor = sync.make_cursor(1792379523775503, 1)
+    assert sanitize({"userId": "u1", "cursor": cursor}) == {"userId": "u1", "cursor": cursor}
+    assert sanitize({"userId": "u1", "token": cursor})["token"] == REDACTED
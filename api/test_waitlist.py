@@ -0,0 +1,49 @@
+"""
+FIFO order of the checkout waitlist.
+
+Run with pytest from api/ (no database needed).
+"""
+
+import threading
+
+from waitlist import Waitlist
+
+
+def test_waiter_timing_out_behind_the_head_does_not_attempt():
+    waitlist = Waitlist(enabled=True, max_wait=5, recheck_ms=10)
+    key = ("P", "HWSet1")
+    head_attempting = threading.Event()
+    release_head = threading.Event()
+    attempts = []
+
+    def head_attempt():
+        attempts.append("head")
+        head_attempting.set()
+        # Never enough units until the test lets the head finish
+        return ("served", True) if release_head.is_set() else ("short", False)
+
+    head = threading.Thread(target=waitlist.wait_for, args=(key, head_attempt, 5, lambda: "refused"))
+    head.start()
+    assert head_attempting.wait(1)
+
+    def second_attempt():
+        attempts.append("second")
+        return "served second", True
+
+    result = waitlist.wait_for(key, second_attempt, 0.05, lambda: "refused")
+
+    assert result == "refused"
+    assert "second" not in attempts
+    assert waitlist.timed_out == 1
+
+    release_head.set()
+    waitlist.notify(key)
+    head.join(1)
+    assert waitlist.served == 1
+    assert waitlist.waiting() == 0
+
+
+def test_head_is_served_in_turn():
+    waitlist = Waitlist(enabled=True, max_wait=5, recheck_ms=10)
+    result = waitlist.wait_for(("P", "HWSet1"), lambda: ("ok", True), 1, lambda: "refused")
+    assert result == "ok"
@@ -0,0 +1,143 @@
+"""
+Opt-in capture of real API traffic for replay benchmarks (replay_traffic.py).
+
+With TRAFFIC_CAPTURE_FILE set, every /api/ request (or a
+TRAFFIC_CAPTURE_SAMPLE_RATE share of them) is appended to that file as one
+JSON object per line:
+
+    {"t": 1760000000.123, "method": "POST", "route": "/api/projects/<project_id>/join",
+     "path": "/api/projects/p1/join", "query": {}, "body": {"userId": "u1"},
+     "status": 200, "ms": 3.1}
+
+`t` is the arrival time (epoch seconds) and `ms` the server-side latency.
+Values under sensitive keys (password, token, secret, authorization, ...)
+are replaced with "<redacted>" at any depth; bodies larger than
+TRAFFIC_CAPTURE_MAX_BODY_BYTES are kept as their shape only (`bodyShape`:
+the same structure with values replaced by type names) and are not
+replayed. Headers are not recorded.
+
+Lines go through the same bounded, non-blocking queue as the JSON logs
+(request_log.BackgroundWriter), so a slow disk drops traces instead of
+slowing requests; drops show up as {"droppedTraces": n} lines. With gunicorn
+every worker appends to the same file; lines are written whole.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+
+from flask import g, request
+
+from request_log import LOG_QUEUE_SIZE, BackgroundWriter
+
+TRAFFIC_CAPTURE_FILE = os.getenv("TRAFFIC_CAPTURE_FILE", "")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1"))
+TRAFFIC_CAPTURE_MAX_BODY_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BODY_BYTES", "65536"))
+
+REDACTED = "<redacted>"
+SENSITIVE_KEYS = ("password", "token", "secret", "authorization", "apikey", "api_key", "cookie")
+
+capture_log = logging.getLogger("softwarelab.capture")
+
+
+def is_sensitive(key):
+    key = key.lower()
+    return any(word in key for word in SENSITIVE_KEYS)
+
+
+def sanitize(value):
+    """Copy of a JSON value with sensitive fields redacted."""
+    if isinstance(value, dict):
+        return {k: REDACTED if is_sensitive(k) else sanitize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    return value
+
+
+def shape(value):
+    """The structure of a JSON value with leaves replaced by type names (lists by their first item)."""
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shape(value[0]), len(value)] if value else []
+    return type(value).__name__
+
+
+class _TraceFormatter(logging.Formatter):
+    def format(self, record):
+        trace = getattr(record, "trace", None)
+        if trace is None:
+            # BackgroundWriter's drop notice
+            trace = {"droppedTraces": getattr(record, "dropped", 0)}
+        return json.dumps(trace, default=str, separators=(",", ":"))
+
+
+class TrafficCapture:
+    def __init__(self, path=TRAFFIC_CAPTURE_FILE, sample_rate=TRAFFIC_CAPTURE_SAMPLE_RATE,
+                 max_body_bytes=TRAFFIC_CAPTURE_MAX_BODY_BYTES, queue_size=LOG_QUEUE_SIZE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.enabled = bool(path) and sample_rate > 0
+        self.writer = None
+        if self.enabled:
+            output = logging.FileHandler(path, encoding="utf-8", delay=True)
+            output.setFormatter(_TraceFormatter())
+            self.writer = BackgroundWriter(output, queue_size)
+            capture_log.setLevel(logging.INFO)
+            capture_log.addHandler(self.writer.handler)
+            capture_log.propagate = False
+
+    @property
+    def dropped(self):
+        return self.writer.dropped if self.writer else 0
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self._before)
+        app.after_request(self._after)
+        self.start()
+
+    def start(self):
+        """Start the writer thread; call again in a forked worker."""
+        if self.writer:
+            self.writer.start()
+
+    def stop(self):
+        if self.writer:
+            self.writer.stop()
+
+    # ---------- request hooks ----------
+
+    def _before(self):
+        if not request.path.startswith("/api/") or request.method == "OPTIONS":
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        g.capture_t = time.time()
+        g.capture_started = time.perf_counter()
+
+    def _after(self, response):
+        started = g.pop("capture_started", None)
+        if started is None:
+            return response
+        trace = {
+            "t": round(g.capture_t, 6),
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "query": sanitize(request.args.to_dict()),
+        }
+        if request.content_length:
+            body = request.get_json(silent=True)
+            if request.content_length > self.max_body_bytes:
+                trace["bodyShape"] = shape(body)
+            else:
+                trace["body"] = sanitize(body)
+        trace["status"] = response.status_code
+        trace["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        capture_log.info("trace", extra={"trace": trace})
+        return response
@@ -0,0 +1,61 @@
+"""
+Optimistic concurrency for project and resource mutations.
+
+Projects and Resources carry an integer `version` that every write bumps.
+A mutation reads the document, makes its checks, and writes with the
+version it read in the filter; if another writer got there first the
+filter matches nothing and the handler re-reads and tries again, up to
+OPTIMISTIC_RETRIES times (then 409). No locks are held between the read
+and the write.
+
+Clients can pin a mutation to the version they last saw by sending
+`If-Match: "<version>"` (the ETag returned by GET /api/projects/<id>, or a
+resource's `version`). A mismatch is answered with 412 and no retry.
+Documents written before versions existed count as version 0.
+"""
+
+import os
+
+from flask import request
+
+OPTIMISTIC_RETRIES = int(os.getenv("OPTIMISTIC_RETRIES", "3"))
+
+
+class PreconditionFailed(Exception):
+    """If-Match named a version other than the current one (answered with 412)."""
+
+    def __init__(self, current_version=None):
+        super().__init__("version mismatch")
+        self.current_version = current_version
+
+
+def expected_version():
+    """Version from the If-Match header, or None when it is absent or `*`."""
+    header = request.headers.get("If-Match", "").strip()
+    if not header or header == "*":
+        return None
+    tag = header.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        # Not one of our ETags, so it can't match
+        raise PreconditionFailed()
+
+
+def attempts(expected):
+    """Attempts for a read-check-write loop; If-Match requests get exactly one."""
+    return range(1 if expected is not None else OPTIMISTIC_RETRIES + 1)
+
+
+def check_version(doc, expected):
+    """Version of `doc`, raising PreconditionFailed if it isn't the If-Match version."""
+    version = doc.get("version", 0)
+    if expected is not None and version != expected:
+        raise PreconditionFailed(version)
+    return version
+
+
+def etag(version):
+    return f'"{version}"'
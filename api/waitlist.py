@@ -0,0 +1,127 @@
+"""
+Waitlist for exhausted hardware sets.
+
+A checkout that sends `"wait": <seconds>` is not refused straight away when
+there aren't enough units: the request joins a FIFO queue for its
+(projectId, hwsetId) and stays parked (long poll) until it can be served or
+the time is up. Only the head of the queue tries the checkout; the others
+sleep until they move up, so units freed by a checkin go to the oldest
+waiter and a burst of waiters costs one read per attempt, not one per
+waiter.
+
+The head is woken right away by a checkin in the same process and
+otherwise re-checks every WAITLIST_RECHECK_MS, which picks up checkins
+handled by other workers. When the head is served (or gives up) the next
+waiter tries immediately, since units may be left over.
+
+The queue is per process and a parked request holds a server thread, so at
+most WAITLIST_MAX_WAITERS requests wait per process; beyond that a
+checkout is answered at once as if it had not asked to wait. Waits are
+capped at WAITLIST_MAX_WAIT_SECONDS. WAITLIST=off ignores `wait`.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+WAITLIST = os.getenv("WAITLIST", "on").lower() in ("1", "on", "true", "yes")
+WAITLIST_MAX_WAIT_SECONDS = float(os.getenv("WAITLIST_MAX_WAIT_SECONDS", "25"))
+WAITLIST_RECHECK_MS = float(os.getenv("WAITLIST_RECHECK_MS", "1000"))
+WAITLIST_MAX_WAITERS = int(os.getenv("WAITLIST_MAX_WAITERS", "64"))
+
+
+class _Waiter:
+    __slots__ = ("head", "turn")
+
+    def __init__(self):
+        self.head = False
+        self.turn = threading.Event()  # set when promoted to head or when woken by a checkin
+
+
+class Waitlist:
+    def __init__(self, enabled=WAITLIST, max_wait=WAITLIST_MAX_WAIT_SECONDS,
+                 recheck_ms=WAITLIST_RECHECK_MS, max_waiters=WAITLIST_MAX_WAITERS):
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self.recheck = recheck_ms / 1000.0
+        self.max_waiters = max_waiters
+        self._queues = {}  # (projectId, hwsetId) -> deque of _Waiter, head first
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self.served = 0
+        self.timed_out = 0
+
+    def waiting(self, key=None):
+        """Number of parked requests, for one hardware set or in total."""
+        with self._lock:
+            if key is None:
+                return self._waiting
+            return len(self._queues.get(key, ()))
+
+    def wait_for(self, key, attempt, timeout, refuse):
+        """Call attempt() in FIFO turn until it reports done or `timeout` seconds pass.
+
+        attempt() returns (result, done); done=False means "not enough units
+        yet". Returns the last result, or refuse() if the time ran out before
+        this request's turn: it must not take units from the waiters ahead.
+        """
+        deadline = time.monotonic() + min(timeout, self.max_wait)
+        waiter = self._join(key)
+        if waiter is None:
+            return attempt()[0]  # waitlist full: answer right away
+
+        result, done = None, False
+        try:
+            while True:
+                if waiter.head:
+                    waiter.turn.clear()
+                    result, done = attempt()
+                    if done:
+                        return result
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waiter.turn.wait(min(remaining, self.recheck) if waiter.head else remaining)
+            if result is None:
+                # Timed out before reaching the head
+                return refuse()
+            return result
+        finally:
+            self._leave(key, waiter, done)
+
+    def notify(self, key):
+        """Units were freed for `key`: wake the head waiter."""
+        with self._lock:
+            q = self._queues.get(key)
+            if q:
+                q[0].turn.set()
+
+    def _join(self, key):
+        with self._lock:
+            if self._waiting >= self.max_waiters:
+                return None
+            waiter = _Waiter()
+            q = self._queues.setdefault(key, deque())
+            q.append(waiter)
+            self._waiting += 1
+            if len(q) == 1:
+                waiter.head = True
+                waiter.turn.set()
+            return waiter
+
+    def _leave(self, key, waiter, served):
+        with self._lock:
+            q = self._queues[key]
+            q.remove(waiter)
+            self._waiting -= 1
+            if served:
+                self.served += 1
+            else:
+                self.timed_out += 1
+            if not q:
+                del self._queues[key]
+            elif waiter.head:
+                # Next in line tries now; there may be units left over
+                q[0].head = True
+                q[0].turn.set()
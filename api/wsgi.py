@@ -0,0 +1,52 @@
+"""
+Production WSGI entry point.
+
+Linux/macOS (gunicorn, settings in gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Any platform, including Windows (waitress):
+    python wsgi.py
+
+`python app.py` remains the single-process debug server for development.
+"""
+
+import os
+import signal
+
+from app import app  # the WSGI callable
+
+
+def serve_waitress():
+    from waitress import create_server
+
+    import app as app_module
+
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "5000"))
+    # waitress is a single process; size its thread pool like gunicorn's gthread workers
+    threads = int(os.getenv("WAITRESS_THREADS", str(min(32, (os.cpu_count() or 1) * 4))))
+
+    server = create_server(
+        app,
+        host=host,
+        port=port,
+        threads=threads,
+        channel_timeout=int(os.getenv("KEEPALIVE_TIMEOUT", "75")),
+        connection_limit=int(os.getenv("WAITRESS_CONNECTION_LIMIT", "1000")),
+        ident="softwarelab",
+    )
+
+    def shutdown(signum, frame):
+        # waitress drains in-flight requests when its loop sees SystemExit
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"Serving on http://{host}:{port} with {threads} threads (waitress)")
+    try:
+        server.run()
+    finally:
+        app_module.storage.close()
+
+
+if __name__ == "__main__":
+    serve_waitress()
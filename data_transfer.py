@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Dataset Export / Import
+Streams whole collections to and from NDJSON files (one MongoDB Extended
+JSON document per line, optionally gzip-compressed) for backups and for
+cloning an environment.
+
+Export reads each collection with a large cursor batch_size and writes
+lines as they arrive; import reads lines and writes them with unordered
+bulk_write upserts (ReplaceOne by _id) in chunks. Memory use is constant
+in both directions. Collections are handled in parallel, one worker each.
+
+Re-importing the same files is safe: documents are replaced by _id.
+Collections are exported one after another in time, not as one snapshot;
+stop writers (or accept small skew) when cloning a live database.
+
+Usage:
+    python data_transfer.py export backup/ --gzip
+    python data_transfer.py export backup/ --collections Users Projects --batch-size 10000
+    python data_transfer.py import backup/ --chunk-size 2000
+    python data_transfer.py import backup/ --drop          # replace the target collections
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from bson import json_util
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from migrate_database import Progress
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_COLLECTIONS = ("Users", "Projects", "Resources", "Memberships", "HardwareCatalog")
+MANIFEST = "manifest.json"
+
+# Relaxed Extended JSON keeps ObjectIds and dates round-trippable while
+# leaving plain numbers readable
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+def data_file(directory, name, compressed):
+    return os.path.join(directory, f"{name}.ndjson" + (".gz" if compressed else ""))
+
+
+def open_text(path, mode, level=6):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=level)
+    return open(path, mode, encoding="utf-8", buffering=1 << 20)
+
+
+# ---------- EXPORT ----------
+
+def export_collection(db, name, directory, compressed, batch_size, level):
+    col = db.get_collection(name)
+    path = data_file(directory, name, compressed)
+    progress = Progress(f"export {name}", col.estimated_document_count())
+    count = 0
+    with open_text(path, "w", level) as out:
+        # _id order keeps exports of an unchanged collection byte-identical
+        for doc in col.find({}).sort("_id", 1).batch_size(batch_size):
+            out.write(json_util.dumps(doc, json_options=JSON_OPTIONS))
+            out.write("\n")
+            count += 1
+            if count % batch_size == 0:
+                progress.add(batch_size, 0)
+    progress.done = count
+    progress.report(final=True)
+    return name, {"file": os.path.basename(path), "documents": count}
+
+
+def export_dataset(db, directory, collections, compressed, batch_size, workers, level):
+    os.makedirs(directory, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(collections)))) as pool:
+        futures = [pool.submit(export_collection, db, name, directory, compressed, batch_size, level)
+                   for name in collections]
+        files = dict(f.result() for f in futures)
+    manifest = {
+        "exportedAt": datetime.now(timezone.utc).isoformat(),
+        "database": db.name,
+        "collections": files,
+    }
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ---------- IMPORT ----------
+
+def import_collection(db, name, path, chunk_size, total, drop):
+    col = db.get_collection(name)
+    if drop:
+        col.delete_many({})  # keeps the collection's indexes, unlike drop()
+    progress = Progress(f"import {name}", total)
+    upserted = matched = failed = 0
+
+    def flush(ops):
+        nonlocal upserted, matched, failed
+        try:
+            result = col.bulk_write(ops, ordered=False)
+            counts = (result.upserted_count, result.matched_count, 0)
+        except BulkWriteError as e:
+            # The rest of the chunk was still written (unordered)
+            counts = (e.details.get("nUpserted", 0), e.details.get("nMatched", 0), len(e.details.get("writeErrors", [])))
+        upserted += counts[0]
+        matched += counts[1]
+        failed += counts[2]
+        progress.add(len(ops), counts[0] + counts[1])
+
+    ops = []
+    with open_text(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json_util.loads(line, json_options=JSON_OPTIONS)
+            ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            if len(ops) >= chunk_size:
+                flush(ops)
+                ops = []
+    if ops:
+        flush(ops)
+    progress.report(final=True)
+    if failed:
+        print(f"  ⚠️  {name}: {failed} documents rejected (e.g. duplicate keys under another _id)")
+    return {"upserted": upserted, "replaced": matched, "failed": failed}
+
+
+def import_dataset(db, directory, collections, chunk_size, workers, drop):
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            files = json.load(f)["collections"]
+    else:
+        # No manifest (e.g. hand-made files): look for <Collection>.ndjson[.gz]
+        files = {}
+        for name in DEFAULT_COLLECTIONS:
+            for compressed in (True, False):
+                if os.path.exists(data_file(directory, name, compressed)):
+                    files[name] = {"file": os.path.basename(data_file(directory, name, compressed))}
+                    break
+    if collections:
+        files = {name: entry for name, entry in files.items() if name in collections}
+    if not files:
+        raise RuntimeError(f"No collection files found in {directory}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files)))) as pool:
+        futures = {
+            name: pool.submit(import_collection, db, name, os.path.join(directory, entry["file"]),
+                              chunk_size, entry.get("documents", 0), drop)
+            for name, entry in files.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("directory", help="folder holding the NDJSON files and manifest.json")
+    parser.add_argument("--collections", nargs="+", help=f"default: {' '.join(DEFAULT_COLLECTIONS)}")
+    parser.add_argument("--gzip", action="store_true", help="export: compress the files")
+    parser.add_argument("--level", type=int, default=3, help="export: gzip level (1 fastest - 9 smallest)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="export: cursor batch size")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="import: documents per bulk_write")
+    parser.add_argument("--workers", type=int, default=4, help="collections processed in parallel")
+    parser.add_argument("--drop", action="store_true", help="import: empty each target collection first")
+    args = parser.parse_args()
+
+    MONGODB_URI = os.getenv("MONGODB_URI")
+    if not MONGODB_URI:
+        print("❌ MONGODB_URI not found in environment variables")
+        return 1
+
+    try:
+        print("🔗 Connecting to MongoDB...")
+        # One pooled connection per worker
+        client = MongoClient(MONGODB_URI, maxPoolSize=max(args.workers, 1) + 2)
+        db = client["softwarelabdb"]
+        client.admin.command('ping')
+        print("✅ Successfully connected to MongoDB!")
+
+        start = time.monotonic()
+        if args.command == "export":
+            manifest = export_dataset(db, args.directory, args.collections or DEFAULT_COLLECTIONS,
+                                      args.gzip, args.batch_size, args.workers, args.level)
+            total = sum(entry["documents"] for entry in manifest["collections"].values())
+            print(f"\n🎯 Exported {total} documents to {args.directory} in {time.monotonic() - start:.1f}s")
+        else:
+            if args.drop:
+                print("⚠️  --drop: target collections are emptied before loading")
+            results = import_dataset(db, args.directory, args.collections, args.chunk_size,
+                                     args.workers, args.drop)
+            loaded = sum(r["upserted"] + r["replaced"] for r in results.values())
+            failed = sum(r["failed"] for r in results.values())
+            print(f"\n🎯 Imported {loaded} documents from {args.directory} in "
+                  f"{time.monotonic() - start:.1f}s" + (f", {failed} rejected" if failed else ""))
+            if failed:
+                return 1
+        return 0
+
+    except Exception as e:
+        print(f"❌ {args.command.capitalize()} failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -90,35 +90,41 @@ const DashboardPage: React.FC = () => {
       return
     }
     try {
-      // First, attempt to join the project (works for public projects; will be rejected for private)
-      const joinRes = await fetch(`${API_BASE}/api/projects/${encodeURIComponent(lookupId)}/join`, {
+      // Join (works for public projects; rejected for private ones unless already a member),
+      // then fetch project details for name/description - one round trip via /api/batch
+      const batchRes = await fetch(`${API_BASE}/api/batch`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ userId })
+        body: JSON.stringify({
+          stopOnError: true,
+          operations: [
+            { method: 'POST', path: `/api/projects/${encodeURIComponent(lookupId)}/join`, body: { userId } },
+            { method: 'GET', path: `/api/projects/${encodeURIComponent(lookupId)}?userId=${encodeURIComponent(userId)}` }
+          ]
+        })
       })
+      if (!batchRes.ok) {
+        throw new Error('Failed to join project')
+      }
+      const [joinResult, detailsResult] = (await batchRes.json()).results
 
-      if (joinRes.status === 404) {
+      if (joinResult.status === 404) {
         setError('Project not found')
         return
       }
-      if (joinRes.status === 403) {
-        const body = await joinRes.json().catch(() => ({}))
-        setError(body.error || 'Access denied - cannot join this project')
+      if (joinResult.status === 403) {
+        setError(joinResult.body?.error || 'Access denied - cannot join this project')
         return
       }
 
-      if (!joinRes.ok) {
-        const body = await joinRes.json().catch(() => ({}))
-        throw new Error(body.error || 'Failed to join project')
+      if (joinResult.status >= 400) {
+        throw new Error(joinResult.body?.error || 'Failed to join project')
       }
 
-      // After joining (or if already a member), fetch project details to get name/description
-      const detailsRes = await fetch(`${API_BASE}/api/projects/${encodeURIComponent(lookupId)}?userId=${encodeURIComponent(userId)}`)
-      if (!detailsRes.ok) {
-        const body = await detailsRes.json().catch(() => ({}))
-        throw new Error(body.error || 'Failed to load project after joining')
+      if (detailsResult.status !== 200) {
+        throw new Error(detailsResult.body?.error || 'Failed to load project after joining')
       }
-      const data = await detailsRes.json()
+      const data = detailsResult.body
       navigate(`/project/${lookupId}`, { state: { name: data.name, description: data.description, isPublic: data.isPublic } })
     } catch (err: any) {
       console.error(err)
@@ -25,6 +25,9 @@ const ProjectPage: React.FC = () => {
   const [actionLoading, setActionLoading] = useState<{[key: string]: boolean}>({})
   const [actionMessage, setActionMessage] = useState<string>('')
   const [members, setMembers] = useState<string[]>([])
+  const [memberCount, setMemberCount] = useState<number | null>(null)
+  const [membersCursor, setMembersCursor] = useState<string | null>(null)
+  const [membersLoading, setMembersLoading] = useState(false)
   const [inviteUser, setInviteUser] = useState('')
   const [inviteMessage, setInviteMessage] = useState('')
 
@@ -97,27 +100,38 @@ const ProjectPage: React.FC = () => {
     setActionMessage('')
     
     try {
-      const res = await fetch(`${API_BASE}/api/projects/${projectId}/resources/${hwsetId}/${action}`, {
+      // Checkout/checkin and the resource refresh in one round trip
+      const res = await fetch(`${API_BASE}/api/batch`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ quantity, userId })
+        body: JSON.stringify({
+          stopOnError: true,
+          operations: [
+            {
+              method: 'POST',
+              path: `/api/projects/${encodeURIComponent(projectId!)}/resources/${encodeURIComponent(hwsetId)}/${action}`,
+              body: { quantity, userId }
+            },
+            { method: 'GET', path: `/api/projects/${encodeURIComponent(projectId!)}/resources?userId=${encodeURIComponent(userId)}` }
+          ]
+        })
       })
-      
-      const data = await res.json()
       if (!res.ok) {
-        setActionMessage(data.error || `${action} failed`)
+        setActionMessage(`${action} failed`)
         return
       }
       
-      setActionMessage(data.message)
-      // Refresh resources to show updated quantities
-      setResLoading(true)
-      const refreshRes = await fetch(`${API_BASE}/api/projects/${encodeURIComponent(projectId!)}/resources?userId=${encodeURIComponent(userId)}`)
-      if (refreshRes.ok) {
-        const refreshData = await refreshRes.json()
-        setResources(refreshData)
+      const [actionResult, refreshResult] = (await res.json()).results
+      if (actionResult.status !== 200) {
+        setActionMessage(actionResult.body?.error || `${action} failed`)
+        return
+      }
+      
+      setActionMessage(actionResult.body.message)
+      // Updated quantities came back with the same batch
+      if (refreshResult.status === 200) {
+        setResources(refreshResult.body)
       }
-      setResLoading(false)
       
       // Clear the quantity input
       setQuantities(prev => ({...prev, [hwsetId]: 1}))
@@ -149,19 +163,28 @@ const ProjectPage: React.FC = () => {
     }
   }
 
-  const fetchMembers = async () => {
+  // Members come a page at a time; pass the previous page's nextCursor to append the next one
+  const fetchMembers = async (after?: string) => {
     if (!projectId) return
     const userId = localStorage.getItem('userId')
     if (!userId) return
     
+    setMembersLoading(true)
     try {
-      const res = await fetch(`${API_BASE}/api/projects/${encodeURIComponent(projectId)}/members?userId=${encodeURIComponent(userId)}`)
+      let url = `${API_BASE}/api/projects/${encodeURIComponent(projectId)}/members?userId=${encodeURIComponent(userId)}`
+      if (after) url += `&after=${encodeURIComponent(after)}`
+      const res = await fetch(url)
       if (res.ok) {
         const data = await res.json()
-        setMembers(data.members || [])
+        const page: string[] = data.members || []
+        setMembers(prev => after ? [...prev, ...page] : page)
+        setMemberCount(typeof data.memberCount === 'number' ? data.memberCount : null)
+        setMembersCursor(data.nextCursor ?? null)
       }
     } catch (err) {
       console.error('Failed to fetch members:', err)
+    } finally {
+      setMembersLoading(false)
     }
   }
 
@@ -186,6 +209,7 @@ const ProjectPage: React.FC = () => {
       if (res.ok) {
         // remove from local state
         setMembers(prev => prev.filter(m => m !== memberId))
+        setMemberCount(prev => prev === null ? prev : prev - 1)
       } else {
         alert(data.error || 'Failed to remove member')
       }
@@ -424,7 +448,7 @@ const ProjectPage: React.FC = () => {
       <section className="card">
         <h2>Project Members</h2>
         <div style={{marginBottom: '16px'}}>
-          <h4>Current Members ({members.length})</h4>
+          <h4>Current Members ({memberCount ?? members.length})</h4>
           <div style={{display: 'flex', flexWrap: 'wrap', gap: '8px', marginBottom: '16px'}}>
             {members.map(member => (
               <div key={member} className="member-chip">
@@ -466,6 +490,16 @@ const ProjectPage: React.FC = () => {
             ))}
             {members.length === 0 && <span style={{color: 'var(--muted)'}}>No members found</span>}
           </div>
+          {membersCursor && (
+            <button
+              className="secondary"
+              onClick={() => fetchMembers(membersCursor)}
+              disabled={membersLoading}
+              style={{marginBottom: '16px'}}
+            >
+              {membersLoading ? 'Loading...' : `Load more (${members.length} of ${memberCount ?? '?'})`}
+            </button>
+          )}
         </div>
         
         <div>
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generator for Performance Tests
+Produces production-shaped Users, Projects, Memberships and Resources at scale:
+- users with sequential ids
+- projects with a heavy-tailed (Pareto) member count: most teams have a
+  handful of members, a few public course projects have thousands
+- several HWSets per project with consistent counters; their names live
+  once in HardwareCatalog, Resources hold only the counters
+
+Output is deterministic for a given --seed: every chunk gets its own RNG
+derived from (seed, collection, chunk number), so the data does not depend
+on how chunks are spread across workers. Chunks are streamed into MongoDB
+with unordered insert_many from parallel worker processes.
+
+Usage:
+    python generate_test_data.py --users 1000000 --projects 200000 --workers 8
+    python generate_test_data.py --users 5000 --projects 1000 --drop   # start from empty collections
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+HW_CATALOG = [
+    ("Arduino Uno Kit", "Arduino kits"),
+    ("Raspberry Pi Kit", "Raspberry Pi kits"),
+    ("ESP32 Dev Board", "ESP32 boards"),
+    ("Sensor Pack", "Assorted sensors"),
+    ("Logic Analyzer", "8-channel logic analyzers"),
+    ("Motor Driver Kit", "Motor driver boards"),
+]
+
+WORDS = [
+    "smart", "solar", "robot", "weather", "garden", "tracker", "sensor", "drone",
+    "home", "lab", "network", "camera", "audio", "light", "health", "traffic",
+]
+
+
+def user_id(n):
+    return f"user_{n:07d}"
+
+
+def project_id(n):
+    return f"P-{n:07d}"
+
+
+def chunk_rng(seed, kind, chunk):
+    # String seeds are hashed deterministically (unlike hash() of a tuple)
+    return random.Random(f"{seed}:{kind}:{chunk}")
+
+
+def member_count(rng, max_members, alpha):
+    """Heavy-tailed team size: typically 1-6, occasionally very large."""
+    # paretovariate() >= 1, so P(size >= k) = k ** -alpha: with alpha 1.3 about
+    # 59% of teams are one person and 92% have at most six
+    return max(1, min(max_members, int(rng.paretovariate(alpha))))
+
+
+def make_users(seed, chunk, start, stop):
+    rng = chunk_rng(seed, "users", chunk)
+    return [
+        {"userId": user_id(n), "password": f"pw{rng.randrange(10**6):06d}"}
+        for n in range(start, stop)
+    ]
+
+
+def make_projects(seed, chunk, start, stop, num_users, opts):
+    rng = chunk_rng(seed, "projects", chunk)
+    projects, memberships, resources = [], [], []
+    for n in range(start, stop):
+        pid = project_id(n)
+        size = member_count(rng, min(opts["max_members"], num_users), opts["alpha"])
+        members = [user_id(u) for u in rng.sample(range(num_users), size)]
+        # Large projects are course-wide and usually public
+        is_public = size >= 50 or rng.random() < opts["public_ratio"]
+        projects.append({
+            "projectId": pid,
+            "name": " ".join(rng.choice(WORDS).capitalize() for _ in range(3)),
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))),
+            "createdAt": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+            "createdBy": members[0],
+            "memberCount": len(members),
+            "isPublic": is_public,
+            "version": 1,
+        })
+        memberships.extend(
+            {"projectId": pid, "userId": uid, "role": "owner" if i == 0 else "member"}
+            for i, uid in enumerate(members)
+        )
+
+        hwsets = rng.randint(opts["min_hwsets"], opts["max_hwsets"])
+        for h in range(hwsets):
+            total = rng.randint(5, 50)
+            allocated = rng.randint(0, total)
+            resources.append({
+                "projectId": pid,
+                "hwsetId": f"HWSet{h + 1}",
+                "total": total,
+                "allocatedToProject": allocated,
+                "available": total - allocated,
+                "version": 1,
+            })
+    return projects, memberships, resources
+
+
+# ---------- WORKERS ----------
+
+_db = None
+
+
+def _init_worker(uri):
+    # Each process needs its own client (MongoClient is not fork-safe)
+    global _db
+    _db = MongoClient(uri)["softwarelabdb"]
+
+
+def _insert(collection, docs):
+    if not docs:
+        return 0
+    try:
+        return len(_db[collection].insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicates from a previous partial run are skipped
+        return e.details.get("nInserted", 0)
+
+
+def users_task(seed, chunk, start, stop):
+    return "Users", stop - start, _insert("Users", make_users(seed, chunk, start, stop))
+
+
+def projects_task(seed, chunk, start, stop, num_users, opts):
+    projects, memberships, resources = make_projects(seed, chunk, start, stop, num_users, opts)
+    inserted = _insert("Projects", projects)
+    _insert("Memberships", memberships)
+    _insert("Resources", resources)
+    return "Projects", stop - start, inserted
+
+
+def write_catalog(db, hwsets):
+    """Catalog entries for HWSet1..hwsets; bumps the version the API caches by."""
+    for h in range(hwsets):
+        name, notes = HW_CATALOG[h % len(HW_CATALOG)]
+        db.HardwareCatalog.update_one(
+            {"hwsetId": f"HWSet{h + 1}"}, {"$set": {"name": name, "notes": notes}}, upsert=True
+        )
+    db.HardwareCatalog.update_one({"_id": "version"}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def chunks(total, size):
+    for i, start in enumerate(range(0, total, size)):
+        yield i, start, min(start + size, total)
+
+
+def run(tasks, label, total):
+    start = time.monotonic()
+    done = inserted = 0
+    last = 0.0
+    for future in as_completed(tasks):
+        _, count, added = future.result()
+        done += count
+        inserted += added
+        now = time.monotonic()
+        if now - last >= 2 or done == total:
+            last = now
+            rate = done / max(now - start, 1e-6)
+            eta = (total - done) / rate if rate else 0
+            print(f"  ⏳ {label}: {done}/{total} ({rate:,.0f}/s, ETA {eta:.0f}s)")
+    elapsed = time.monotonic() - start
+    print(f"  ✅ {label}: {inserted} inserted in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="documents per insert_many")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--min-hwsets", type=int, default=2)
+    parser.add_argument("--max-hwsets", type=int, default=4)
+    parser.add_argument("--max-members", type=int, default=5000)
+    parser.add_argument("--alpha", type=float, default=1.3, help="Pareto shape for member counts (lower = more skew)")
+    parser.add_argument("--public-ratio", type=float, default=0.2)
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections first")
+    args = parser.parse_args()
+
+    MONGODB_URI = os.getenv("MONGODB_URI")
+    if not MONGODB_URI:
+        print("❌ MONGODB_URI not found in environment variables")
+        return 1
+
+    opts = {
+        "min_hwsets": args.min_hwsets,
+        "max_hwsets": max(args.min_hwsets, args.max_hwsets),
+        "max_members": args.max_members,
+        "alpha": args.alpha,
+        "public_ratio": args.public_ratio,
+    }
+
+    print("🔗 Connecting to MongoDB...")
+    client = MongoClient(MONGODB_URI)
+    db = client["softwarelabdb"]
+    client.admin.command('ping')
+    print("✅ Successfully connected to MongoDB!")
+
+    if args.drop:
+        for name in ("Users", "Projects", "Memberships", "Resources", "HardwareCatalog"):
+            db.drop_collection(name)
+        print("🗑️  Dropped Users, Projects, Memberships, Resources and HardwareCatalog")
+
+    # Unique indexes the API relies on (created up front so inserts skip duplicates)
+    db.Users.create_index("userId", unique=True)
+    db.Projects.create_index("projectId", unique=True)
+    db.Resources.create_index([("projectId", 1), ("hwsetId", 1)], unique=True)
+    db.Memberships.create_index([("projectId", 1), ("userId", 1)], unique=True)
+    db.HardwareCatalog.create_index("hwsetId", unique=True, sparse=True)
+    write_catalog(db, opts["max_hwsets"])
+    client.close()
+
+    print(f"\n🎲 Generating {args.users} users and {args.projects} projects "
+          f"(seed {args.seed}, {args.workers} workers)")
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(MONGODB_URI,)) as pool:
+        run([pool.submit(users_task, args.seed, i, a, b)
+                   for i, a, b in chunks(args.users, args.chunk_size)],
+            "Users", args.users)
+        # Each project chunk also writes its memberships and resources
+        project_chunk = max(1, args.chunk_size // 5)
+        run([pool.submit(projects_task, args.seed, i, a, b, args.users, opts)
+                   for i, a, b in chunks(args.projects, project_chunk)],
+            "Projects", args.projects)
+
+    print(f"\n🎯 Done. Run migrate_database.py to build the remaining indexes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
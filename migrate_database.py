@@ -1,229 +1,550 @@
 #!/usr/bin/env python3
 """
-Database Migration Script for Authorization System
-This script updates the existing MongoDB data to support the new authorization features
+Database Migration Runner
+Applies versioned migrations to the MongoDB data. Document migrations stream
+each collection in _id order and push changes through batched bulk_write,
+checkpointing after every batch so an interrupted run resumes where it stopped.
+
+Usage:
+    python migrate_database.py                 # apply all pending migrations
+    python migrate_database.py --dry-run       # report what would change, write nothing
+    python migrate_database.py --status        # show applied/pending migrations
+    python migrate_database.py --batch-size 2000 --workers 4
+    python migrate_database.py --target 2      # stop after migration 2
+    python migrate_database.py --reset 1       # forget migration 1 so it runs again
 """
 
+import argparse
 import os
-from pymongo import MongoClient
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
-from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
+MIGRATIONS_COLLECTION = "SchemaMigrations"
+
+
+# ---------- FRAMEWORK ----------
+
+class MigrationContext:
+    """State shared by the migrations of one run."""
+
+    def __init__(self, db, dry_run=False, batch_size=1000, workers=1):
+        self.db = db
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.workers = workers
+        self.state_col = db.get_collection(MIGRATIONS_COLLECTION)
+        self.cache = {}
+
+
+class Progress:
+    """Throughput / ETA reporting for long-running migrations."""
+
+    def __init__(self, label, total, interval=2.0):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.modified = 0
+        self.start = time.monotonic()
+        self.last_report = 0.0
+
+    def add(self, processed, modified):
+        self.done += processed
+        self.modified += modified
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = self.done / elapsed
+        if final:
+            print(f"  ✅ {self.label}: {self.done} scanned, {self.modified} changed "
+                  f"in {elapsed:.1f}s ({rate:,.0f} docs/s)")
+            return
+        remaining = max(self.total - self.done, 0)
+        eta = remaining / rate if rate > 0 else float("inf")
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        print(f"  ⏳ {self.label}: {self.done}/{self.total} ({pct:.1f}%) "
+              f"{rate:,.0f} docs/s, ETA {eta:.0f}s")
+
+
+class Migration:
+    """A versioned migration step. Subclasses implement apply(ctx, state)."""
+
+    version = None
+    name = ""
+
+    def apply(self, ctx, state):
+        raise NotImplementedError
+
+
+class DocumentMigration(Migration):
+    """Rewrites the documents of one collection matching `query`.
+
+    transform(doc, ctx) returns an update document (e.g. {"$set": {...}}) or
+    None when the document needs no change. side_writes(doc, ctx) may return
+    (collection, operation) pairs for other collections; they are written
+    before the batch's own updates so a resumed batch can safely repeat them
+    (use upserts). Batches are written with unordered bulk_write; the last
+    _id of each batch is checkpointed.
+    """
+
+    collection = None
+    query = {}
+    projection = None
+
+    def prepare(self, ctx):
+        """Called once before the scan (e.g. to look up defaults)."""
+
+    def transform(self, doc, ctx):
+        raise NotImplementedError
+
+    def side_writes(self, doc, ctx):
+        return []
+
+    def apply(self, ctx, state):
+        col = ctx.db.get_collection(self.collection)
+        self.prepare(ctx)
+
+        last_id = state.get("lastId")
+        query = dict(self.query)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+            print(f"  ↪️  Resuming after _id {last_id}")
+
+        total = col.count_documents(query)
+        progress = Progress(f"{self.collection} v{self.version}", total)
+        cursor = col.find(query, self.projection).sort("_id", 1).batch_size(ctx.batch_size)
+
+        def write(ops, side_ops):
+            if ctx.dry_run:
+                return len(ops)
+            for name, batch in side_ops.items():
+                ctx.db.get_collection(name).bulk_write(batch, ordered=False)
+            if not ops:
+                return 0
+            result = col.bulk_write(ops, ordered=False)
+            return result.modified_count
+
+        # Batches are written by a worker pool; checkpoints only advance over
+        # batches that completed in order, so a resume never skips work.
+        pending = deque()
+        max_in_flight = max(ctx.workers * 2, 1)
+        with ThreadPoolExecutor(max_workers=max(ctx.workers, 1)) as pool:
+
+            def drain(limit):
+                while len(pending) > limit:
+                    future, batch_last_id, scanned = pending.popleft()
+                    modified = future.result()
+                    self.checkpoint(ctx, batch_last_id, scanned, modified)
+                    progress.add(scanned, modified)
+
+            ops, side_ops, scanned, batch_last_id = [], {}, 0, None
+            for doc in cursor:
+                scanned += 1
+                batch_last_id = doc["_id"]
+                for name, op in self.side_writes(doc, ctx):
+                    side_ops.setdefault(name, []).append(op)
+                update = self.transform(doc, ctx)
+                if update:
+                    ops.append(UpdateOne({"_id": doc["_id"]}, update))
+                if scanned >= ctx.batch_size:
+                    pending.append((pool.submit(write, ops, side_ops), batch_last_id, scanned))
+                    drain(max_in_flight)
+                    ops, side_ops, scanned = [], {}, 0
+            if scanned:
+                pending.append((pool.submit(write, ops, side_ops), batch_last_id, scanned))
+            drain(0)
+
+        progress.report(final=True)
+
+    def checkpoint(self, ctx, last_id, scanned, modified):
+        if ctx.dry_run:
+            return
+        ctx.state_col.update_one(
+            {"_id": self.version},
+            {"$set": {"lastId": last_id, "updatedAt": datetime.now(timezone.utc)},
+             "$inc": {"scanned": scanned, "modified": modified}},
+        )
+
+
+def run_migrations(ctx, migrations, target=None):
+    applied = {d["_id"]: d for d in ctx.state_col.find({})}
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if target is not None and migration.version > target:
+            break
+        state = applied.get(migration.version, {})
+        if state.get("status") == "done":
+            print(f"⏭️  v{migration.version} {migration.name}: already applied")
+            continue
+
+        print(f"\n🔄 v{migration.version} {migration.name}" + (" (dry run)" if ctx.dry_run else ""))
+        if not ctx.dry_run:
+            ctx.state_col.update_one(
+                {"_id": migration.version},
+                {"$set": {"name": migration.name, "status": "running"},
+                 "$setOnInsert": {"startedAt": datetime.now(timezone.utc), "scanned": 0, "modified": 0}},
+                upsert=True,
+            )
+        migration.apply(ctx, state)
+        if not ctx.dry_run:
+            ctx.state_col.update_one(
+                {"_id": migration.version},
+                {"$set": {"status": "done", "finishedAt": datetime.now(timezone.utc)}},
+            )
+
+
+def print_status(ctx, migrations):
+    applied = {d["_id"]: d for d in ctx.state_col.find({})}
+    print("\n📋 Migrations:")
+    for migration in sorted(migrations, key=lambda m: m.version):
+        state = applied.get(migration.version)
+        if not state:
+            status = "pending"
+        elif state.get("status") == "done":
+            status = "done"
+            if state.get("scanned"):
+                status += f" ({state['scanned']} scanned, {state.get('modified', 0)} changed)"
+        else:
+            status = f"interrupted at _id {state.get('lastId')} - will resume"
+        print(f"  v{migration.version} {migration.name}: {status}")
+
+
+# ---------- MIGRATIONS ----------
+
+class AddAuthorizationFields(DocumentMigration):
+    version = 1
+    name = "Add createdBy/members/isPublic to Projects"
+    collection = "Projects"
+    query = {"$or": [
+        {"createdBy": {"$exists": False}},
+        {"members": {"$exists": False}},
+        {"isPublic": {"$exists": False}},
+    ]}
+
+    def prepare(self, ctx):
+        # Look up the fallback creator once instead of once per project
+        users_col = ctx.db.get_collection("Users")
+        first_user = users_col.find_one({}, {"userId": 1})
+        if first_user:
+            ctx.cache["default_creator"] = first_user["userId"]
+            return
+        if not ctx.dry_run:
+            users_col.insert_one({"userId": "admin", "password": "admin123"})
+            print("  ⚠️  Created default admin user")
+        ctx.cache["default_creator"] = "admin"
+
+    def transform(self, project, ctx):
+        updates = {}
+        if "createdBy" not in project:
+            updates["createdBy"] = ctx.cache["default_creator"]
+        if "members" not in project:
+            updates["members"] = [updates.get("createdBy", project.get("createdBy", "admin"))]
+        if "isPublic" not in project:
+            # Make existing projects public so they remain accessible
+            updates["isPublic"] = True
+        return {"$set": updates} if updates else None
+
+
+class CreateIndexes(Migration):
+    version = 2
+    name = "Create indexes"
+
+    INDEXES = [
+        ("Users", "userId", {"unique": True}),
+        ("Projects", "projectId", {"unique": True}),
+        ("Projects", "createdBy", {}),
+        ("Resources", "projectId", {}),
+        ("Resources", [("projectId", 1), ("hwsetId", 1)], {"unique": True}),
+    ]
+
+    def apply(self, ctx, state):
+        for collection, keys, options in self.INDEXES:
+            if ctx.dry_run:
+                print(f"  📝 Would create {collection} index {keys}")
+                continue
+            try:
+                ctx.db.get_collection(collection).create_index(keys, **options)
+                print(f"  ✅ {collection} index {keys} created/verified")
+            except Exception as e:
+                print(f"  ⚠️  {collection} index {keys}: {e}")
+
+
+class IndexPublicProjects(CreateIndexes):
+    version = 8
+    name = "Index Projects.isPublic (public project listing)"
+
+    INDEXES = [
+        ("Projects", "isPublic", {}),
+    ]
+
+
+class IndexMemberCounts(CreateIndexes):
+    version = 9
+    name = "Index Projects.memberCount (largest projects report)"
+
+    INDEXES = [
+        ("Projects", "memberCount", {}),
+    ]
+
+
+class SeedSampleResources(Migration):
+    version = 3
+    name = "Add sample hardware resources when none exist"
+
+    def apply(self, ctx, state):
+        resources_col = ctx.db.get_collection("Resources")
+        if resources_col.estimated_document_count() > 0:
+            print("  ✅ Hardware resources already exist")
+            return
+
+        sample_resources = []
+        for project in ctx.db.get_collection("Projects").find({}, {"projectId": 1}).limit(3):
+            project_id = project["projectId"]
+            sample_resources.extend([
+                {
+                    "projectId": project_id,
+                    "hwsetId": "HWSet1",
+                    "name": "Arduino Uno Kit",
+                    "total": 10,
+                    "allocatedToProject": 0,
+                    "available": 10,
+                    "notes": f"Arduino kits for {project_id}"
+                },
+                {
+                    "projectId": project_id,
+                    "hwsetId": "HWSet2",
+                    "name": "Raspberry Pi Kit",
+                    "total": 5,
+                    "allocatedToProject": 0,
+                    "available": 5,
+                    "notes": f"Raspberry Pi kits for {project_id}"
+                }
+            ])
+
+        if sample_resources and not ctx.dry_run:
+            resources_col.insert_many(sample_resources, ordered=False)
+        print(f"  ✅ {'Would add' if ctx.dry_run else 'Added'} {len(sample_resources)} sample hardware resources")
+
+
+class MoveMembersToMemberships(DocumentMigration):
+    version = 4
+    name = "Move Projects.members arrays into the Memberships collection"
+    collection = "Projects"
+    query = {"members": {"$exists": True}}
+    projection = {"projectId": 1, "createdBy": 1, "members": 1}
+
+    def prepare(self, ctx):
+        if ctx.dry_run:
+            return
+        memberships_col = ctx.db.get_collection("Memberships")
+        memberships_col.create_index([("projectId", 1), ("userId", 1)], unique=True)
+        memberships_col.create_index([("userId", 1), ("projectId", 1)])
+
+    def side_writes(self, project, ctx):
+        now = datetime.now(timezone.utc)
+        for user_id in dict.fromkeys(project.get("members") or []):
+            role = "owner" if user_id == project.get("createdBy") else "member"
+            yield "Memberships", UpdateOne(
+                {"projectId": project["projectId"], "userId": user_id},
+                {"$setOnInsert": {"role": role, "joinedAt": now}},
+                upsert=True,
+            )
+
+    def transform(self, project, ctx):
+        members = set(project.get("members") or [])
+        return {"$set": {"memberCount": len(members)}, "$unset": {"members": ""}}
+
+
+class AddProjectVersions(DocumentMigration):
+    version = 5
+    name = "Add version to Projects"
+    collection = "Projects"
+    query = {"version": {"$exists": False}}
+    projection = {"_id": 1}
+
+    def transform(self, doc, ctx):
+        return {"$set": {"version": 1}}
+
+
+class AddResourceVersions(AddProjectVersions):
+    version = 6
+    name = "Add version to Resources"
+    collection = "Resources"
+
+
+class NormalizeHardwareCatalog(DocumentMigration):
+    version = 7
+    name = "Move hardware names/notes from Resources to HardwareCatalog"
+    collection = "Resources"
+    query = {"$or": [{"name": {"$exists": True}}, {"notes": {"$exists": True}}]}
+    projection = {"projectId": 1, "hwsetId": 1, "name": 1, "notes": 1}
+
+    def prepare(self, ctx):
+        # Existing catalog entries win; the first resource seen for any other
+        # hwsetId becomes its entry
+        catalog_col = ctx.db.get_collection("HardwareCatalog")
+        ctx.cache["catalog"] = {
+            e["hwsetId"]: e for e in catalog_col.find({"hwsetId": {"$exists": True}}, {"_id": 0})
+        }
+        if not ctx.dry_run:
+            catalog_col.create_index("hwsetId", unique=True, sparse=True)
+
+    @staticmethod
+    def generated(notes, project_id):
+        """Notes written at project creation only restate the project ("Arduino kits for P-1")."""
+        return notes.endswith(f" for {project_id}")
+
+    def side_writes(self, resource, ctx):
+        hwset_id = resource.get("hwsetId")
+        if hwset_id in ctx.cache["catalog"]:
+            return
+        notes = resource.get("notes") or ""
+        if self.generated(notes, resource.get("projectId")):
+            notes = notes[:-len(f" for {resource['projectId']}")]
+        entry = {"hwsetId": hwset_id, "name": resource.get("name") or hwset_id, "notes": notes}
+        ctx.cache["catalog"][hwset_id] = entry
+        yield "HardwareCatalog", UpdateOne({"hwsetId": hwset_id}, {"$setOnInsert": entry}, upsert=True)
+        # Running API processes reload the catalog when its version changes
+        yield "HardwareCatalog", UpdateOne({"_id": "version"}, {"$inc": {"version": 1}}, upsert=True)
+
+    def transform(self, resource, ctx):
+        entry = ctx.cache["catalog"].get(resource.get("hwsetId"), {})
+        unset = {}
+        if "name" in resource and resource["name"] == entry.get("name"):
+            unset["name"] = ""
+        # Per-project notes stay as an override of the catalog's
+        notes = resource.get("notes")
+        if "notes" in resource and (not notes or notes == entry.get("notes")
+                                    or self.generated(notes, resource.get("projectId"))):
+            unset["notes"] = ""
+        return {"$unset": unset} if unset else None
+
+
+MIGRATIONS = [
+    AddAuthorizationFields(),
+    CreateIndexes(),
+    SeedSampleResources(),
+    MoveMembersToMemberships(),
+    AddProjectVersions(),
+    AddResourceVersions(),
+    NormalizeHardwareCatalog(),
+    IndexPublicProjects(),
+    IndexMemberCounts(),
+]
+
+
+# ---------- VERIFICATION ----------
+
+def verify(db):
+    print("\n🔍 Verifying data integrity...")
+    projects_col = db.get_collection("Projects")
+    resources_col = db.get_collection("Resources")
+
+    # What access checks need once every migration ran: v1's createdBy/isPublic and
+    # v4's memberCount (v4 removes v1's `members`, so that one isn't checked)
+    missing = projects_col.count_documents({"$or": [
+        {"createdBy": {"$exists": False}},
+        {"isPublic": {"$exists": False}},
+        {"memberCount": {"$exists": False}},
+    ]})
+    if missing:
+        print(f"  ⚠️  {missing} projects still missing authorization fields")
+    else:
+        print("  ✅ All projects have required authorization fields")
+
+    # Every project has at least its owner in Memberships
+    memberless = list(projects_col.aggregate([
+        {"$lookup": {"from": "Memberships", "localField": "projectId", "foreignField": "projectId",
+                     "pipeline": [{"$limit": 1}], "as": "m"}},
+        {"$match": {"m": {"$size": 0}}},
+        {"$limit": 20},
+        {"$project": {"_id": 0, "projectId": 1}},
+    ]))
+    if memberless:
+        print(f"  ⚠️  Projects without members: {[p['projectId'] for p in memberless]}")
+    else:
+        print("  ✅ All projects have Memberships rows")
+
+    # Orphaned resources: resource projectIds with no matching project
+    orphaned = list(resources_col.aggregate([
+        {"$group": {"_id": "$projectId"}},
+        {"$lookup": {"from": "Projects", "localField": "_id", "foreignField": "projectId", "as": "p"}},
+        {"$match": {"p": {"$size": 0}}},
+        {"$limit": 20},
+    ]))
+    if orphaned:
+        print(f"  ⚠️  Orphaned resource project IDs: {[o['_id'] for o in orphaned]}")
+    else:
+        print("  ✅ All resources belong to valid projects")
+
+    print(f"\n👥 Users: {db.get_collection('Users').estimated_document_count()}")
+    print(f"📋 Projects: {projects_col.estimated_document_count()}")
+    print(f"🔧 Hardware Resources: {resources_col.estimated_document_count()}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per bulk_write batch")
+    parser.add_argument("--workers", type=int, default=1, help="parallel bulk_write workers")
+    parser.add_argument("--target", type=int, help="highest migration version to apply")
+    parser.add_argument("--status", action="store_true", help="show migration state and exit")
+    parser.add_argument("--reset", type=int, metavar="VERSION", help="clear the state of one migration")
+    args = parser.parse_args()
+
     MONGODB_URI = os.getenv("MONGODB_URI")
     if not MONGODB_URI:
         print("❌ MONGODB_URI not found in environment variables")
-        return
-    
+        return 1
+
     try:
         # Connect to MongoDB
         print("🔗 Connecting to MongoDB...")
         client = MongoClient(MONGODB_URI)
         db = client["softwarelabdb"]
-        
+
         # Test connection
         client.admin.command('ping')
         print("✅ Successfully connected to MongoDB!")
-        
-        # Get collections
-        users_col = db.get_collection("Users")
-        projects_col = db.get_collection("Projects")
-        resources_col = db.get_collection("Resources")
-        
-        print("\n" + "="*60)
-        print("🔄 MIGRATING DATABASE FOR AUTHORIZATION SYSTEM")
-        print("="*60)
-        
-        # Step 1: Update Projects collection with authorization fields
-        print("\n📋 Step 1: Updating Projects collection...")
-        
-        projects_updated = 0
-        projects_cursor = projects_col.find({})
-        
-        for project in projects_cursor:
-            project_id = project.get("projectId")
-            updates = {}
-            
-            # Add createdBy field if missing (use a default or first user)
-            if "createdBy" not in project:
-                # Try to find a reasonable creator (first user in system, or create default)
-                first_user = users_col.find_one({})
-                if first_user:
-                    updates["createdBy"] = first_user["userId"]
-                else:
-                    # Create a default admin user if no users exist
-                    default_user = {"userId": "admin", "password": "admin123"}
-                    users_col.insert_one(default_user)
-                    updates["createdBy"] = "admin"
-                    print(f"  ⚠️  Created default admin user for project {project_id}")
-            
-            # Add members field if missing (include creator)
-            if "members" not in project:
-                creator = updates.get("createdBy", project.get("createdBy", "admin"))
-                updates["members"] = [creator]
-            
-            # Add isPublic field if missing (default to True for backward compatibility)
-            if "isPublic" not in project:
-                updates["isPublic"] = True  # Make existing projects public so they remain accessible
-            
-            # Apply updates if any
-            if updates:
-                projects_col.update_one(
-                    {"_id": project["_id"]}, 
-                    {"$set": updates}
-                )
-                projects_updated += 1
-                print(f"  ✅ Updated project {project_id}: {list(updates.keys())}")
-        
-        print(f"📊 Projects updated: {projects_updated}")
-        
-        # Step 2: Ensure proper indexes exist
-        print("\n📊 Step 2: Creating/updating database indexes...")
-        
-        # Users collection indexes
-        try:
-            users_col.create_index("userId", unique=True)
-            print("  ✅ Users.userId index created/verified")
-        except Exception as e:
-            print(f"  ⚠️  Users.userId index already exists: {e}")
-        
-        # Projects collection indexes  
-        try:
-            projects_col.create_index("projectId", unique=True)
-            print("  ✅ Projects.projectId index created/verified")
-        except Exception as e:
-            print(f"  ⚠️  Projects.projectId index already exists: {e}")
-            
-        try:
-            projects_col.create_index("members")
-            print("  ✅ Projects.members index created for fast member lookup")
-        except Exception as e:
-            print(f"  ⚠️  Projects.members index: {e}")
-            
-        try:
-            projects_col.create_index("createdBy")
-            print("  ✅ Projects.createdBy index created")
-        except Exception as e:
-            print(f"  ⚠️  Projects.createdBy index: {e}")
-        
-        # Resources collection indexes
-        try:
-            resources_col.create_index("projectId")
-            print("  ✅ Resources.projectId index created/verified")
-        except Exception as e:
-            print(f"  ⚠️  Resources.projectId index: {e}")
-            
-        try:
-            resources_col.create_index([("projectId", 1), ("hwsetId", 1)], unique=True)
-            print("  ✅ Resources compound index (projectId, hwsetId) created")
-        except Exception as e:
-            print(f"  ⚠️  Resources compound index: {e}")
-        
-        # Step 3: Add sample hardware resources if none exist
-        print("\n🔧 Step 3: Ensuring hardware resources exist...")
-        
-        resource_count = resources_col.count_documents({})
-        if resource_count == 0:
-            print("  ⚠️  No hardware resources found. Adding sample resources...")
-            
-            # Get all projects to add resources to
-            all_projects = list(projects_col.find({}, {"projectId": 1}))
-            
-            sample_resources = []
-            for project in all_projects[:3]:  # Add to first 3 projects
-                project_id = project["projectId"]
-                sample_resources.extend([
-                    {
-                        "projectId": project_id,
-                        "hwsetId": "HWSet1",
-                        "name": "Arduino Uno Kit",
-                        "total": 10,
-                        "allocatedToProject": 0,
-                        "available": 10,
-                        "notes": f"Arduino kits for {project_id}"
-                    },
-                    {
-                        "projectId": project_id,
-                        "hwsetId": "HWSet2", 
-                        "name": "Raspberry Pi Kit",
-                        "total": 5,
-                        "allocatedToProject": 0,
-                        "available": 5,
-                        "notes": f"Raspberry Pi kits for {project_id}"
-                    }
-                ])
-            
-            if sample_resources:
-                resources_col.insert_many(sample_resources)
-                print(f"  ✅ Added {len(sample_resources)} sample hardware resources")
-        else:
-            print(f"  ✅ Hardware resources already exist ({resource_count} resources)")
-        
-        # Step 4: Verify data integrity
-        print("\n🔍 Step 4: Verifying data integrity...")
-        
-        # Check all projects have required fields
-        projects_missing_fields = list(projects_col.find({
-            "$or": [
-                {"createdBy": {"$exists": False}},
-                {"members": {"$exists": False}}, 
-                {"isPublic": {"$exists": False}}
-            ]
-        }))
-        
-        if projects_missing_fields:
-            print(f"  ⚠️  {len(projects_missing_fields)} projects still missing authorization fields")
-            for project in projects_missing_fields:
-                print(f"    - {project.get('projectId', 'Unknown')}: missing {[k for k in ['createdBy', 'members', 'isPublic'] if k not in project]}")
-        else:
-            print("  ✅ All projects have required authorization fields")
-        
-        # Check for orphaned resources (resources without valid projects)
-        all_project_ids = set(p["projectId"] for p in projects_col.find({}, {"projectId": 1}))
-        resource_project_ids = set(r["projectId"] for r in resources_col.find({}, {"projectId": 1}))
-        orphaned_resources = resource_project_ids - all_project_ids
-        
-        if orphaned_resources:
-            print(f"  ⚠️  Found {len(orphaned_resources)} orphaned resource project IDs: {orphaned_resources}")
-        else:
-            print("  ✅ All resources belong to valid projects")
-        
-        # Step 5: Display final state
+
+        ctx = MigrationContext(db, dry_run=args.dry_run, batch_size=args.batch_size, workers=args.workers)
+
+        if args.reset is not None:
+            ctx.state_col.delete_one({"_id": args.reset})
+            print(f"🗑️  Cleared state of migration v{args.reset}")
+            return 0
+
+        if args.status:
+            print_status(ctx, MIGRATIONS)
+            return 0
+
         print("\n" + "="*60)
-        print("📈 MIGRATION SUMMARY")
+        print("🔄 MIGRATING DATABASE")
         print("="*60)
-        
-        user_count = users_col.count_documents({})
-        project_count = projects_col.count_documents({})
-        resource_count = resources_col.count_documents({})
-        
-        print(f"👥 Users: {user_count}")
-        print(f"📋 Projects: {project_count}")
-        print(f"🔧 Hardware Resources: {resource_count}")
-        
-        # Show sample of updated projects
-        print(f"\n📋 Sample Projects (showing authorization fields):")
-        sample_projects = list(projects_col.find({}, {
-            "_id": 0, "projectId": 1, "name": 1, "createdBy": 1, 
-            "members": 1, "isPublic": 1
-        }).limit(3))
-        
-        for project in sample_projects:
-            print(f"  - {project['projectId']}: {project['name']}")
-            print(f"    Creator: {project.get('createdBy', 'Unknown')}")
-            print(f"    Members: {project.get('members', [])}")
-            print(f"    Public: {project.get('isPublic', False)}")
-        
+        run_migrations(ctx, MIGRATIONS, target=args.target)
+
+        if not args.dry_run:
+            verify(db)
         print(f"\n🎯 Database migration completed successfully!")
-        print(f"✅ Authorization system is ready for testing!")
-        
+        return 0
+
     except Exception as e:
         print(f"❌ Migration failed: {e}")
         import traceback
         traceback.print_exc()
+        return 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
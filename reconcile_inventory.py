@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Inventory Reconciliation
+Checks the counter invariants of every hardware set in Resources:
+
+    available + allocatedToProject == total,  0 <= available,  0 <= allocatedToProject
+
+One aggregation pipeline scans the collection on the server and returns
+only the documents that break them, so millions of resources cost one
+collection scan and a few round trips. The scan reads from a secondary
+when there is one.
+
+With --repair, violations are fixed with unordered bulk_write batches.
+The units a project holds (allocatedToProject, clamped to 0..total) are
+trusted and `available` is recomputed from them. Every update is
+conditioned on the version the scan saw, so a resource that a checkout or
+checkin changed in the meantime is left alone (reported as skipped) rather
+than overwritten; run again to pick it up. Documents without a usable
+`total` are reported but never repaired.
+
+Exits 1 when violations remain (for nightly jobs), 0 otherwise.
+
+Usage:
+    python reconcile_inventory.py                        # report only
+    python reconcile_inventory.py --repair --chunk-size 2000
+    python reconcile_inventory.py --report drift.ndjson  # one line per violation
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+from bson import json_util
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReadPreference, UpdateOne
+
+# Load environment variables
+load_dotenv()
+
+FIELDS = ("total", "available", "allocatedToProject")
+
+# Documents whose counters are missing, not numbers, negative or don't add up.
+# $cond (not $or) so $add never sees a non-number.
+VIOLATIONS_PIPELINE = [
+    {"$match": {"$expr": {"$cond": [
+        {"$and": [{"$isNumber": f"${field}"} for field in FIELDS]},
+        {"$or": [
+            {"$lt": ["$available", 0]},
+            {"$lt": ["$allocatedToProject", 0]},
+            {"$ne": [{"$add": ["$available", "$allocatedToProject"]}, "$total"]},
+        ]},
+        True,
+    ]}}},
+    {"$project": {"projectId": 1, "hwsetId": 1, "version": 1, **{field: 1 for field in FIELDS}}},
+]
+
+
+def classify(doc):
+    """The first invariant a resource breaks."""
+    if not all(isinstance(doc.get(f), (int, float)) and not isinstance(doc.get(f), bool) for f in FIELDS):
+        return "missing counter"
+    if doc["total"] < 0:
+        return "negative total"
+    if doc["available"] < 0 or doc["allocatedToProject"] < 0:
+        return "negative counter"
+    if doc["allocatedToProject"] > doc["total"]:
+        return "over-allocated"
+    return "sum mismatch"
+
+
+def repair_update(doc):
+    """UpdateOne restoring the invariants, or None if the document can't be repaired."""
+    total = doc.get("total")
+    if not isinstance(total, (int, float)) or isinstance(total, bool) or total < 0:
+        return None
+    allocated = doc.get("allocatedToProject")
+    if not isinstance(allocated, (int, float)) or isinstance(allocated, bool):
+        allocated = total - max(doc.get("available") or 0, 0)
+    allocated = min(max(allocated, 0), total)
+    return UpdateOne(
+        # Documents from before versioning have no field; None matches them
+        {"_id": doc["_id"], "version": doc.get("version") or None},
+        # updatedSeq on the clock of api/sync.py, so delta sync sends the repair
+        {"$set": {"available": total - allocated, "allocatedToProject": allocated,
+                  "updatedSeq": time.time_ns() // 1000},
+         "$inc": {"version": 1}},
+    )
+
+
+def reconcile(db, repair=False, chunk_size=1000, batch_size=5000, report=None):
+    """Scan Resources and optionally repair it; returns the counts of the run."""
+    resources_col = db.get_collection("Resources")
+    scan_col = db.get_collection("Resources", read_preference=ReadPreference.SECONDARY_PREFERRED)
+    scanned = resources_col.estimated_document_count()
+    kinds = Counter()
+    stats = {"scanned": scanned, "violations": 0, "repaired": 0, "skipped": 0, "unrepairable": 0}
+
+    def flush(ops):
+        result = resources_col.bulk_write(ops, ordered=False)
+        stats["repaired"] += result.modified_count
+        # The version filter didn't match: changed since the scan
+        stats["skipped"] += len(ops) - result.matched_count
+
+    start = time.monotonic()
+    ops = []
+    cursor = scan_col.aggregate(VIOLATIONS_PIPELINE, allowDiskUse=True, batchSize=batch_size)
+    for doc in cursor:
+        kind = classify(doc)
+        kinds[kind] += 1
+        stats["violations"] += 1
+        if report:
+            report.write(json_util.dumps({**doc, "violation": kind}, json_options=json_util.RELAXED_JSON_OPTIONS))
+            report.write("\n")
+        if not repair:
+            continue
+        update = repair_update(doc)
+        if update is None:
+            stats["unrepairable"] += 1
+            continue
+        ops.append(update)
+        if len(ops) >= chunk_size:
+            flush(ops)
+            ops = []
+    if ops:
+        flush(ops)
+    stats["seconds"] = time.monotonic() - start
+    stats["kinds"] = dict(kinds)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true", help="fix violations (default: report only)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="repairs per bulk_write")
+    parser.add_argument("--batch-size", type=int, default=5000, help="aggregation cursor batch size")
+    parser.add_argument("--report", help="write each violation to this NDJSON file")
+    args = parser.parse_args()
+
+    MONGODB_URI = os.getenv("MONGODB_URI")
+    if not MONGODB_URI:
+        print("❌ MONGODB_URI not found in environment variables")
+        return 1
+
+    try:
+        print("🔗 Connecting to MongoDB...")
+        client = MongoClient(MONGODB_URI)
+        db = client["softwarelabdb"]
+        client.admin.command('ping')
+        print("✅ Successfully connected to MongoDB!")
+
+        report = open(args.report, "w", encoding="utf-8") if args.report else None
+        try:
+            stats = reconcile(db, args.repair, args.chunk_size, args.batch_size, report)
+        finally:
+            if report:
+                report.close()
+
+        rate = stats["scanned"] / max(stats["seconds"], 1e-6)
+        print(f"\n🔍 Checked ~{stats['scanned']} resources in {stats['seconds']:.1f}s ({rate:,.0f} docs/s)")
+        if not stats["violations"]:
+            print("✅ All resources satisfy available + allocatedToProject == total")
+            return 0
+        print(f"⚠️  {stats['violations']} violations:")
+        for kind, count in sorted(stats["kinds"].items(), key=lambda item: -item[1]):
+            print(f"  - {kind}: {count}")
+        if args.report:
+            print(f"📝 Details in {args.report}")
+        if not args.repair:
+            print("Run with --repair to fix them")
+            return 1
+        print(f"🔧 Repaired {stats['repaired']}, skipped {stats['skipped']} changed since the scan, "
+              f"{stats['unrepairable']} without a usable total")
+        return 1 if stats["skipped"] or stats["unrepairable"] else 0
+
+    except Exception as e:
+        print(f"❌ Reconciliation failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
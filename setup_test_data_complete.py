@@ -31,6 +31,7 @@ def main():
         users_col = db.get_collection("Users")
         projects_col = db.get_collection("Projects")
         resources_col = db.get_collection("Resources")
+        memberships_col = db.get_collection("Memberships")
         
         print("\n" + "="*60)
         print("🎯 SETTING UP COMPREHENSIVE TEST DATA")
@@ -101,7 +102,16 @@ def main():
         for project in test_projects:
             existing = projects_col.find_one({"projectId": project["projectId"]})
             if not existing:
-                projects_col.insert_one(project)
+                # Membership lives in the Memberships collection, not on the project
+                members = project["members"]
+                project_doc = {k: v for k, v in project.items() if k != "members"}
+                project_doc["memberCount"] = len(members)
+                projects_col.insert_one(project_doc)
+                memberships_col.insert_many([
+                    {"projectId": project["projectId"], "userId": member,
+                     "role": "owner" if member == project["createdBy"] else "member"}
+                    for member in members
+                ])
                 projects_added += 1
                 print(f"  ✅ Added project: {project['projectId']} ({project['name']})")
                 print(f"    Creator: {project['createdBy']}, Members: {project['members']}, Public: {project['isPublic']}")
@@ -166,9 +176,11 @@ def main():
         
         print(f"\n📋 Test Projects by Access Type:")
         all_projects = list(projects_col.find({}, {
-            "_id": 0, "projectId": 1, "name": 1, "createdBy": 1, 
-            "members": 1, "isPublic": 1
+            "_id": 0, "projectId": 1, "name": 1, "createdBy": 1, "isPublic": 1
         }))
+        for project in all_projects:
+            project["members"] = [m["userId"] for m in memberships_col.find(
+                {"projectId": project["projectId"]}, {"_id": 0, "userId": 1}).limit(20)]
         
         public_projects = [p for p in all_projects if p.get("isPublic")]
         private_projects = [p for p in all_projects if not p.get("isPublic")]
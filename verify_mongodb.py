@@ -1,142 +1,218 @@
 #!/usr/bin/env python3
 """
-MongoDB Integration Verification Script
-This script connects to MongoDB and displays the current data structure
+MongoDB Health and Index-Usage Report
+Reports, per collection: estimated document count, data/storage/index sizes
+and average document size (collStats), per-index usage since the last
+restart ($indexStats) with unused and missing indexes flagged, and the
+largest projects by member count.
+
+Usage:
+    python verify_mongodb.py                 # human-readable report
+    python verify_mongodb.py --json          # machine-readable JSON (for tracking growth over time)
+    python verify_mongodb.py --top 20 --samples 3
 """
 
-import os
+import argparse
 import json
+import os
+import sys
+from datetime import datetime, timezone
+
 from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, OperationFailure, ServerSelectionTimeoutError
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+COLLECTIONS = [
+    "Users", "Projects", "Resources", "Memberships",
+    "HardwareCatalog",                               # hardware names/notes (api/catalog.py)
+    "IdempotencyKeys",                               # stored responses (api/idempotency.py)
+    "SyncTombstones",                                # removed memberships (api/sync.py)
+    "ResourceHistory", "ResourceHistoryHourly", "HistoryState",  # api/history.py
+    "SchemaMigrations",                              # migrate_database.py
+]
+
+# Key patterns the API queries on (see the repositories' ensure_indexes in
+# api/storage.py and api/memberships.py). An expected index counts as present
+# if an existing index starts with the same keys.
+EXPECTED_INDEXES = {
+    "Users": [[("userId", 1)]],
+    "Projects": [[("projectId", 1)], [("isPublic", 1)], [("memberCount", 1)]],
+    "Resources": [[("projectId", 1), ("hwsetId", 1)], [("projectId", 1), ("updatedSeq", 1)]],
+    "Memberships": [[("projectId", 1), ("userId", 1)], [("userId", 1), ("projectId", 1)]],
+    "HardwareCatalog": [[("hwsetId", 1)]],
+    "IdempotencyKeys": [[("createdAt", 1)]],
+    "SyncTombstones": [[("userId", 1), ("updatedSeq", 1)], [("removedAt", 1)]],
+    "ResourceHistoryHourly": [[("projectId", 1), ("hwsetId", 1), ("ts", 1)]],
+}
+
+
+def coll_stats(db, name):
+    """Storage statistics via $collStats, falling back to the collStats command."""
+    col = db.get_collection(name)
+    try:
+        stats = next(col.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    except (OperationFailure, StopIteration, KeyError):
+        stats = db.command("collStats", name)
+    return {
+        "size": stats.get("size", 0),
+        "storageSize": stats.get("storageSize", 0),
+        "totalIndexSize": stats.get("totalIndexSize", 0),
+        "avgObjSize": stats.get("avgObjSize", 0),
+        "indexSizes": dict(stats.get("indexSizes", {})),
+    }
+
+
+def index_usage(col):
+    """Per-index access counts from $indexStats, joined with the index key patterns."""
+    keys = {ix["name"]: list(ix["key"].items()) for ix in col.list_indexes()}
+    usage = {}
+    try:
+        for stat in col.aggregate([{"$indexStats": {}}]):
+            usage[stat["name"]] = {
+                "ops": stat.get("accesses", {}).get("ops", 0),
+                "since": stat.get("accesses", {}).get("since"),
+            }
+    except OperationFailure:
+        # $indexStats needs clusterMonitor-level privileges on some deployments
+        pass
+
+    indexes = []
+    for name, key in keys.items():
+        entry = {"name": name, "key": key}
+        if name in usage:
+            entry["ops"] = usage[name]["ops"]
+            since = usage[name]["since"]
+            entry["since"] = since.isoformat() if hasattr(since, "isoformat") else since
+            entry["unused"] = name != "_id_" and usage[name]["ops"] == 0
+        indexes.append(entry)
+    return indexes
+
+
+def missing_indexes(name, indexes):
+    # Compare field names only; direction doesn't matter for equality lookups
+    existing = [[k for k, _ in ix["key"]] for ix in indexes]
+    missing = []
+    for expected in EXPECTED_INDEXES.get(name, []):
+        fields = [k for k, _ in expected]
+        if not any(key[:len(fields)] == fields for key in existing):
+            missing.append(expected)
+    return missing
+
+
+def largest_projects(db, top):
+    # Walks the memberCount index from the top instead of sorting every project.
+    # memberCount is maintained from migration v4 on; run migrate_database.py first
+    cursor = db.get_collection("Projects").find(
+        {"memberCount": {"$exists": True}}, {"_id": 0, "projectId": 1, "isPublic": 1, "memberCount": 1}
+    ).sort("memberCount", -1).limit(top)
+    return list(cursor)
+
+
+def collect(db, top, samples):
+    report = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "database": db.name,
+        "collections": {},
+    }
+    existing = set(db.list_collection_names())
+    for name in COLLECTIONS:
+        if name not in existing:
+            # e.g. history never recorded, or no membership removed yet
+            report["collections"][name] = {"absent": True}
+            continue
+        col = db.get_collection(name)
+        indexes = index_usage(col)
+        entry = {
+            "estimatedCount": col.estimated_document_count(),
+            "stats": coll_stats(db, name),
+            "indexes": indexes,
+            "unusedIndexes": [ix["name"] for ix in indexes if ix.get("unused")],
+            "missingIndexes": missing_indexes(name, indexes),
+        }
+        if samples:
+            # Hide passwords for security
+            entry["samples"] = [
+                {k: ("***" if k == "password" else v) for k, v in doc.items()}
+                for doc in col.find({}, {"_id": 0}).limit(samples)
+            ]
+        report["collections"][name] = entry
+    report["largestProjects"] = largest_projects(db, top)
+    return report
+
+
+def fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def print_report(report):
+    print(f"📁 Database '{report['database']}' at {report['generatedAt']}")
+    for name, entry in report["collections"].items():
+        print("\n" + "="*50)
+        print(f"📋 {name}")
+        print("="*50)
+        if entry.get("absent"):
+            print("Not created yet")
+            continue
+        stats = entry["stats"]
+        print(f"Documents (estimated): {entry['estimatedCount']}")
+        print(f"Data size: {fmt_bytes(stats['size'])}, storage: {fmt_bytes(stats['storageSize'])}, "
+              f"indexes: {fmt_bytes(stats['totalIndexSize'])}, avg doc: {fmt_bytes(stats['avgObjSize'])}")
+        print("Indexes:")
+        for ix in entry["indexes"]:
+            size = fmt_bytes(stats["indexSizes"].get(ix["name"], 0))
+            ops = ix.get("ops", "n/a")
+            flag = "  ⚠️  unused" if ix.get("unused") else ""
+            print(f"  - {ix['name']} {ix['key']} size={size} ops={ops}{flag}")
+        for key in entry["missingIndexes"]:
+            print(f"  ❌ missing index on {key}")
+        for doc in entry.get("samples", []):
+            print(f"  sample: {json.dumps(doc, default=str)}")
+
+    print("\n" + "="*50)
+    print("👥 LARGEST PROJECTS BY MEMBERS")
+    print("="*50)
+    for p in report["largestProjects"]:
+        print(f"  - {p.get('projectId')}: {p['memberCount']} members"
+              f"{' (public)' if p.get('isPublic') else ''}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="emit the report as JSON")
+    parser.add_argument("--top", type=int, default=10, help="number of largest projects to list")
+    parser.add_argument("--samples", type=int, default=0, help="sample documents to include per collection")
+    args = parser.parse_args()
+
     # Get MongoDB URI
     MONGODB_URI = os.getenv("MONGODB_URI")
     if not MONGODB_URI:
-        print("❌ MONGODB_URI not found in environment variables")
-        return
-    
+        print("❌ MONGODB_URI not found in environment variables", file=sys.stderr)
+        return 1
+
     try:
-        # Connect to MongoDB
-        print("🔗 Connecting to MongoDB...")
         client = MongoClient(MONGODB_URI)
         db = client["softwarelabdb"]
-        
-        # Test connection
         client.admin.command('ping')
-        print("✅ Successfully connected to MongoDB!")
-        
-        # Get collections
-        collections = db.list_collection_names()
-        print(f"\n📁 Available collections: {collections}")
-        
-        # Analyze Users collection
-        print("\n" + "="*50)
-        print("👥 USERS COLLECTION")
-        print("="*50)
-        users_col = db.get_collection("Users")
-        user_count = users_col.count_documents({})
-        print(f"Total users: {user_count}")
-        
-        if user_count > 0:
-            print("\nSample users:")
-            for user in users_col.find({}, {"_id": 0}).limit(5):
-                # Hide password for security
-                user_display = {k: v if k != 'password' else '***' for k, v in user.items()}
-                print(f"  - {json.dumps(user_display, indent=4)}")
-        
-        # Analyze Projects collection
-        print("\n" + "="*50)
-        print("📋 PROJECTS COLLECTION")
-        print("="*50)
-        projects_col = db.get_collection("Projects")
-        project_count = projects_col.count_documents({})
-        print(f"Total projects: {project_count}")
-        
-        if project_count > 0:
-            print("\nAll projects:")
-            for project in projects_col.find({}, {"_id": 0}):
-                print(f"  - {json.dumps(project, indent=4, default=str)}")
-        
-        # Analyze Resources collection
-        print("\n" + "="*50)
-        print("🔧 RESOURCES COLLECTION")
-        print("="*50)
-        resources_col = db.get_collection("Resources")
-        resource_count = resources_col.count_documents({})
-        print(f"Total hardware resources: {resource_count}")
-        
-        if resource_count > 0:
-            print("\nAll hardware resources:")
-            for resource in resources_col.find({}, {"_id": 0}):
-                print(f"  - {json.dumps(resource, indent=4, default=str)}")
-        else:
-            print("\n⚠️  No hardware resources found!")
-            print("You may need to add some test hardware resources for testing.")
-            print("\nSample hardware resources you can add:")
-            sample_resources = [
-                {
-                    "projectId": "P-001",
-                    "hwsetId": "HWSet1",
-                    "name": "Arduino Uno Kit",
-                    "total": 10,
-                    "allocatedToProject": 0,
-                    "available": 10,
-                    "notes": "Includes breadboard and jumper wires"
-                },
-                {
-                    "projectId": "P-001", 
-                    "hwsetId": "HWSet2",
-                    "name": "Raspberry Pi Kit",
-                    "total": 5,
-                    "allocatedToProject": 0,
-                    "available": 5,
-                    "notes": "Includes SD card and power adapter"
-                }
-            ]
-            for sample in sample_resources:
-                print(f"  {json.dumps(sample, indent=2)}")
-        
-        # Check indexes
-        print("\n" + "="*50)
-        print("📊 COLLECTION INDEXES")
-        print("="*50)
-        
-        print("Users collection indexes:")
-        for index in users_col.list_indexes():
-            print(f"  - {index}")
-            
-        print("\nProjects collection indexes:")
-        for index in projects_col.list_indexes():
-            print(f"  - {index}")
-            
-        print("\nResources collection indexes:")
-        for index in resources_col.list_indexes():
-            print(f"  - {index}")
-        
-        # Summary
-        print("\n" + "="*50)
-        print("📈 INTEGRATION SUMMARY")
-        print("="*50)
-        print(f"✅ MongoDB connection: Working")
-        print(f"✅ Database 'softwarelabdb': Accessible")
-        print(f"✅ Users collection: {user_count} documents")
-        print(f"✅ Projects collection: {project_count} documents")
-        print(f"✅ Resources collection: {resource_count} documents")
-        
-        if resource_count == 0:
-            print(f"⚠️  Hardware resources: None found - add test data for hardware testing")
-        else:
-            print(f"✅ Hardware resources: Ready for testing")
-            
-        print(f"\n🎯 Ready for all 20 test cases!")
-        
-    except Exception as e:
-        print(f"❌ Error connecting to MongoDB: {e}")
-        return
+        report = collect(db, args.top, args.samples)
+    except (ServerSelectionTimeoutError, ConnectionFailure) as e:
+        print(f"❌ Error connecting to MongoDB: {e}", file=sys.stderr)
+        return 1
+    except OperationFailure as e:
+        print(f"❌ MongoDB command failed: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())